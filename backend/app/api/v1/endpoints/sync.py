@@ -1,135 +1,796 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from sqlalchemy import any_, func, literal, literal_column, text, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID, insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, timezone
 from uuid import UUID
 
-from ....core.db import get_db
-from ....models.base import Customer, Product, Bill, BillItem
-from ....schemas.sync import PushRequest, PullRequest, PullResponse, CustomerSync, ProductSync, BillSync, BillItemSync
+from ....core.codec import NDJSON, DuplexStreamingResponse, SyncRoute, encode_response, iter_lines
+from ....core.db import ENGINE_SETTINGS, AsyncSessionLocal, engine, get_db
+from ....core.notify import change_broker
+from ....models.base import Customer, Product, Bill, BillItem, SyncChange, SyncSequence, SyncUpload
+from ....schemas.sync import (
+    SyncEntity, PushRequest, PullRequest, PullResponse, CustomerSync, ProductSync, BillSync, BillItemSync
+)
 
-router = APIRouter()
+# Bodies may arrive gzip/zstd-compressed and as msgpack/CBOR; responses follow Accept(-Encoding)
+router = APIRouter(route_class=SyncRoute)
 
-# --- HELPER: UPSERT LOGIC ---
-async def upsert_entity(session: AsyncSession, model, schema_item: SyncEntity, business_id: UUID):
+# --- HELPER: BULK UPSERT ---
+# Rows per executemany; SQLAlchemy renders each as multi-row VALUES pages within Postgres' bind limit
+PUSH_CHUNK_ROWS = int(os.getenv("SYNC_PUSH_CHUNK_ROWS", 1000))
+
+
+def _utc(value: datetime) -> datetime:
+    # Assume UTC if naive
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _latest_by_id(items: List[SyncEntity]) -> List[SyncEntity]:
+    """One row per id (the newest), since ON CONFLICT can't touch a row twice in one statement."""
+    latest: Dict[UUID, SyncEntity] = {}
+    for item in items:
+        current = latest.get(item.id)
+        if current is None or _utc(item.updated_at) > _utc(current.updated_at):
+            latest[item.id] = item
+    return list(latest.values())
+
+
+async def bulk_upsert(
+    session: AsyncSession, model, items: List[SyncEntity], business_id: UUID,
+    extra: Optional[Dict[UUID, Dict[str, Any]]] = None, write_if: Optional[Callable] = None,
+) -> Tuple[Dict[str, int], List[UUID]]:
+    """
+    Last-Write-Wins upsert as one INSERT ... ON CONFLICT (id) DO UPDATE statement, executed per chunk:
+    1. Unknown ids are inserted.
+    2. Existing rows of this business are overwritten only if the incoming updated_at is newer.
+    3. Everything else (not newer, or an id owned by another business) is skipped as stale.
+    extra: additional column values per id (the same columns for every row).
+    write_if(table, excluded): replaces the newer-updated_at test in 2.
+    Returns {"inserted", "updated", "stale"} counts and the ids actually written.
+    """
+    counts = {"inserted": 0, "updated": 0, "stale": 0}
+    written: List[UUID] = []
+    items = _latest_by_id(items)
+    if not items:
+        return counts, written
+
+    table = model.__table__
+    rows = [
+        {**item.dict(exclude={'items'}), "updated_at": _utc(item.updated_at), "business_id": business_id,
+         **(extra[item.id] if extra else {})}
+        for item in items
+    ]
+    columns = list(rows[0])
+
+    stmt = pg_insert(table)
+    condition = write_if(table, stmt.excluded) if write_if else stmt.excluded.updated_at > table.c.updated_at
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={name: stmt.excluded[name] for name in columns if name != "id"},
+        where=condition & (table.c.business_id == stmt.excluded.business_id),
+    ).returning(table.c.id, literal_column("xmax = 0").label("inserted"))  # xmax is 0 only for fresh inserts
+    for start in range(0, len(rows), PUSH_CHUNK_ROWS):
+        chunk = rows[start:start + PUSH_CHUNK_ROWS]
+        applied = (await session.execute(stmt, chunk)).all()
+        inserted = sum(1 for row in applied if row.inserted)
+        counts["inserted"] += inserted
+        counts["updated"] += len(applied) - inserted
+        counts["stale"] += len(chunk) - len(applied)
+        written += [row.id for row in applied]
+    return counts, written
+
+# --- HELPER: BILL CONTENT HASHES ---
+# A bill's content hash is the pair (header_hash, items_hash), stored on the bill. Both leave
+# out updated_at, so a client re-stamping an unchanged bill or item set still matches.
+BILL_HASH_FIELDS = ("customer_id", "invoice_number", "bill_date", "total_amount", "status", "is_deleted")
+ITEM_HASH_FIELDS = ("product_id", "qty", "price", "total", "is_deleted")
+
+
+def _hash_part(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        # Stored as NUMERIC(_, 2): values that store alike hash alike
+        return f"{value:.2f}"
+    if isinstance(value, datetime):
+        return _utc(value).astimezone(timezone.utc).isoformat()
+    return str(value)
+
+
+def _digest(parts: Iterable[str]) -> str:
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).hexdigest()
+
+
+def bill_header_hash(bill: BillSync) -> str:
+    return _digest(_hash_part(getattr(bill, name)) for name in BILL_HASH_FIELDS)
+
+
+def bill_items_hash(items: List[BillItemSync]) -> str:
+    """Hash of an item set: independent of item order and of duplicates (the newest counts)."""
+    return _digest(
+        "\x1e".join([str(item.id), *(_hash_part(getattr(item, name)) for name in ITEM_HASH_FIELDS)])
+        for item in sorted(_latest_by_id(items), key=lambda item: item.id)
+    )
+
+
+def _item_differs(table, excluded):
+    """ON CONFLICT condition: the incoming item's content (not its updated_at) differs from the row's."""
+    content = ("bill_id",) + ITEM_HASH_FIELDS
+    return tuple_(*(table.c[name] for name in content)).is_distinct_from(tuple_(*(excluded[name] for name in content)))
+
+
+def _uuid_array(ids: Iterable[UUID]):
+    """ids as a single uuid[] parameter (for = ANY / unnest), however many there are."""
+    return literal(list(ids), ARRAY(PG_UUID(as_uuid=True)))
+
+
+def _add_counts(total: Dict[str, int], counts: Dict[str, int]):
+    for key, value in counts.items():
+        total[key] = total.get(key, 0) + value
+
+
+async def upsert_bills(
+    session: AsyncSession, bills: List[BillSync], business_id: UUID
+) -> Tuple[Dict[str, int], Dict[str, int], List[Tuple[str, UUID]]]:
+    """
+    Bills with their items, skipping what the stored content hashes show is unchanged:
+    1. Header and item set both match: neither the bill nor its items are touched.
+    2. Otherwise the header is upserted (LWW). If it wins and its item set changed, the
+       pushed items replace the stored ones (replace_items); if the item set is unchanged
+       (a header-only edit), the items are left alone.
+    3. Items of a stale header fall back to per-item LWW, like loose items.
+    A bill sent without items (or with "items": [], as clients serialize a header-only
+    edit) only carries its header; its stored items are kept. Removing items takes
+    sending them with is_deleted.
+    Returns bill counts, item counts and the (entity, id) pairs written.
+    """
+    bill_counts = {"inserted": 0, "updated": 0, "stale": 0, "unchanged": 0}
+    item_counts = {"inserted": 0, "updated": 0, "stale": 0, "unchanged": 0, "deleted": 0}
+    changes: List[Tuple[str, UUID]] = []
+    bills = _latest_by_id(bills)
+    if not bills:
+        return bill_counts, item_counts, changes
+    # An item belongs to the bill it was pushed with, whatever its own bill_id says: the
+    # items hash leaves bill_id out, and replace_items only clears the pushed bills' items
+    for bill in bills:
+        for item in bill.items:
+            item.bill_id = bill.id
+
+    # Pushes to one business are serialized (lock_sequence), so these can't change under us
+    stored = {
+        row.id: row for row in (await session.execute(
+            select(Bill.id, Bill.business_id, Bill.header_hash, Bill.items_hash)
+            .where(Bill.id == any_(_uuid_array(bill.id for bill in bills)))
+        )).all()
+    }
+    pending, hashes = [], {}
+    for bill in bills:
+        has_items = bool(bill.items)
+        header_hash = bill_header_hash(bill)
+        items_hash = bill_items_hash(bill.items) if has_items else None
+        row = stored.get(bill.id)
+        if (row is not None and row.business_id == business_id and row.header_hash == header_hash
+                and (not has_items or row.items_hash == items_hash)):
+            bill_counts["unchanged"] += 1
+            item_counts["unchanged"] += len(bill.items)
+            continue
+        pending.append(bill)
+        hashes[bill.id] = {
+            "header_hash": header_hash,
+            "items_hash": items_hash if has_items else (row.items_hash if row is not None else None),
+        }
+
+    counts, written = await bulk_upsert(session, Bill, pending, business_id, extra=hashes)
+    _add_counts(bill_counts, counts)
+    changes += [("bills", bill_id) for bill_id in written]
+    written = set(written)
+    replace, stale_items = [], []
+    for bill in pending:
+        if not bill.items:
+            continue
+        row = stored.get(bill.id)
+        if bill.id not in written:
+            stale_items += bill.items
+        elif row is not None and row.items_hash == hashes[bill.id]["items_hash"]:
+            item_counts["unchanged"] += len(bill.items)
+        else:
+            replace.append(bill)
+
+    counts, written_items = await replace_items(session, replace, business_id)
+    _add_counts(item_counts, counts)
+    changes += [("bill_items", item_id) for item_id in written_items]
+    counts, written_items = await upsert_loose_items(session, stale_items, business_id)
+    _add_counts(item_counts, counts)
+    changes += [("bill_items", item_id) for item_id in written_items]
+    return bill_counts, item_counts, changes
+
+
+async def replace_items(
+    session: AsyncSession, bills: List[BillSync], business_id: UUID
+) -> Tuple[Dict[str, int], List[UUID]]:
+    """
+    Makes the stored items of bills (whose headers were just written) match their pushed
+    item sets, as set operations rather than per-item LWW:
+    1. One upsert inserts new ids and rewrites only the rows whose content differs.
+    2. One UPDATE soft-deletes the bills' other live items, stamped with the bill's updated_at.
+    Returns {"inserted", "updated", "unchanged", "deleted"} counts and the ids written.
     """
-    Generic upsert logic:
-    1. Check if exists.
-    2. If not, create.
-    3. If exists, update IF schema_item.updated_at > db_item.updated_at.
+    if not bills:
+        return {}, []
+    items = [item for bill in bills for item in bill.items]
+    counts, written = await bulk_upsert(session, BillItem, items, business_id, write_if=_item_differs)
+    counts["unchanged"] = counts.pop("stale")
+
+    deleted = (await session.execute(
+        update(BillItem)
+        .where(
+            BillItem.bill_id == Bill.id,
+            Bill.id == any_(_uuid_array(bill.id for bill in bills)),
+            BillItem.business_id == business_id,
+            BillItem.is_deleted.is_(False),
+            # NOT IN a subquery runs as a hashed lookup; <> ALL(array) would scan the array per row
+            BillItem.id.not_in(select(func.unnest(_uuid_array(item.id for item in items)))),
+        )
+        .values(is_deleted=True, updated_at=Bill.updated_at)
+        .returning(BillItem.id)
+        .execution_options(synchronize_session=False)
+    )).scalars().all()
+    counts["deleted"] = len(deleted)
+    return counts, written + list(deleted)
+
+
+async def upsert_loose_items(
+    session: AsyncSession, items: List[BillItemSync], business_id: UUID
+) -> Tuple[Dict[str, int], List[UUID]]:
+    """
+    Per-item LWW upsert, also skipping items whose content is unchanged (counted as stale).
+    The bills of written items lose their items_hash: their item sets changed.
+    """
+    counts, written = await bulk_upsert(
+        session, BillItem, items, business_id,
+        write_if=lambda table, excluded: (excluded.updated_at > table.c.updated_at) & _item_differs(table, excluded),
+    )
+    if written:
+        # updated_at kept: this is bookkeeping, not an edit of the bill
+        await session.execute(
+            update(Bill)
+            .where(Bill.id.in_(select(BillItem.bill_id).where(BillItem.id == any_(_uuid_array(written)))))
+            .values(items_hash=None, updated_at=Bill.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+    return counts, written
+
+# --- HELPER: CHANGE SEQUENCE ---
+
+
+async def lock_sequence(session: AsyncSession, business_id: UUID) -> int:
+    """
+    The business's last assigned seq, row-locked until commit. Pushes to one business
+    therefore commit in seq order, and a pull that has seen seq N never misses a lower one.
     """
-    # Note: merge() is often easier for simple upserts, but we want the timestamp check logic.
-    stmt = select(model).where(model.id == schema_item.id)
-    result = await session.execute(stmt)
-    db_item = result.scalars().first()
+    stmt = pg_insert(SyncSequence).values(business_id=business_id, last_seq=0)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SyncSequence.business_id], set_={"last_seq": SyncSequence.last_seq}
+    ).returning(SyncSequence.last_seq)
+    return (await session.execute(stmt)).scalar_one()
+
+
+async def log_changes(session: AsyncSession, business_id: UUID, last_seq: int,
+                      changes: List[Tuple[str, UUID]]) -> int:
+    """
+    Gives each written (entity, id) the next seq, replacing its previous change-log entry,
+    and advances the counter. Call after lock_sequence in the same transaction.
+    Returns the new last_seq.
+    """
+    if not changes:
+        return last_seq
+    rows = [
+        {"business_id": business_id, "seq": last_seq + n, "entity": entity, "entity_id": entity_id}
+        for n, (entity, entity_id) in enumerate(changes, 1)
+    ]
+    stmt = pg_insert(SyncChange)
+    stmt = stmt.on_conflict_do_update(constraint="uq_sync_changes_entity", set_={"seq": stmt.excluded.seq})
+    for start in range(0, len(rows), PUSH_CHUNK_ROWS):
+        await session.execute(stmt, rows[start:start + PUSH_CHUNK_ROWS])
+    last_seq = rows[-1]["seq"]
+    await session.execute(
+        update(SyncSequence).where(SyncSequence.business_id == business_id).values(last_seq=last_seq)
+    )
+    return last_seq
+
+# --- HELPER: PULL CURSORS ---
+PULL_PAGE_SIZE = int(os.getenv("SYNC_PULL_PAGE_SIZE", 500))
+PULL_MAX_PAGE_SIZE = int(os.getenv("SYNC_PULL_MAX_PAGE_SIZE", 5000))
 
-    if not db_item:
-        # Create New
-        new_item = model(**schema_item.dict(exclude={'items'}), business_id=business_id) # Exclude nested items for Bills
-        session.add(new_item)
+
+def encode_cursor(position: Optional[Tuple[datetime, UUID]], started: datetime) -> str:
+    """Opaque continuation token: last (updated_at, id) sent, or None once the type is exhausted."""
+    data = {"s": started.isoformat()}
+    if position is None:
+        data["done"] = True
     else:
-        # Update if incoming is newer
-        # Ensure timezone awareness for comparison
-        db_updated_at = db_item.updated_at
-        if db_updated_at.tzinfo is None:
-            # Assume stored as UTC if naive
-             db_updated_at = db_updated_at.replace(tzinfo=timezone.utc)
-        
-        inc_updated_at = schema_item.updated_at
-        if inc_updated_at.tzinfo is None:
-             inc_updated_at = inc_updated_at.replace(tzinfo=timezone.utc)
-
-        if inc_updated_at > db_updated_at:
-            for key, value in schema_item.dict(exclude={'items'}).items():
-                setattr(db_item, key, value)
-            # Explicitly set business_id to ensure safety
-            db_item.business_id = business_id 
+        data["u"], data["i"] = position[0].isoformat(), str(position[1])
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return {
+            "started": datetime.fromisoformat(data["s"]),
+            "done": bool(data.get("done")),
+            "updated_at": None if data.get("done") else datetime.fromisoformat(data["u"]),
+            "id": None if data.get("done") else UUID(data["i"]),
+        }
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid sync cursor: {e}")
+
+# --- HELPER: PULL FETCH PLAN ---
+# Run the per-entity pull queries concurrently (one pooled connection each; see PULL_CONCURRENT_SLOTS)
+PULL_CONCURRENT = os.getenv("SYNC_PULL_CONCURRENT", "1") != "0"
+_SNAPSHOT_ID = re.compile(r"[0-9A-F]+-[0-9A-F]+(-[0-9]+)?")
+
+
+@dataclass(frozen=True)
+class PullFetch:
+    entity: str  # PullResponse field, cursor key and change-log entity (the table name)
+    model: Any
+    schema: Any
+    # (relationship, child foreign key): the page's children, fetched by their own query
+    children: Optional[Tuple[str, Any]] = None
+
+
+PULL_PLAN = (
+    PullFetch("customers", Customer, CustomerSync),
+    PullFetch("products", Product, ProductSync),
+    PullFetch("bills", Bill, BillSync, ("items", BillItem.bill_id)),
+)
+# A concurrent pull holds one connection per query (PULL_PLAN plus children); only this many
+# pulls fan out at once, so together they fit in the pool. Others run sequentially on their own.
+PULL_FANOUT_QUERIES = len(PULL_PLAN) + sum(1 for step in PULL_PLAN if step.children)
+PULL_CONCURRENT_SLOTS = int(os.getenv(
+    "SYNC_PULL_CONCURRENT_SLOTS", max(1, ENGINE_SETTINGS["pool_size"] // PULL_FANOUT_QUERIES)
+))
+_pull_slots = asyncio.Semaphore(PULL_CONCURRENT_SLOTS)
+
+
+async def begin_snapshot(session: AsyncSession, snapshot_id: Optional[str] = None) -> str:
+    """
+    Starts a REPEATABLE READ READ ONLY transaction on session. Without snapshot_id
+    it exports its snapshot and returns the id; with one, it adopts that snapshot
+    (the exporting transaction must still be open).
+    """
+    conn = await session.connection(
+        execution_options={"isolation_level": "REPEATABLE READ", "postgresql_readonly": True}
+    )
+    if snapshot_id is None:
+        return (await conn.execute(text("SELECT pg_export_snapshot()"))).scalar()
+    if not _SNAPSHOT_ID.fullmatch(snapshot_id):
+        raise ValueError(f"Unexpected snapshot id: {snapshot_id!r}")
+    # SET TRANSACTION takes no bind parameters; the id is validated above
+    await conn.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+    return snapshot_id
+
+
+def children_query(step: PullFetch, parents):
+    """The step's child rows for every parent parents (a select of step.model) returns."""
+    foreign_key = step.children[1]
+    parent_ids = parents.with_only_columns(step.model.id).scalar_subquery()
+    return select(foreign_key.class_).where(foreign_key.in_(parent_ids))
+
+
+def attach_children(step: PullFetch, rows: List[Any], children: List[Any]):
+    relation, foreign_key = step.children
+    by_parent = defaultdict(list)
+    for child in children:
+        by_parent[getattr(child, foreign_key.key)].append(child)
+    for row in rows:
+        set_committed_value(row, relation, by_parent.get(row.id, []))
+
+
+async def _gather_or_cancel(*aws) -> List[Any]:
+    """asyncio.gather that, when one awaitable fails, cancels the rest and waits for them to stop."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def _pool_has_room(connections: int) -> bool:
+    """Whether the engine's pool can hand out this many connections without waiting."""
+    pool = engine.pool
+    return pool.checkedin() + max(0, ENGINE_SETTINGS["max_overflow"] - pool.overflow()) >= connections
+
+
+async def fetch_in_snapshot(db: AsyncSession, snapshot: str, queries: List[Any]) -> List[List[Any]]:
+    """
+    Runs independent ORM selects in the snapshot begin_snapshot(db) exported: concurrently,
+    one pooled connection each, when PULL_CONCURRENT, a fan-out slot is free and the pool
+    has the extra connections idle; otherwise one after another on db.
+    """
+    async def fetch(stmt, session: AsyncSession) -> List[Any]:
+        return (await session.execute(stmt)).scalars().all()
+
+    extra_needed = len(queries) - 1
+    # Never wait for a slot or a connection: pulls queueing on each other's extras exhaust the pool
+    if not (PULL_CONCURRENT and extra_needed > 0) or _pull_slots.locked() or not _pool_has_room(extra_needed):
+        return [await fetch(stmt, db) for stmt in queries]
+
+    async with _pull_slots:
+        extra = [AsyncSessionLocal() for _ in range(extra_needed)]
+        try:
+            await _gather_or_cancel(*(begin_snapshot(session, snapshot) for session in extra))
+            return await _gather_or_cancel(
+                fetch(queries[0], db), *(fetch(stmt, session) for stmt, session in zip(queries[1:], extra))
+            )
+        finally:
+            for session in extra:
+                await session.close()
 
 # --- ENDPOINTS ---
 
 @router.post("/push", summary="Push local changes to Cloud")
-async def push_changes(payload: PushRequest, db: AsyncSession = Depends(get_db)):
+async def push_changes(payload: PushRequest, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Receive changes from Desktop App.
-    Apply changes to DB using Last-Write-Wins based on 'updated_at'.
-    """
-    # 1. Customers
-    for item in payload.customers:
-        await upsert_entity(db, Customer, item, payload.business_id)
-    
-    # 2. Products
-    for item in payload.products:
-        await upsert_entity(db, Product, item, payload.business_id)
-        
-    # 3. Bills (Complex: Handle items)
-    for bill_data in payload.bills:
-        # Upsert Bill Header
-        await upsert_entity(db, Bill, bill_data, payload.business_id)
-        
-        # Upsert Bill Items
-        # Strategy: Delete existing items for this bill and re-insert is safest for sync 
-        # IF the bill is being fully ignored/overwritten. 
-        # However, for efficiency, we might want to just upsert items too.
-        # Let's sticking to upserting items individually if they have IDs.
-        for item_data in bill_data.items:
-             await upsert_entity(db, BillItem, item_data, payload.business_id)
+    Apply changes to DB using Last-Write-Wins based on 'updated_at', in bulk per entity type.
+    """
+    return encode_response(request, await apply_push(payload, db))
+
+
+# Plain LWW entities, written before the bills that reference them
+PUSH_PLAN = (("customers", Customer), ("products", Product))
+
+
+async def write_changes(
+    db: AsyncSession, business_id: UUID, records: Dict[str, List[SyncEntity]]
+) -> Tuple[Dict[str, Dict[str, int]], int, bool]:
+    """
+    Upserts of records ({entity: [...]}; bills carry their items) in FK order, logged under
+    fresh seqs, inside the caller's transaction.
+    Returns (counts per entity, last_seq, whether anything changed).
+    """
+    # Taken first: pushes to one business serialize here, before any row locks
+    last_seq = await lock_sequence(db, business_id)
+    results, changes = {}, []
+    for entity, model in PUSH_PLAN:
+        results[entity], written = await bulk_upsert(db, model, records.get(entity, []), business_id)
+        changes += [(entity, entity_id) for entity_id in written]
+    results["bills"], results["bill_items"], written = await upsert_bills(db, records.get("bills", []), business_id)
+    changes += written
+    # Loose items (streaming pushes) after the bills they may belong to
+    counts, written = await upsert_loose_items(db, records.get("bill_items", []), business_id)
+    _add_counts(results["bill_items"], counts)
+    changes += [("bill_items", item_id) for item_id in written]
+    last_seq = await log_changes(db, business_id, last_seq, changes)
+    return results, last_seq, bool(changes)
 
+
+async def apply_push(payload: PushRequest, db: AsyncSession) -> Dict[str, Any]:
+    records = {"customers": payload.customers, "products": payload.products, "bills": payload.bills}
     try:
+        results, last_seq, changed = await write_changes(db, payload.business_id, records)
         await db.commit()
-        return {"status": "success", "message": "Changes synced successfully"}
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    if changed:
+        # Committed: wake the business's subscribed devices (on every API worker)
+        await change_broker.publish(payload.business_id, last_seq)
+    return {"status": "success", "message": "Changes synced successfully", "results": results,
+            "last_seq": last_seq}
+
+# --- STREAMING PUSH ---
+# Rows (a bill counts with its items) per batch; each batch is one transaction
+STREAM_BATCH_ROWS = int(os.getenv("SYNC_STREAM_BATCH_ROWS", 2000))
+STREAM_SCHEMAS = {"customers": CustomerSync, "products": ProductSync, "bills": BillSync, "bill_items": BillItemSync}
+
+
+def parse_stream_line(line: bytes) -> Tuple[str, SyncEntity]:
+    """One NDJSON line, {"entity": "customers", "record": {...}}, validated by the entity's schema."""
+    try:
+        data = json.loads(line)
+        entity = data["entity"]
+        schema = STREAM_SCHEMAS[entity]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Expected {{\"entity\": one of {sorted(STREAM_SCHEMAS)}, \"record\": {{...}}}}: {e}")
+    # ValidationError is a ValueError
+    return entity, schema.model_validate(data.get("record"))
+
+
+async def upload_progress(db: AsyncSession, upload_id: UUID, business_id: UUID) -> int:
+    """Lines of upload_id committed so far (0 if new)."""
+    upload = await db.get(SyncUpload, upload_id)
+    if upload is None:
+        return 0
+    if upload.business_id != business_id:
+        raise HTTPException(status_code=409, detail="upload_id belongs to another business")
+    return upload.committed_lines
+
+
+async def commit_stream_batch(db: AsyncSession, business_id: UUID, upload_id: UUID,
+                              records: Dict[str, List[SyncEntity]], committed_lines: int) -> Dict[str, Any]:
+    """Writes one batch and the upload's new progress in a single transaction."""
+    try:
+        results, last_seq, changed = await write_changes(db, business_id, records)
+        stmt = pg_insert(SyncUpload).values(
+            upload_id=upload_id, business_id=business_id, committed_lines=committed_lines
+        )
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[SyncUpload.upload_id],
+            set_={"committed_lines": stmt.excluded.committed_lines, "updated_at": func.now()},
+        ))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    if changed:
+        await change_broker.publish(business_id, last_seq)
+    return {"committed_lines": committed_lines, "results": results, "last_seq": last_seq}
 
 @router.post("/pull", response_model=PullResponse, summary="Pull cloud changes to Desktop")
-async def pull_changes(req: PullRequest, db: AsyncSession = Depends(get_db)):
+async def pull_changes(req: PullRequest, request: Request, db: AsyncSession = Depends(get_db)):
     """
-    Return all records modified after 'last_sync_timestamp' for the given business.
+    With 'after_seq': records changed after that server-assigned seq, in seq order. Call again
+    with the returned last_seq until has_more is false, and keep it for the next sync.
+    Otherwise (older clients): records modified after 'last_sync_timestamp', one page per
+    entity type. Call again with the returned cursors until has_more is false, then
+    store server_timestamp (the first page's) as the next last_sync_timestamp.
     """
-    response = PullResponse(server_timestamp=datetime.now(timezone.utc))
-    
-    # Helper to fetch
-    async def fetch_updates(model, model_sync_schema):
-        stmt = select(model).where(
-            model.business_id == req.business_id,
-            model.updated_at > req.last_sync_timestamp
-        )
-        result = await db.execute(stmt)
-        return [model_sync_schema.from_orm(row) for row in result.scalars().all()]
-
-    # 1. Customers
-    response.customers = await fetch_updates(Customer, CustomerSync)
-    
-    # 2. Products
-    response.products = await fetch_updates(Product, ProductSync)
-    
-    # 3. Bills (Need to fetch items eagerly? Or separate?)
-    # For simplicity, fetching Bills. Clients might need to fetch Items separately or we include them.
-    # Let's try to include items in the Bill schema if SQLAlchemy relationship is set up correctly (lazy='joined' helps).
-    # Since we didn't specify lazy loading in models, we might need explicit join or just fetch bills.
-    # For this iteration, let's fetch bills.
-    
-    stmt = select(Bill).where(
-        Bill.business_id == req.business_id,
-        Bill.updated_at > req.last_sync_timestamp
-    )
-    result = await db.execute(stmt)
-    bills = result.scalars().all()
-    
-    # Manually populate Pydantic models to ensure nested relationships if loaded
-    # To properly load items, we would typically use .options(selectinload(Bill.items))
-    # But for now let's return bills without items to avoid N+1 query complexity in this first pass
-    # OR we can just fetch items separately if the client sync logic supports it.
-    # The Schema `BillSync` has `items: List[BillItemSync] = []`.
-    # Let's populate it.
-    
-    from sqlalchemy.orm import selectinload
-    stmt_bills = select(Bill).options(selectinload(Bill.items)).where(
-         Bill.business_id == req.business_id,
-         Bill.updated_at > req.last_sync_timestamp
-    )
-    result_bills = await db.execute(stmt_bills)
-    response.bills = [BillSync.from_orm(b) for b in result_bills.scalars().all()]
+    return encode_response(request, await pull_page(req, db))
+
+
+async def pull_page(req: PullRequest, db: AsyncSession) -> PullResponse:
+    page_size = max(1, min(req.page_size or PULL_PAGE_SIZE, PULL_MAX_PAGE_SIZE))
+    if req.after_seq is not None:
+        return await pull_seq_page(req, db, page_size)
+    if req.last_sync_timestamp is None:
+        raise HTTPException(status_code=400, detail="Either after_seq or last_sync_timestamp is required")
+    try:
+        cursors = {entity: decode_cursor(token) for entity, token in (req.cursors or {}).items()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Every page of one pull reports the timestamp taken before its first page
+    started = next((c["started"] for c in cursors.values()), None) or datetime.now(timezone.utc)
+    response = PullResponse(server_timestamp=started)
+
+    def page_query(step: PullFetch):
+        """Next page in (updated_at, id) order, served by the (business_id, updated_at, id) index."""
+        model, cursor = step.model, cursors.get(step.entity)
+        stmt = select(model).where(model.business_id == req.business_id)
+        if cursor:
+            stmt = stmt.where(tuple_(model.updated_at, model.id) > tuple_(cursor["updated_at"], cursor["id"]))
+        else:
+            stmt = stmt.where(model.updated_at > req.last_sync_timestamp)
+        return stmt.order_by(model.updated_at, model.id).limit(page_size + 1)
+
+    # Fetch plan: one query per entity type still paging, plus one per child collection.
+    # Children select on the page subquery rather than the parent rows, so nothing waits.
+    steps, queries = [], []
+    for step in PULL_PLAN:
+        if cursors.get(step.entity, {}).get("done"):
+            response.cursors[step.entity] = encode_cursor(None, started)
+            continue
+        steps.append(step)
+        page = page_query(step)
+        queries.append(page)
+        if step.children:
+            queries.append(children_query(step, page))
+
+    # All queries read one snapshot, so a page never mixes before/after a concurrent push
+    snapshot = await begin_snapshot(db)
+    results = iter(await fetch_in_snapshot(db, snapshot, queries))
+    for step in steps:
+        rows = next(results)
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if step.children:
+            attach_children(step, rows, next(results))
+        if more:
+            response.has_more = True
+            response.cursors[step.entity] = encode_cursor((rows[-1].updated_at, rows[-1].id), started)
+        else:
+            response.cursors[step.entity] = encode_cursor(None, started)
+        setattr(response, step.entity, [step.schema.from_orm(row) for row in rows])
+    return response
+
+
+async def pull_seq_page(req: PullRequest, db: AsyncSession, page_size: int) -> PullResponse:
+    """
+    The next page_size change-log entries after req.after_seq, with their records. Exact and
+    clock-independent: every accepted write got a seq above everything pulled before it.
+    """
+    snapshot = await begin_snapshot(db)
+    log = (await db.execute(
+        select(SyncChange.entity, SyncChange.entity_id, SyncChange.seq)
+        .where(SyncChange.business_id == req.business_id, SyncChange.seq > req.after_seq)
+        .order_by(SyncChange.seq)
+        .limit(page_size + 1)
+    )).all()
+    response = PullResponse(server_timestamp=datetime.now(timezone.utc), has_more=len(log) > page_size)
+    log = log[:page_size]
+    response.last_seq = log[-1].seq if log else req.after_seq
 
+    changed = defaultdict(list)
+    for entry in log:
+        changed[entry.entity].append(entry.entity_id)
+
+    steps, queries = [], []
+    for step in PULL_PLAN:
+        model = step.model
+        matches = model.id.in_(changed[step.entity]) if changed[step.entity] else None
+        if step.children:
+            # A changed item brings its bill (with all items), as in timestamp pulls
+            foreign_key = step.children[1]
+            child_ids = changed[foreign_key.class_.__tablename__]
+            if child_ids:
+                parents = model.id.in_(select(foreign_key).where(foreign_key.class_.id.in_(child_ids)))
+                matches = parents if matches is None else matches | parents
+        if matches is None:
+            continue
+        page = select(model).where(model.business_id == req.business_id, matches)
+        steps.append(step)
+        queries.append(page)
+        if step.children:
+            queries.append(children_query(step, page))
+
+    results = iter(await fetch_in_snapshot(db, snapshot, queries))
+    for step in steps:
+        rows = next(results)
+        if step.children:
+            attach_children(step, rows, next(results))
+        setattr(response, step.entity, [step.schema.from_orm(row) for row in rows])
     return response
+
+@router.post("/push/stream", summary="Stream local changes to Cloud as NDJSON")
+async def push_stream(request: Request, business_id: UUID, upload_id: UUID, offset: int = 0):
+    """
+    Large uploads without holding them in memory. Body: NDJSON (application/x-ndjson,
+    optionally gzip/zstd), one {"entity": "customers" | "products" | "bills" | "bill_items",
+    "record": {...}} per line; records must come after the ones they reference (customers
+    and products, then bills, then loose bill items). Lines are validated as they arrive and
+    applied every SYNC_STREAM_BATCH_ROWS rows in their own transaction.
+
+    The response is NDJSON too: a progress line per committed batch, then {"done": true, ...}
+    or {"error": ..., "line": n, ...} (the lines before n are committed). To resume, resend
+    the same upload_id with the lines from committed_lines on, and offset=committed_lines;
+    lines the server already committed are skipped.
+    """
+    async with AsyncSessionLocal() as db:
+        committed = await upload_progress(db, upload_id, business_id)
+    if offset > committed:
+        raise HTTPException(status_code=409, detail=f"Only {committed} lines are committed; resume from offset {committed}")
+    lines = iter_lines(request)
+
+    def event(data: Dict[str, Any]) -> str:
+        return json.dumps(data) + "\n"
+
+    async def ingest():
+        line_no, batches = offset, 0
+        records, rows = defaultdict(list), 0
+        async with AsyncSessionLocal() as db:
+            try:
+                async for line in lines:
+                    line_no += 1
+                    if line_no <= committed or not line.strip():
+                        continue
+                    try:
+                        entity, record = parse_stream_line(line)
+                    except ValueError as e:
+                        # Keep the valid lines before this one
+                        if rows:
+                            batches += 1
+                            yield event({"batch": batches, **await commit_stream_batch(
+                                db, business_id, upload_id, records, line_no - 1)})
+                        yield event({"error": str(e), "line": line_no, "committed_lines": line_no - 1})
+                        return
+                    records[entity].append(record)
+                    rows += 1 + (len(record.items) if entity == "bills" else 0)
+                    if rows >= STREAM_BATCH_ROWS:
+                        batches += 1
+                        yield event({"batch": batches, **await commit_stream_batch(
+                            db, business_id, upload_id, records, line_no)})
+                        records, rows = defaultdict(list), 0
+                if rows:
+                    batches += 1
+                    yield event({"batch": batches, **await commit_stream_batch(
+                        db, business_id, upload_id, records, line_no)})
+                yield event({"done": True, "committed_lines": max(line_no, committed), "batches": batches})
+            except Exception as e:
+                # The failed batch rolled back; everything before it stays committed
+                progress = await upload_progress(db, upload_id, business_id)
+                yield event({"error": str(e), "line": None, "committed_lines": progress})
+
+    return DuplexStreamingResponse(ingest(), media_type=NDJSON)
+
+
+@router.get("/push/stream/{upload_id}", summary="Progress of a streaming push")
+async def push_stream_progress(upload_id: UUID, business_id: UUID):
+    """committed_lines: where to resume an interrupted streaming push."""
+    async with AsyncSessionLocal() as db:
+        return {"upload_id": str(upload_id), "committed_lines": await upload_progress(db, upload_id, business_id)}
+
+# --- CHANGE NOTIFICATIONS ---
+# Comment line sent on idle SSE streams, so proxies don't drop them
+NOTIFY_KEEPALIVE_SECONDS = float(os.getenv("SYNC_NOTIFY_KEEPALIVE_SECONDS", 15))
+
+
+async def current_seq(business_id: UUID) -> int:
+    async with AsyncSessionLocal() as session:
+        stmt = select(SyncSequence.last_seq).where(SyncSequence.business_id == business_id)
+        return (await session.execute(stmt)).scalar() or 0
+
+
+def _version_event(business_id: UUID, seq: int) -> Dict[str, Any]:
+    return {"business_id": str(business_id), "seq": seq}
+
+
+@router.get("/events", summary="Stream change notifications (Server-Sent Events)")
+async def change_events(business_id: UUID, request: Request, after_seq: Optional[int] = None):
+    """
+    Sends a `version` event ({"business_id", "seq"}) whenever a push for the business commits,
+    and one straight away if it is already past after_seq (or Last-Event-ID on reconnect;
+    without either, the current seq). Pull with after_seq on each event instead of polling.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if after_seq is None and last_event_id and last_event_id.isdigit():
+        after_seq = int(last_event_id)
+
+    async def stream():
+        async with change_broker.subscribe(business_id) as subscription:
+            # Subscribed first, so a push landing in between is not missed
+            subscription.offer(await current_seq(business_id))
+            sent = -1 if after_seq is None else after_seq
+            while not await request.is_disconnected():
+                seq = await subscription.wait(sent, timeout=NOTIFY_KEEPALIVE_SECONDS)
+                if seq is None:
+                    yield ": keepalive\n\n"
+                    continue
+                sent = seq
+                yield f"id: {seq}\nevent: version\ndata: {json.dumps(_version_event(business_id, seq))}\n\n"
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def change_socket(websocket: WebSocket, business_id: UUID, after_seq: Optional[int] = None):
+    """Same events as /events, as JSON messages over a WebSocket."""
+    await websocket.accept()
+    async with change_broker.subscribe(business_id) as subscription:
+        subscription.offer(await current_seq(business_id))
+
+        async def send_versions():
+            sent = -1 if after_seq is None else after_seq
+            while True:
+                sent = await subscription.wait(sent)
+                await websocket.send_json(_version_event(business_id, sent))
+
+        sender = asyncio.create_task(send_versions())
+        try:
+            # Clients have nothing to say; read only to notice the disconnect
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
@@ -0,0 +1,268 @@
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+# Optional wire formats: a codec whose library is missing is simply not offered
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Decompressed request bodies above this are rejected (a small gzip can expand enormously)
+MAX_BODY_BYTES = int(os.getenv("SYNC_MAX_BODY_BYTES", 64 * 1024 * 1024))
+# Responses smaller than this are sent uncompressed; the framing costs more than it saves
+COMPRESS_MIN_BYTES = int(os.getenv("SYNC_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("SYNC_GZIP_LEVEL", 6))
+ZSTD_LEVEL = int(os.getenv("SYNC_ZSTD_LEVEL", 3))
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+# Streamed line by line by its endpoint (iter_lines); SyncRoute leaves these bodies alone
+NDJSON = "application/x-ndjson"
+# Longest NDJSON line accepted; with streamed decompression this bounds memory per upload
+MAX_LINE_BYTES = int(os.getenv("SYNC_MAX_LINE_BYTES", 1024 * 1024))
+
+# --- BODY FORMATS ---
+# Stable schema for the binary formats: the same maps, keys and nesting as the JSON
+# body (field names from app/schemas), with native types instead of strings:
+#   UUID     -> msgpack bin (16 bytes)             | CBOR tag 37 (16 bytes)
+#   datetime -> msgpack Timestamp extension (-1)   | CBOR tag 1 (epoch seconds), UTC
+# Decoded bodies are validated by the same Pydantic models as JSON.
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return value.bytes
+    if isinstance(value, datetime):
+        return msgpack.Timestamp.from_datetime(value if value.tzinfo else value.replace(tzinfo=timezone.utc))
+    raise TypeError(f"Cannot encode {type(value).__name__} as msgpack")
+
+
+def _dump_json(value: Any) -> bytes:
+    if isinstance(value, BaseModel):
+        return value.model_dump_json().encode()
+    return json.dumps(value, default=str).encode()
+
+
+def _dump_msgpack(value: Any) -> bytes:
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    return msgpack.packb(value, default=_msgpack_default, datetime=False)
+
+
+def _cbor_default(encoder, value: Any):
+    # cbor2 matches exact types; asyncpg hands back its own UUID subclass
+    if isinstance(value, UUID):
+        return encoder.encode(cbor2.CBORTag(37, value.bytes))
+    raise cbor2.CBOREncodeTypeError(f"Cannot encode {type(value).__name__} as CBOR")
+
+
+def _dump_cbor(value: Any) -> bytes:
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    return cbor2.dumps(value, datetime_as_timestamp=True, timezone=timezone.utc, default=_cbor_default)
+
+
+# media type -> (dumps, loads)
+FORMATS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {JSON: (_dump_json, json.loads)}
+if msgpack:
+    FORMATS[MSGPACK] = (_dump_msgpack, lambda body: msgpack.unpackb(body, timestamp=3))
+if cbor2:
+    FORMATS[CBOR] = (_dump_cbor, cbor2.loads)
+
+# --- CONTENT ENCODINGS ---
+
+
+def _gunzip(body: bytes) -> bytes:
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = inflater.decompress(body, MAX_BODY_BYTES + 1)
+    if len(data) > MAX_BODY_BYTES or inflater.unconsumed_tail:
+        raise HTTPException(status_code=413, detail="Decompressed body too large")
+    return data
+
+
+def _unzstd(body: bytes) -> bytes:
+    with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+        data = reader.read(MAX_BODY_BYTES + 1)
+    if len(data) > MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Decompressed body too large")
+    return data
+
+
+# Content-Encoding token -> (compress, decompress), in server preference order
+ENCODINGS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {}
+if zstandard:
+    ENCODINGS["zstd"] = (lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), _unzstd)
+ENCODINGS["gzip"] = (lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0), _gunzip)
+
+
+def _stream_decompressor(encoding: str) -> Callable[[bytes], Iterator[bytes]]:
+    """chunk -> decompressed pieces, for bodies read incrementally."""
+    if encoding == "identity":
+        return lambda chunk: iter((chunk,))
+    if encoding == "gzip":
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        def gunzip(chunk: bytes) -> Iterator[bytes]:
+            # Bounded pieces: a small chunk may inflate to a lot
+            data = inflater.decompress(chunk, MAX_LINE_BYTES)
+            while data:
+                yield data
+                data = inflater.decompress(inflater.unconsumed_tail, MAX_LINE_BYTES)
+        return gunzip
+    if encoding == "zstd" and zstandard:
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        return lambda chunk: iter((decompressor.decompress(chunk),))
+    raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+
+
+def iter_lines(request: Request) -> AsyncIterator[bytes]:
+    """
+    The request body's lines, decompressed as they arrive; at most one line is held.
+    An unsupported Content-Encoding raises here, before the body is read.
+    """
+    decompress = _stream_decompressor((request.headers.get("content-encoding") or "identity").strip().lower())
+
+    async def lines() -> AsyncIterator[bytes]:
+        pending = b""
+        async for chunk in request.stream():
+            for piece in decompress(chunk):
+                *complete, pending = (pending + piece).split(b"\n")
+                for line in complete:
+                    yield line
+                if len(pending) > MAX_LINE_BYTES:
+                    raise ValueError(f"NDJSON line longer than {MAX_LINE_BYTES} bytes")
+        if pending:
+            yield pending
+
+    return lines()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse whose generator is still reading the request body (iter_lines).
+    StreamingResponse would otherwise wait on receive() for a disconnect and swallow the
+    body; here request.stream() reports the disconnect (ClientDisconnect) instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _media_type(header: Optional[str]) -> str:
+    return (header or JSON).split(";")[0].strip().lower()
+
+
+def _accepted(header: Optional[str]) -> Dict[str, float]:
+    """Accept-style header -> {token: q}, dropping q=0."""
+    accepted = {}
+    for part in (header or "").split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if token and q > 0:
+            accepted[token.lower()] = q
+    return accepted
+
+
+def negotiate(request: Request) -> Tuple[str, Optional[str]]:
+    """(body format, content encoding or None) for the response, from Accept / Accept-Encoding."""
+    accept = _accepted(request.headers.get("accept"))
+    media_type = max((m for m in FORMATS if m in accept), key=lambda m: accept[m], default=JSON)
+    accept_encoding = _accepted(request.headers.get("accept-encoding"))
+    # Ties go to the server's order (zstd first)
+    ranked = sorted((e for e in ENCODINGS if e in accept_encoding), key=lambda e: -accept_encoding[e])
+    return media_type, (ranked[0] if ranked else None)
+
+
+def encode_response(request: Request, content: Any, status_code: int = 200) -> Response:
+    """content (a Pydantic model or plain dict) in the format and encoding the client asked for."""
+    media_type, encoding = negotiate(request)
+    body = FORMATS[media_type][0](content)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding and len(body) >= COMPRESS_MIN_BYTES:
+        body = ENCODINGS[encoding][0](body)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+# --- REQUEST DECODING ---
+
+
+class DecodedRequest(Request):
+    """A request whose body was already decompressed and parsed by SyncRoute."""
+
+    def __init__(self, scope, receive, body: bytes, payload: Any):
+        super().__init__(scope, receive)
+        self._decoded_body = body
+        self._payload = payload
+
+    async def body(self) -> bytes:
+        return self._decoded_body
+
+    async def json(self) -> Any:
+        return self._payload
+
+
+async def decode_request(request: Request) -> Request:
+    """Undoes Content-Encoding and parses msgpack/CBOR bodies; plain JSON passes through untouched."""
+    encoding = (request.headers.get("content-encoding") or "identity").strip().lower()
+    media_type = _media_type(request.headers.get("content-type"))
+    if (encoding == "identity" and media_type == JSON) or media_type == NDJSON:
+        return request
+    if encoding != "identity" and encoding not in ENCODINGS:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    if media_type not in FORMATS:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Type: {media_type}")
+
+    body = await request.body()
+    try:
+        if encoding != "identity":
+            body = ENCODINGS[encoding][1](body)
+        payload = FORMATS[media_type][1](body) if body else None
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode {encoding} {media_type} body: {e}")
+
+    # FastAPI only hands JSON content types to the body parser; the payload is parsed already
+    headers = [(k, v) for k, v in request.scope["headers"] if k not in (b"content-encoding", b"content-type", b"content-length")]
+    headers += [(b"content-type", JSON.encode()), (b"content-length", str(len(body)).encode())]
+    return DecodedRequest({**request.scope, "headers": headers}, request.receive, body, payload)
+
+
+class SyncRoute(APIRoute):
+    """APIRoute accepting gzip/zstd-compressed and msgpack/CBOR request bodies (see decode_request)."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await handler(await decode_request(request))
+
+        return route_handler
@@ -0,0 +1,196 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger("DBStats")
+
+# Requests issuing more statements than this are logged: a per-row query loop (N+1) shows up here first
+STATEMENT_WARN = int(os.getenv("DB_STATEMENT_WARN", 100))
+
+# --- PER-REQUEST STATS ---
+# SQLAlchemy runs the async engine's sync internals in a greenlet that shares the calling
+# task's context, so the event hooks below see the ContextVar set by the middleware, and
+# tasks spawned by the request (e.g. concurrent pull queries) add to the same QueryStats.
+
+
+class QueryStats:
+    """DB work of one unit of work (normally a request)."""
+
+    __slots__ = ("statements", "db_ms", "checkouts", "checkout_wait_ms")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_ms = 0.0  # summed over statements; concurrent ones overlap
+        self.checkouts = 0
+        self.checkout_wait_ms = 0.0
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+
+@contextmanager
+def track() -> Iterator[QueryStats]:
+    """Attributes the DB work done inside the block (and its child tasks) to a fresh QueryStats."""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._db_stats_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    _record_statement(context)
+
+
+def _on_error(exception_context):
+    # after_cursor_execute doesn't fire for failed statements
+    if exception_context.execution_context is not None:
+        _record_statement(exception_context.execution_context)
+
+
+def _record_statement(context):
+    stats = _current.get()
+    started = getattr(context, "_db_stats_started", None)
+    if stats is not None and started is not None:
+        stats.statements += 1
+        stats.db_ms += (time.perf_counter() - started) * 1000
+
+
+def instrument_engine(engine):
+    """Counts and times every statement the engine runs (an AsyncEngine or its sync_engine)."""
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", _before_execute)
+    event.listen(target, "after_cursor_execute", _after_execute)
+    event.listen(target, "handle_error", _on_error)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The async engine's default pool, timing each checkout (queueing, or opening a connection)."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.checkouts += 1
+                stats.checkout_wait_ms += (time.perf_counter() - started) * 1000
+
+# --- AGGREGATES ---
+
+
+class DBMetrics:
+    """Totals of QueryStats per route ("POST /api/v1/sync/push"), since startup."""
+
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, float]] = {}
+
+    def record(self, route: str, stats: QueryStats, elapsed_ms: float):
+        agg = self._routes.get(route)
+        if agg is None:
+            agg = self._routes[route] = {
+                "requests": 0, "statements": 0, "max_statements": 0, "db_ms": 0.0,
+                "checkout_wait_ms": 0.0, "max_checkout_wait_ms": 0.0, "elapsed_ms": 0.0,
+            }
+        agg["requests"] += 1
+        agg["statements"] += stats.statements
+        agg["max_statements"] = max(agg["max_statements"], stats.statements)
+        agg["db_ms"] += stats.db_ms
+        agg["checkout_wait_ms"] += stats.checkout_wait_ms
+        agg["max_checkout_wait_ms"] = max(agg["max_checkout_wait_ms"], stats.checkout_wait_ms)
+        agg["elapsed_ms"] += elapsed_ms
+
+    def stats(self, pool=None) -> Dict[str, Any]:
+        """Per-route totals and averages (most DB time first), plus the pool's current state."""
+        routes = {}
+        for route, agg in sorted(self._routes.items(), key=lambda kv: -kv[1]["db_ms"]):
+            n = agg["requests"]
+            routes[route] = {
+                **{k: round(v, 2) for k, v in agg.items()},
+                "avg_statements": round(agg["statements"] / n, 2),
+                "avg_db_ms": round(agg["db_ms"] / n, 2),
+                "avg_checkout_wait_ms": round(agg["checkout_wait_ms"] / n, 2),
+                "avg_elapsed_ms": round(agg["elapsed_ms"] / n, 2),
+            }
+        result: Dict[str, Any] = {"routes": routes}
+        if pool is not None:
+            result["pool"] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "idle": pool.checkedin(),
+            }
+        return result
+
+    def reset(self):
+        self._routes.clear()
+
+
+def _route_template(scope) -> str:
+    """The request path with its path params put back as {name}, so ids don't multiply the keys."""
+    if scope.get("route") is None:
+        return "<unmatched>"
+    # route.path lacks the prefixes of the routers it was included into; the request path has them
+    template = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        template = template.replace(str(value), "{" + name + "}")
+    return template
+
+
+class DBStatsMiddleware:
+    """
+    ASGI middleware tracking each HTTP request's DB work. Responses carry X-DB-Statements,
+    X-DB-Time-Ms and X-DB-Pool-Wait-Ms (and Server-Timing); totals go to db_metrics.
+    Streaming responses send headers before their body runs, so there the headers cover
+    only the work done up to that point; the metrics cover all of it.
+    """
+
+    def __init__(self, app, metrics: Optional[DBMetrics] = None):
+        self.app = app
+        self.metrics = metrics or db_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        with track() as stats:
+
+            async def send_with_stats(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", []))
+                    headers = MutableHeaders(raw=message["headers"])
+                    headers["X-DB-Statements"] = str(stats.statements)
+                    headers["X-DB-Time-Ms"] = f"{stats.db_ms:.1f}"
+                    headers["X-DB-Pool-Wait-Ms"] = f"{stats.checkout_wait_ms:.1f}"
+                    headers.append("Server-Timing", f"db;dur={stats.db_ms:.1f}, db-pool;dur={stats.checkout_wait_ms:.1f}")
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_stats)
+            finally:
+                label = f"{scope['method']} {_route_template(scope)}"
+                self.metrics.record(label, stats, (time.perf_counter() - started) * 1000)
+                if stats.statements > STATEMENT_WARN:
+                    logger.warning(
+                        f"🐢 {label} issued {stats.statements} statements "
+                        f"({stats.db_ms:.0f}ms DB, {stats.checkout_wait_ms:.0f}ms pool wait)"
+                    )
+
+
+# Singleton
+db_metrics = DBMetrics()
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from .db import DATABASE_URL
+
+logger = logging.getLogger("ChangeBroker")
+
+# "postgres": LISTEN/NOTIFY, reaches every API worker; "local": this process only (tests, single worker)
+NOTIFY_BACKEND = os.getenv("SYNC_NOTIFY_BACKEND", "postgres")
+NOTIFY_CHANNEL = os.getenv("SYNC_NOTIFY_CHANNEL", "sync_changes")
+RECONNECT_SECONDS = float(os.getenv("SYNC_NOTIFY_RECONNECT_SECONDS", 2))
+
+# --- PUB/SUB BACKENDS ---
+# A backend moves "business advanced to seq N" messages between API workers.
+# start(deliver) subscribes; deliver(message) is then called for every message
+# published by any worker, including this one.
+
+
+class LocalPubSub:
+    """In-process stand-in: messages reach only this worker's subscribers."""
+
+    def __init__(self):
+        self._deliver: Optional[Callable[[str], None]] = None
+
+    async def start(self, deliver: Callable[[str], None]):
+        self._deliver = deliver
+
+    async def publish(self, message: str):
+        if self._deliver:
+            self._deliver(message)
+
+    async def stop(self):
+        self._deliver = None
+
+
+class PostgresPubSub:
+    """LISTEN/NOTIFY on one dedicated asyncpg connection per worker."""
+
+    def __init__(self, dsn: Optional[str] = None, channel: str = NOTIFY_CHANNEL):
+        # SQLAlchemy URL -> plain libpq DSN for asyncpg
+        self.dsn = dsn or make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self._conn = None
+        self._deliver: Optional[Callable[[str], None]] = None
+        self._lock = asyncio.Lock()  # one connection: publishes take turns
+        self._reconnect: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Callable[[str], None]):
+        self._deliver = deliver
+        self._conn = await asyncpg.connect(self.dsn)
+        await self._conn.add_listener(self.channel, self._on_notify)
+        self._conn.add_termination_listener(self._on_terminated)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        if self._deliver:
+            self._deliver(payload)
+
+    def _on_terminated(self, conn):
+        if self._deliver and not self._reconnect:
+            logger.warning("⚠️ Change notification connection lost; reconnecting")
+            self._reconnect = asyncio.get_running_loop().create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        deliver = self._deliver
+        while self._deliver:
+            try:
+                await self.start(deliver)
+                logger.info("🔌 Change notifications reconnected")
+                break
+            except Exception as e:
+                logger.warning(f"⚠️ Change notification reconnect failed: {e}")
+                await asyncio.sleep(RECONNECT_SECONDS)
+        self._reconnect = None
+
+    async def publish(self, message: str):
+        async with self._lock:
+            await self._conn.execute("SELECT pg_notify($1, $2)", self.channel, message)
+
+    async def stop(self):
+        self._deliver = None
+        if self._reconnect:
+            self._reconnect.cancel()
+        if self._conn and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+
+def backend_from_env():
+    return LocalPubSub() if NOTIFY_BACKEND == "local" else PostgresPubSub()
+
+# --- BROKER ---
+
+
+class Subscription:
+    """
+    One client's view of a business: the newest seq announced. Events coalesce, so a
+    slow client holds a single pending value however many pushes happen meanwhile.
+    """
+
+    def __init__(self, business_id: str):
+        self.business_id = business_id
+        self.seq = 0
+        self._changed = asyncio.Event()
+
+    def offer(self, seq: int):
+        if seq > self.seq:
+            self.seq = seq
+            self._changed.set()
+
+    async def wait(self, after_seq: int, timeout: Optional[float] = None) -> Optional[int]:
+        """The newest seq once it exceeds after_seq, or None on timeout."""
+        while self.seq <= after_seq:
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.seq
+
+
+class ChangeBroker:
+    """Fans "business advanced to seq N" out to this worker's subscribers, via a pub/sub backend."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._started = False
+        self._start_lock: Optional[asyncio.Lock] = None
+
+    async def start(self):
+        """Idempotent; publish() and subscribe() call it on first use."""
+        if self._started:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._started:
+                return
+            if self.backend is None:
+                self.backend = backend_from_env()
+            await self.backend.start(self._deliver)
+            self._started = True
+            logger.info(f"📡 Change broker started ({type(self.backend).__name__})")
+
+    async def stop(self):
+        if self._started:
+            await self.backend.stop()
+            self._started = False
+
+    async def publish(self, business_id, seq: int):
+        """
+        Call after the write that produced seq has committed. Best effort: a failure is
+        logged, and clients still catch up on their next pull.
+        """
+        try:
+            await self.start()
+            await self.backend.publish(json.dumps({"business_id": str(business_id), "seq": seq}))
+        except Exception as e:
+            logger.warning(f"⚠️ Change notification for {business_id} (seq {seq}) failed: {e}")
+
+    def _deliver(self, message: str):
+        try:
+            event = json.loads(message)
+            business_id, seq = event["business_id"], int(event["seq"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"⚠️ Ignoring malformed change notification: {message!r}")
+            return
+        for subscription in self._subscribers.get(business_id, ()):
+            subscription.offer(seq)
+
+    @asynccontextmanager
+    async def subscribe(self, business_id) -> AsyncIterator[Subscription]:
+        await self.start()
+        subscription = Subscription(str(business_id))
+        self._subscribers.setdefault(subscription.business_id, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._subscribers.get(subscription.business_id)
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.business_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "businesses": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
+
+
+# Singleton
+change_broker = ChangeBroker()
@@ -1,9 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from typing import Optional
+import hmac
 import uvicorn
 import os
 
 from .core.db import engine, Base
+from .core.instrumentation import DBStatsMiddleware, db_metrics
+from .core.notify import change_broker
 from .api.v1.endpoints import sync, business
 # from .api.v1.endpoints import auth # If we had a dedicated auth endpoint for login
 
@@ -17,6 +21,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Statements, DB time and pool wait per request: X-DB-* headers and /admin/db-stats
+app.add_middleware(DBStatsMiddleware)
 
 # Include Routers
 app.include_router(sync.router, prefix="/api/v1/sync", tags=["Sync"])
@@ -28,6 +34,26 @@ async def startup():
     # create tables if they don't exist (useful for dev)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # Listen for other workers' change notifications from the start
+    await change_broker.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await change_broker.stop()
+
+# Admin endpoints: served only when ADMIN_TOKEN is set, to requests sending it as X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/admin/db-stats", dependencies=[Depends(require_admin)])
+async def db_stats():
+    """Per-route statement counts, DB time and pool wait since startup, and the pool's state."""
+    return db_metrics.stats(engine.pool)
 
 @app.get("/")
 def health_check():
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Numeric, text
+from sqlalchemy import BigInteger, Column, String, Boolean, DateTime, ForeignKey, Index, Numeric, UniqueConstraint, text
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import declared_attr, relationship
 from sqlalchemy.sql import func
 import uuid
 from ..core.db import Base
@@ -13,6 +13,11 @@ class SyncMixin:
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
     is_deleted = Column(Boolean, default=False)
 
+    @declared_attr
+    def __table_args__(cls):
+        # Pull pages walk (updated_at, id) per business (keyset pagination)
+        return (Index(f"ix_{cls.__tablename__}_sync_cursor", "business_id", "updated_at", "id"),)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -74,6 +79,9 @@ class Bill(Base, SyncMixin):
     bill_date = Column(DateTime(timezone=True), nullable=False)
     total_amount = Column(Numeric(15, 2), nullable=False)
     status = Column(String, default='PAID')
+    # Content hashes of the last pushed header and item set; pushes matching them are skipped
+    header_hash = Column(String(32))
+    items_hash = Column(String(32))  # NULL: unknown, e.g. after a loose item write
     
     items = relationship("BillItem", back_populates="bill")
 
@@ -82,7 +90,7 @@ class BillItem(Base, SyncMixin):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.business_id"), nullable=False, index=True)
-    bill_id = Column(UUID(as_uuid=True), ForeignKey("bills.id"), nullable=False)
+    bill_id = Column(UUID(as_uuid=True), ForeignKey("bills.id"), nullable=False, index=True)
     product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), nullable=True)
     
     qty = Column(Numeric(10, 2), nullable=False)
@@ -90,3 +98,30 @@ class BillItem(Base, SyncMixin):
     total = Column(Numeric(15, 2), nullable=False)
     
     bill = relationship("Bill", back_populates="items")
+
+class SyncSequence(Base):
+    """Per-business change counter; its row lock orders concurrent pushes."""
+    __tablename__ = "sync_sequences"
+
+    business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.business_id"), primary_key=True)
+    last_seq = Column(BigInteger, nullable=False, default=0)
+
+class SyncChange(Base):
+    """Change log, compacted to the latest seq per record; pulls read it in (business_id, seq) order."""
+    __tablename__ = "sync_changes"
+
+    business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.business_id"), primary_key=True)
+    seq = Column(BigInteger, primary_key=True)
+    entity = Column(String, nullable=False)  # customers / products / bills / bill_items
+    entity_id = Column(UUID(as_uuid=True), nullable=False)
+
+    __table_args__ = (UniqueConstraint("entity", "entity_id", name="uq_sync_changes_entity"),)
+
+class SyncUpload(Base):
+    """Progress of a streaming push, committed with each batch so an interrupted upload can resume."""
+    __tablename__ = "sync_uploads"
+
+    upload_id = Column(UUID(as_uuid=True), primary_key=True)
+    business_id = Column(UUID(as_uuid=True), ForeignKey("businesses.business_id"), nullable=False)
+    committed_lines = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
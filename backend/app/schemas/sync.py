@@ -50,10 +50,21 @@ class PushRequest(BaseModel):
 
 class PullRequest(BaseModel):
     business_id: UUID
-    last_sync_timestamp: datetime
+    # Preferred: last_seq from the previous pull (0 for a full pull); exact regardless of device clocks
+    after_seq: Optional[int] = None
+    # Legacy time-window pull, used when after_seq is not given
+    last_sync_timestamp: Optional[datetime] = None
+    # Continuation tokens from the previous page's response (omit on the first page)
+    cursors: Optional[Dict[str, str]] = None
+    page_size: Optional[int] = None
 
 class PullResponse(BaseModel):
     customers: List[CustomerSync] = []
     products: List[ProductSync] = []
     bills: List[BillSync] = []
     server_timestamp: datetime
+    # Send these back with the same last_sync_timestamp until has_more is false
+    cursors: Dict[str, str] = {}
+    has_more: bool = False
+    # Seq pulls: highest seq included; the next page's (and next sync's) after_seq
+    last_seq: Optional[int] = None
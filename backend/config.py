@@ -14,5 +14,12 @@ class Settings:
     # AI (Gemini)
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     AI_MODEL: str = "gemini-1.5-flash"
+    AI_MAX_CONCURRENCY: int = int(os.getenv("AI_MAX_CONCURRENCY", 8))  # global in-flight Gemini calls
+    AI_BATCH_PARALLELISM: int = int(os.getenv("AI_BATCH_PARALLELISM", 4))  # per batch call
+
+    # AI (Product Images)
+    AI_IMAGE_MAX_PIXELS: int = int(os.getenv("AI_IMAGE_MAX_PIXELS", 1024 * 1024))
+    AI_IMAGE_JPEG_QUALITY: int = int(os.getenv("AI_IMAGE_JPEG_QUALITY", 85))
+    AI_IMAGE_HASH_MAX_DISTANCE: int = int(os.getenv("AI_IMAGE_HASH_MAX_DISTANCE", 6))  # of 64 pHash bits
 
 settings = Settings()
@@ -0,0 +1,59 @@
+"""
+IndexProvisioner: Ensures the indexes QueryEngine's (rewritten) SQL relies on.
+Uses a short-lived read-write connection; everything else in QueryEngine is
+read-only. Index names carry a 'qe_' prefix so they never collide with the
+app's own Drift migrations, and IF NOT EXISTS makes every run idempotent.
+"""
+
+import logging
+import sqlite3
+import time
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger("IndexProvisioner")
+
+# (index name, table, column list)
+QUERY_INDEXES: List[Tuple[str, str, str]] = [
+    ("qe_bills_user_deleted_date", "bills", "user_id, deleted_at, bill_date"),
+    ("qe_customers_user_dues", "customers", "user_id, total_dues"),
+    ("qe_products_user_name", "products", "user_id, name COLLATE NOCASE"),
+    ("qe_journal_user_date", "journal_entries", "user_id, entry_date"),
+]
+
+
+def ensure_indexes(db_path: str, indexes: List[Tuple[str, str, str]] = None,
+                   busy_timeout_ms: int = 5000) -> Dict[str, str]:
+    """
+    Creates missing indexes and refreshes planner stats.
+    Returns {index_name: "created" | "exists" | "skipped: <reason>"}.
+    """
+    indexes = indexes or QUERY_INDEXES
+    report: Dict[str, str] = {}
+    conn = sqlite3.connect(db_path, timeout=busy_timeout_ms / 1000)
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        created = []
+        for name, table, columns in indexes:
+            if table not in tables:
+                report[name] = f"skipped: no table {table}"
+                continue
+            if name in existing:
+                report[name] = "exists"
+                continue
+            started = time.time()
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+            conn.commit()
+            created.append(name)
+            report[name] = "created"
+            logger.info(f"📇 Created index {name} on {table}({columns}) in {time.time() - started:.2f}s")
+        # Let the planner see the new indexes' selectivity
+        for name in created:
+            conn.execute(f"ANALYZE {name}")
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Could not provision indexes on {db_path}: {e}")
+        report["error"] = str(e)
+    finally:
+        conn.close()
+    return report
@@ -1,4 +1,6 @@
 import os
+import hmac
+import json
 import shutil
 import uuid
 import logging
@@ -13,8 +15,9 @@ import edge_tts # Added edge-tts
 from pathlib import Path
 from typing import Optional
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 # Import Logic
@@ -67,6 +70,14 @@ def load_models():
 async def startup_event():
     load_models()
 
+    # Optional: precompute owner insights in the background (0 = disabled, use cron instead)
+    interval = float(os.getenv("INSIGHT_PRECOMPUTE_INTERVAL_S", 0))
+    if interval > 0:
+        import asyncio
+        from services.insight_cache import insight_cache
+        asyncio.create_task(insight_cache.run_scheduler(interval))
+        logger.info(f"🧠 Insight precompute scheduled every {interval:.0f}s")
+
 # --- HELPER: AUDIO GENERATION ---
 VOICE_MAP = {
     "hi": "hi-IN-SwaraNeural",
@@ -163,20 +174,27 @@ async def chat_endpoint(req: ChatRequest):
 class QueryRequest(BaseModel):
     user_uid: str
     question: str
+    stream: bool = False  # NDJSON rows, for exports / long lists
+    business_id: Optional[str] = None  # Postgres backend: which business (default: the one the user owns)
 
 @app.post("/query")
 async def query_endpoint(req: QueryRequest):
     """
     Direct Business Query Endpoint.
     Translates natural language to SQL and returns results.
+    With stream=true the response is application/x-ndjson: one {"row": ...} line
+    per row, then a final {"done": true, "success", "text", "count", ...} line.
     """
     from query_engine import query_engine
     
     check_rate_limit(req.user_uid)
     
+    if req.stream:
+        return StreamingResponse(_ndjson_query(req), media_type="application/x-ndjson")
+    
     try:
         start_time = time.time()
-        result = await query_engine.run_query(req.user_uid, req.question)
+        result = await query_engine.run_query(req.user_uid, req.question, business_id=req.business_id)
         
         return {
             "success": result.get("success", False),
@@ -188,6 +206,67 @@ async def query_endpoint(req: QueryRequest):
         logger.error(f"Query Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _ndjson_query(req: QueryRequest):
+    """Serializes QueryEngine.stream_query events; one chunk per fetched batch."""
+    from query_engine import query_engine
+    
+    start_time = time.time()
+    async for event in query_engine.stream_query(req.user_uid, req.question, business_id=req.business_id):
+        if "rows" in event:
+            yield "".join(json.dumps({"row": row}, default=str, ensure_ascii=False) + "\n" for row in event["rows"])
+        else:
+            event["processing_time_ms"] = int((time.time() - start_time) * 1000)
+            yield json.dumps(event, default=str, ensure_ascii=False) + "\n"
+
+# --- ADMIN ENDPOINTS ---
+# Served only when ADMIN_TOKEN is set, and only to requests that send it as X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/admin/query-cache", dependencies=[Depends(require_admin)])
+async def query_cache_stats():
+    """Hit ratio and size of the QueryEngine result cache (or tenant handle stats)."""
+    from query_engine import query_engine
+
+    return query_engine.cache_stats()
+
+
+@app.get("/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def slow_queries(limit: int = 20, min_count: int = 1):
+    """Slowest recurring query shapes (by total time over threshold) and the latest slow calls."""
+    from slow_query_log import slow_query_log
+
+    return {
+        "stats": slow_query_log.stats(),
+        "shapes": slow_query_log.top_shapes(limit=limit, min_count=min_count),
+        "recent": slow_query_log.recent(limit=limit),
+    }
+
+
+# --- PRECOMPUTED INSIGHTS (STALE-WHILE-REVALIDATE) ---
+@app.get("/insights/{user_uid}")
+async def insights_endpoint(user_uid: str, kind: str = "daily"):
+    """
+    Returns the cached daily/dashboard insight immediately.
+    Stale entries are refreshed in the background; 'stale' tells the client.
+    """
+    from services.insight_cache import insight_cache
+
+    check_rate_limit(user_uid)
+
+    try:
+        return await insight_cache.get_insight(user_uid, kind)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error(f"Insight Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 
 # --- PROCESSED VOICE (AGENT) ---
 @app.post("/process-voice")
@@ -0,0 +1,4 @@
+"""
+Performance tooling for the DukanX Brain service.
+Offline LLM stand-in, load generation and micro-benchmarks.
+"""
@@ -0,0 +1,68 @@
+"""
+Benchmark: calculate_period_stats on a fetched list of bills vs streamed chunks.
+
+    python -m perf.bench_period_stats --bills 200000 --items 5
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from perf.synthetic_db import PRODUCT_NAMES
+from tools import calculators
+
+
+def make_bills(count: int, items_per_bill: int, seed: int = 7):
+    """Firestore-shaped bill dicts, as fetch_sales_as_dataframe returns them."""
+    rng = random.Random(seed)
+    for i in range(count):
+        items = [{"vegName": rng.choice(PRODUCT_NAMES), "qty": rng.randint(1, 10), "price": rng.uniform(5, 500)}
+                 for _ in range(rng.randint(1, items_per_bill * 2 - 1))]
+        yield {"id": f"bill-{i}", "grandTotal": round(rng.uniform(20, 5000), 2), "items": items}
+
+
+def chunked(bills, size: int):
+    chunk = []
+    for bill in bills:
+        chunk.append(bill)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed * 1000, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Period stats benchmark (list vs chunked)")
+    parser.add_argument("--bills", type=int, default=200_000)
+    parser.add_argument("--items", type=int, default=5, help="average items per bill")
+    parser.add_argument("--chunk", type=int, default=2000)
+    args = parser.parse_args()
+
+    runs = {
+        # Whole period fetched first, as fetch_sales_as_dataframe does
+        "list": measure(lambda: calculators.calculate_period_stats(list(make_bills(args.bills, args.items)))),
+        # Generated lazily like a Firestore stream: peak memory is one chunk plus the totals
+        "chunked": measure(lambda: calculators.calculate_period_stats(
+            chunked(make_bills(args.bills, args.items), args.chunk))),
+    }
+
+    print(f"\n{'mode':<14}{'time':>12}{'peak MB':>10}  top item")
+    for name, (result, ms, peak) in runs.items():
+        print(f"{name:<14}{ms:>10.0f}ms{peak:>10.1f}  {result['top_items'][0]}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: product stock lookups, LIKE '%name%' scan vs the FTS5 trigram index.
+
+    python -m perf.bench_product_search --products-per-user 5000 --repeat 200
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from perf.synthetic_db import build
+from product_search import ProductSearchIndex, search_query
+from query_templates import PRODUCT_STOCK_SQL, _like_pattern
+
+UID = "user-000"
+
+# Names as a shopkeeper might say them; LIKE only finds the exact spelling
+LOOKUPS = ["Amul Milk", "milk", "doodh", "दूध", "toor dal", "चीनी", "cheeni", "atta", "Maggi"]
+# Hindi-named stock so transliteration has something to find
+HINDI_PRODUCTS = ["दूध 1 लीटर", "चीनी 1kg", "तूर दाल 500g", "आटा 10kg", "हल्दी पाउडर 100g"]
+
+
+def add_hindi_products(db_path: str):
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO products (id, user_id, name, stock_quantity, unit, selling_price, created_at) "
+        "VALUES (?, ?, ?, ?, 'pcs', 50, strftime('%s', 'now'))",
+        [(str(uuid.uuid4()), UID, name, 25) for name in HINDI_PRODUCTS],
+    )
+    conn.commit()
+    conn.close()
+
+
+def time_query(conn: sqlite3.Connection, sql: str, params, repeat: int) -> float:
+    conn.execute(sql, params).fetchall()  # warm page cache
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(db_path: str, repeat: int):
+    index = ProductSearchIndex(db_path)
+    if not index.ensure_schema():
+        raise SystemExit("FTS5 trigram tokenizer unavailable (needs SQLite 3.34+)")
+    index.refresh()
+    conn = sqlite3.connect(db_path)
+    results = {}
+    for name in LOOKUPS:
+        like_params = (UID, _like_pattern(name))
+        fts_sql, fts_params = search_query(UID, name)
+        results[name] = {
+            "like_rows": len(conn.execute(PRODUCT_STOCK_SQL, like_params).fetchall()),
+            "fts_rows": len(conn.execute(fts_sql, fts_params).fetchall()),
+            "like_ms": time_query(conn, PRODUCT_STOCK_SQL, like_params, repeat),
+            "fts_ms": time_query(conn, fts_sql, fts_params, repeat),
+        }
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Product search benchmark (LIKE vs FTS5 trigram)")
+    parser.add_argument("--db", help="existing Drift DB (default: build a synthetic one)")
+    parser.add_argument("--products-per-user", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.gettempdir(), "dukanx_bench_product_search.db")
+        build(db_path, bills=20_000, products_per_user=args.products_per_user)
+        add_hindi_products(db_path)
+
+    results = run(db_path, args.repeat)
+    print(f"\n{'lookup':<12}{'like rows':>10}{'fts rows':>10}{'like':>12}{'fts':>12}{'speedup':>10}")
+    for name, r in results.items():
+        speedup = r["like_ms"] / max(r["fts_ms"], 1e-6)
+        print(f"{name:<12}{r['like_rows']:>10}{r['fts_rows']:>10}{r['like_ms']:>10.3f}ms"
+              f"{r['fts_ms']:>10.3f}ms{speedup:>9.0f}x")
+    print()
+
+
+if __name__ == "__main__":
+    main()
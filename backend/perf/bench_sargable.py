@@ -0,0 +1,91 @@
+"""
+Benchmark: prompted SQL vs sargable rewrite, with and without provisioned indexes.
+
+    python -m perf.bench_sargable --bills 1000000 --repeat 20
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+from index_provisioner import QUERY_INDEXES, ensure_indexes
+from perf.synthetic_db import build
+from sql_rewriter import sql_rewriter
+
+UID = "user-000"  # the heavy wholesaler
+
+WORKLOAD = {
+    "today_sales": f"SELECT COALESCE(SUM(grand_total), 0) as total_sales FROM bills WHERE user_id = '{UID}' "
+                   "AND deleted_at IS NULL AND datetime(bill_date, 'unixepoch') >= datetime('now', 'start of day')",
+    "month_revenue": f"SELECT COALESCE(SUM(grand_total), 0) as revenue FROM bills WHERE user_id = '{UID}' "
+                     "AND deleted_at IS NULL AND strftime('%Y-%m', datetime(bill_date, 'unixepoch')) = strftime('%Y-%m', 'now')",
+    "week_sales": f"SELECT COALESCE(SUM(grand_total), 0) as total_sales FROM bills WHERE user_id = '{UID}' "
+                  "AND deleted_at IS NULL AND bill_date >= strftime('%s', 'now', '-7 days')",
+    "top_dues": f"SELECT name, total_dues FROM customers WHERE user_id = '{UID}' AND deleted_at IS NULL "
+                "AND total_dues > 0 ORDER BY total_dues DESC LIMIT 5",
+    "stock_prefix": f"SELECT name, stock_quantity, unit FROM products WHERE user_id = '{UID}' "
+                    "AND deleted_at IS NULL AND LOWER(name) LIKE 'amul milk%'",
+}
+
+
+def time_query(conn: sqlite3.Connection, sql: str, repeat: int) -> float:
+    conn.execute(sql).fetchall()  # warm page cache
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def drop_indexes(db_path: str):
+    conn = sqlite3.connect(db_path)
+    for name, _, _ in QUERY_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+    conn.close()
+
+
+def run(db_path: str, repeat: int):
+    results = {}
+    for phase in ("no_index", "indexed"):
+        if phase == "no_index":
+            drop_indexes(db_path)
+        else:
+            ensure_indexes(db_path)
+        conn = sqlite3.connect(db_path)
+        for name, sql in WORKLOAD.items():
+            rewritten = sql_rewriter.rewrite(sql)
+            a, b = conn.execute(sql).fetchall(), conn.execute(rewritten).fetchall()
+            assert a == b, f"{name}: rewrite changed the result ({a} != {b})"
+            results.setdefault(name, {})[f"{phase}/prompted"] = time_query(conn, sql, repeat)
+            results[name][f"{phase}/rewritten"] = time_query(conn, rewritten, repeat)
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sargable rewrite + index provisioning benchmark")
+    parser.add_argument("--db", help="existing Drift DB (default: build a synthetic one)")
+    parser.add_argument("--bills", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.gettempdir(), "dukanx_bench_sargable.db")
+        build(db_path, bills=args.bills)
+
+    results = run(db_path, args.repeat)
+    cols = ["no_index/prompted", "no_index/rewritten", "indexed/prompted", "indexed/rewritten"]
+    print(f"\n{'query':<16}" + "".join(f"{c:>22}" for c in cols) + f"{'speedup':>10}")
+    for name, r in results.items():
+        speedup = r["no_index/prompted"] / max(r["indexed/rewritten"], 1e-6)
+        print(f"{name:<16}" + "".join(f"{r[c]:>20.2f}ms" for c in cols) + f"{speedup:>9.0f}x")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: queries/second for QueryEngine-style SQL with and without SQLitePool.
+
+Baseline reproduces the old _execute_sql (sqlite3.connect per query, run on the
+event loop). Pooled runs the same workload through SQLitePool from many
+concurrent coroutines.
+
+    python -m perf.bench_sqlite_pool --bills 200000 --queries 2000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+from perf.synthetic_db import build
+from sqlite_pool import SQLitePool
+
+WORKLOAD = [
+    "SELECT COALESCE(SUM(grand_total), 0) as total_sales FROM bills WHERE user_id = 'user-003' "
+    "AND deleted_at IS NULL AND bill_date >= CAST(strftime('%s', 'now', 'start of day') AS INTEGER)",
+    "SELECT name, total_dues FROM customers WHERE user_id = 'user-001' AND deleted_at IS NULL "
+    "AND total_dues > 0 ORDER BY total_dues DESC LIMIT 5",
+    "SELECT name, stock_quantity, unit FROM products WHERE user_id = 'user-002' AND deleted_at IS NULL "
+    "AND name LIKE 'Amul Milk%' LIMIT 20",
+    "SELECT id, grand_total FROM bills WHERE id = (SELECT id FROM bills WHERE user_id = 'user-005' LIMIT 1)",
+]
+
+
+def baseline_execute(db_path: str, sql: str):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(r) for r in conn.execute(sql).fetchall()]
+    finally:
+        conn.close()
+
+
+async def run_baseline(db_path: str, queries: int, concurrency: int) -> float:
+    # The old code path is synchronous inside an async handler: concurrency does not help
+    async def worker(n):
+        for i in range(n):
+            baseline_execute(db_path, WORKLOAD[i % len(WORKLOAD)])
+            await asyncio.sleep(0)
+
+    per = queries // concurrency
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(per) for _ in range(concurrency)))
+    return (per * concurrency) / (time.perf_counter() - start)
+
+
+async def run_pooled(db_path: str, queries: int, concurrency: int, size: int) -> float:
+    pool = SQLitePool(db_path, size=size)
+    try:
+        async def worker(n):
+            for i in range(n):
+                await pool.execute(WORKLOAD[i % len(WORKLOAD)])
+
+        await pool.execute("SELECT 1")  # warm one connection
+        per = queries // concurrency
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(per) for _ in range(concurrency)))
+        return (per * concurrency) / (time.perf_counter() - start)
+    finally:
+        pool.close()
+
+
+async def loop_stall_ms(coro) -> tuple:
+    """Worst event-loop stall observed while coro runs (how long other requests would wait)."""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            t = time.perf_counter()
+            await asyncio.sleep(0.001)
+            worst = max(worst, (time.perf_counter() - t) * 1000 - 1)
+
+    tick = asyncio.create_task(ticker())
+    result = await coro
+    done = True
+    await tick
+    return result, worst
+
+
+async def main_async(args):
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.gettempdir(), "dukanx_bench_pool.db")
+        build(db_path, bills=args.bills)
+
+    base_qps, base_stall = await loop_stall_ms(run_baseline(db_path, args.queries, args.concurrency))
+    pool_qps, pool_stall = await loop_stall_ms(run_pooled(db_path, args.queries, args.concurrency, args.pool_size))
+
+    print(f"\n{'mode':<22}{'qps':>10}{'max loop stall ms':>20}")
+    print(f"{'connect-per-query':<22}{base_qps:>10.0f}{base_stall:>20.1f}")
+    print(f"{'SQLitePool(' + str(args.pool_size) + ')':<22}{pool_qps:>10.0f}{pool_stall:>20.1f}")
+    print(f"speedup: {pool_qps / base_qps:.2f}x\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLitePool vs connect-per-query benchmark")
+    parser.add_argument("--db", help="existing Drift DB (default: build a synthetic one)")
+    parser.add_argument("--bills", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: sync payload size and server CPU per 1,000 entities for each body format
+(JSON, msgpack, CBOR) and content encoding (none, gzip, zstd).
+
+    python -m perf.bench_sync_codec --entities 5000 --repeat 20
+"""
+
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.core import codec
+from app.schemas.sync import BillItemSync, BillSync, CustomerSync, ProductSync, PullResponse, PushRequest
+from perf.synthetic_db import PRODUCT_NAMES
+
+
+def make_payload(entities: int, seed: int = 7) -> PullResponse:
+    """A pull page of about `entities` records: 20% customers, 20% products, the rest bills of 1-6 items."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+
+    def stamp():
+        return now - timedelta(seconds=rng.randint(0, 30 * 86400))
+
+    customers = [CustomerSync(id=uuid.uuid4(), updated_at=stamp(), name=f"Customer {i}",
+                              phone=f"98{rng.randint(10**7, 10**8 - 1)}", balance=round(rng.uniform(0, 5000), 2))
+                 for i in range(entities // 5)]
+    products = [ProductSync(id=uuid.uuid4(), updated_at=stamp(), name=rng.choice(PRODUCT_NAMES), sku=f"SKU{i:05d}",
+                            price=round(rng.uniform(5, 500), 2), stock_qty=rng.randint(0, 200), unit="pcs")
+                for i in range(entities // 5)]
+    bills, count = [], len(customers) + len(products)
+    while count < entities:
+        bill_id, ts = uuid.uuid4(), stamp()
+        items = []
+        for _ in range(rng.randint(1, 6)):
+            qty, price = rng.randint(1, 10), round(rng.uniform(5, 500), 2)
+            items.append(BillItemSync(id=uuid.uuid4(), updated_at=ts, bill_id=bill_id,
+                                      product_id=rng.choice(products).id, qty=qty, price=price, total=qty * price))
+        bills.append(BillSync(id=bill_id, updated_at=ts, customer_id=rng.choice(customers).id,
+                              invoice_number=f"INV-{len(bills):06d}", bill_date=ts, status="PAID",
+                              total_amount=round(sum(i.total for i in items), 2), items=items))
+        count += 1 + len(items)
+    return PullResponse(customers=customers, products=products, bills=bills, server_timestamp=now)
+
+
+def cpu_ms(fn, repeat: int) -> float:
+    fn()  # warm up
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync payload encodings benchmark")
+    parser.add_argument("--entities", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    page = make_payload(args.entities)
+    # The same records as a push body, to time the decode + validation path
+    push = {"business_id": uuid.uuid4(), "customers": page.customers, "products": page.products, "bills": page.bills}
+    entities = len(page.customers) + len(page.products) + sum(1 + len(b.items) for b in page.bills)
+    per_k = 1000 / entities
+
+    print(f"\n{entities} entities; figures per 1,000 entities")
+    print(f"{'format':<22}{'encoding':<10}{'bytes':>10}{'encode':>12}{'decode+validate':>18}")
+    for media_type, (dumps, loads) in codec.FORMATS.items():
+        raw = dumps(PushRequest(**push))
+        for encoding in ["identity", *codec.ENCODINGS]:
+            compress, decompress = codec.ENCODINGS.get(encoding, (lambda b: b, lambda b: b))
+            body = compress(raw)
+
+            def encode():
+                compress(dumps(page))
+
+            def decode():
+                PushRequest.model_validate(loads(decompress(body)))
+
+            print(f"{media_type:<22}{encoding:<10}{len(body) * per_k:>10.0f}"
+                  f"{cpu_ms(encode, args.repeat) * per_k:>10.2f}ms{cpu_ms(decode, args.repeat) * per_k:>16.2f}ms")
+    print()
+
+
+if __name__ == "__main__":
+    main()
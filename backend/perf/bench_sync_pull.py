@@ -0,0 +1,114 @@
+"""
+Benchmark: /sync/pull page latency, entity queries one after another vs concurrently
+in one exported snapshot. Seeds a synthetic business into DATABASE_URL (Postgres).
+
+    python -m perf.bench_sync_pull --bills 20000 --page-size 500 --rtt-ms 2
+"""
+
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import asyncpg as pg_asyncpg
+
+from app.core import db as core_db
+from app.api.v1.endpoints import sync
+from app.schemas.sync import PullRequest
+
+SEED_SQL = [
+    "INSERT INTO users (user_id, email, password_hash) VALUES (:owner, :email, 'x')",
+    "INSERT INTO businesses (business_id, owner_id, name) VALUES (:biz, :owner, 'Bench Store')",
+    "INSERT INTO customers (id, business_id, name, phone, updated_at, is_deleted) "
+    "SELECT gen_random_uuid(), :biz, 'Customer ' || g, '98' || g, now() - g * interval '1 second', false "
+    "FROM generate_series(1, :customers) g",
+    "INSERT INTO products (id, business_id, name, price, stock_qty, unit, updated_at, is_deleted) "
+    "SELECT gen_random_uuid(), :biz, 'Product ' || g, 10 + g % 500, g % 90, 'pcs', now() - g * interval '1 second', false "
+    "FROM generate_series(1, :products) g",
+    "INSERT INTO bills (id, business_id, invoice_number, bill_date, total_amount, status, updated_at, is_deleted) "
+    "SELECT gen_random_uuid(), :biz, 'INV-' || g, now(), 100 + g % 900, 'PAID', now() - g * interval '1 second', false "
+    "FROM generate_series(1, :bills) g",
+    "INSERT INTO bill_items (id, business_id, bill_id, qty, price, total, updated_at, is_deleted) "
+    "SELECT gen_random_uuid(), b.business_id, b.id, 1 + i % 5, 20, 20 * (1 + i % 5), b.updated_at, false "
+    "FROM bills b, generate_series(1, :items) i WHERE b.business_id = :biz",
+]
+
+
+def simulate_rtt(rtt_ms: float):
+    """Delays every statement by rtt_ms, like a database across the network (local sockets hide the waits)."""
+    cursor = pg_asyncpg.AsyncAdapt_asyncpg_cursor
+    execute = cursor._prepare_and_execute
+
+    async def delayed(self, operation, parameters):
+        await asyncio.sleep(rtt_ms / 1000)
+        return await execute(self, operation, parameters)
+
+    cursor._prepare_and_execute = delayed
+
+
+async def seed(customers: int, products: int, bills: int, items: int) -> uuid.UUID:
+    async with core_db.engine.begin() as conn:
+        await conn.run_sync(core_db.Base.metadata.create_all)
+        params = {"owner": uuid.uuid4(), "biz": uuid.uuid4(), "customers": customers,
+                  "products": products, "bills": bills, "items": items}
+        params["email"] = f"bench-{params['owner']}@example.com"
+        for sql in SEED_SQL:
+            await conn.execute(text(sql), params)
+        for table in ("customers", "products", "bills", "bill_items"):
+            await conn.execute(text(f"ANALYZE {table}"))
+    return params["biz"]
+
+
+async def time_pull(business_id: uuid.UUID, page_size: int, repeat: int, concurrent: bool) -> list:
+    sync.PULL_CONCURRENT = concurrent
+    req = PullRequest(business_id=business_id, last_sync_timestamp=datetime(2000, 1, 1, tzinfo=timezone.utc),
+                      page_size=page_size)
+    timings = []
+    for i in range(repeat + 1):
+        gc.collect()  # ORM objects from the last page otherwise land a collection mid-run
+        async with core_db.AsyncSessionLocal() as session:
+            started = time.perf_counter()
+            await sync.pull_page(req, session)
+            if i:  # first run warms the pool and caches
+                timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def run(args):
+    core_db.engine.echo = False
+    business_id = await seed(args.customers, args.products, args.bills, args.items)
+    if args.rtt_ms:
+        simulate_rtt(args.rtt_ms)
+    results = {}
+    for name, concurrent in (("sequential", False), ("concurrent", True)):
+        results[name] = await time_pull(business_id, args.page_size, args.repeat, concurrent)
+    await core_db.engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync pull benchmark (sequential vs concurrent entity queries)")
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--bills", type=int, default=20_000)
+    parser.add_argument("--items", type=int, default=4, help="items per bill")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--rtt-ms", type=float, default=0, help="simulated network round trip per statement")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"\n{'mode':<14}{'p50':>10}{'p95':>10}")
+    for name, timings in results.items():
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0]
+        print(f"{name:<14}{statistics.median(timings):>8.1f}ms{p95:>8.1f}ms")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: /sync/push latency and rows written when clients re-push whole bills
+(identical, header-only change, one item edited per bill). Seeds a synthetic
+business into DATABASE_URL (Postgres) through the push path itself.
+
+    python -m perf.bench_sync_push --bills 2000 --items 5 --repeat 5
+"""
+
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.core import db as core_db
+from app.api.v1.endpoints import sync
+from app.schemas.sync import BillItemSync, BillSync, PushRequest
+
+BILL_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_bills(business_id: uuid.UUID, count: int, items: int, stamp: datetime, status: str = "PAID",
+               edit_item: bool = False):
+    """The same bill and item ids every call (per business); edit_item changes the first item's qty of every bill."""
+    bills = []
+    for i in range(count):
+        bill_id = uuid.uuid5(business_id, f"bill-{i}")
+        rows = [
+            BillItemSync(id=uuid.uuid5(business_id, f"item-{i}-{k}"), updated_at=stamp, bill_id=bill_id,
+                         qty=2 if edit_item and k == 0 else 1, price=10 + k, total=10 + k)
+            for k in range(items)
+        ]
+        bills.append(BillSync(id=bill_id, updated_at=stamp, invoice_number=f"INV-{i:06d}", bill_date=BILL_DATE,
+                              status=status, total_amount=sum(r.total for r in rows), items=rows))
+    return bills
+
+
+async def seed() -> uuid.UUID:
+    async with core_db.engine.begin() as conn:
+        await conn.run_sync(core_db.Base.metadata.create_all)
+        owner, business_id = uuid.uuid4(), uuid.uuid4()
+        await conn.execute(text("INSERT INTO users (user_id, email, password_hash) VALUES (:owner, :email, 'x')"),
+                           {"owner": owner, "email": f"bench-{owner}@example.com"})
+        await conn.execute(text("INSERT INTO businesses (business_id, owner_id, name) VALUES (:biz, :owner, 'Bench Store')"),
+                           {"biz": business_id, "owner": owner})
+    return business_id
+
+
+def rows_written(results) -> int:
+    return sum(counts.get("inserted", 0) + counts.get("updated", 0) + counts.get("deleted", 0)
+               for counts in results.values())
+
+
+async def time_push(business_id: uuid.UUID, bills) -> tuple:
+    gc.collect()
+    async with core_db.AsyncSessionLocal() as session:
+        started = time.perf_counter()
+        response = await sync.apply_push(PushRequest(business_id=business_id, bills=bills), session)
+        return (time.perf_counter() - started) * 1000, rows_written(response["results"])
+
+
+async def run(args):
+    core_db.engine.echo = False
+    business_id = await seed()
+    await time_push(business_id, make_bills(business_id, args.bills, args.items, BILL_DATE))
+
+    results, status, edited = {}, "PAID", False
+    for n in range(1, args.repeat + 1):
+        # Every push re-stamps whole bills, as clients do when re-sending them
+        for step, name in enumerate(("identical", "header only", "one item")):
+            if name == "header only":
+                status = "VOID" if status == "PAID" else "PAID"
+            elif name == "one item":
+                edited = not edited
+            stamp = BILL_DATE + timedelta(hours=n, minutes=step)
+            bills = make_bills(business_id, args.bills, args.items, stamp, status=status, edit_item=edited)
+            results.setdefault(name, []).append(await time_push(business_id, bills))
+    await core_db.engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync push benchmark (re-pushed whole bills)")
+    parser.add_argument("--bills", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=5, help="items per bill")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"\n{args.bills} bills x {args.items} items per push")
+    print(f"{'re-push':<14}{'p50':>10}{'rows written':>16}")
+    for name, runs in results.items():
+        print(f"{name:<14}{statistics.median(ms for ms, _ in runs):>8.1f}ms"
+              f"{statistics.median(rows for _, rows in runs):>16.0f}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
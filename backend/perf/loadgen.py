@@ -0,0 +1,201 @@
+"""
+Load Generator: Drives the DukanX Brain API at a target request rate.
+Open-loop (requests are fired on schedule regardless of response time), so
+latency under overload is measured honestly instead of being hidden by
+client back-pressure.
+
+Example:
+    python -m perf.loadgen --target http://127.0.0.1:8000 --rps 40 --duration 60 \
+        --mix chat=5,query=4,voice=1 --audio samples/aaj_ki_sale.wav
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger("LoadGen")
+
+CHAT_TEXTS = [
+    "Namaste",
+    "Add 2 packet milk at 30 rupees",
+    "aaj ki sale kitni hui?",
+    "Go to inventory",
+    "Stock of sugar",
+]
+
+QUERY_TEXTS = [
+    "आज की sale कितनी हुई?",
+    "Top 5 customers with dues",
+    "Stock of milk",
+    "This month revenue",
+]
+
+
+@dataclass
+class EndpointStats:
+    name: str
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: Dict[int, int] = field(default_factory=dict)
+
+    def record(self, status: int, elapsed_ms: float):
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+        if 200 <= status < 300:
+            self.latencies_ms.append(elapsed_ms)
+        else:
+            self.errors += 1
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile on an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(stats: Dict[str, EndpointStats], wall_s: float) -> Dict[str, Dict[str, float]]:
+    report = {}
+    for name, s in stats.items():
+        lat = sorted(s.latencies_ms)
+        total = len(lat) + s.errors
+        report[name] = {
+            "requests": total,
+            "ok": len(lat),
+            "errors": s.errors,
+            "throughput_rps": round(len(lat) / wall_s, 2) if wall_s else 0.0,
+            "p50_ms": round(percentile(lat, 50), 1),
+            "p95_ms": round(percentile(lat, 95), 1),
+            "p99_ms": round(percentile(lat, 99), 1),
+            "max_ms": round(lat[-1], 1) if lat else 0.0,
+            "status_codes": dict(sorted(s.status_codes.items())),
+        }
+    return report
+
+
+def print_report(report: Dict[str, Dict[str, float]], wall_s: float, target_rps: float):
+    header = f"{'endpoint':<16}{'req':>8}{'ok':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(f"\nTarget {target_rps} rps over {wall_s:.1f}s")
+    print(header)
+    print("-" * len(header))
+    for name, r in report.items():
+        print(f"{name:<16}{r['requests']:>8}{r['ok']:>8}{r['errors']:>6}{r['throughput_rps']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}")
+    print("(latencies in ms, status -1 = transport error / timeout)\n")
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("chat", "query", "voice"):
+            raise ValueError(f"Unknown endpoint '{name}' in mix (use chat, query, voice)")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadGenerator:
+    def __init__(self, target: str, rps: float, duration_s: float, mix: Dict[str, float],
+                 audio_path: Optional[str] = None, users: int = 500, timeout_s: float = 30.0,
+                 poisson: bool = True, seed: Optional[int] = None):
+        self.target = target.rstrip("/")
+        self.rps = rps
+        self.duration_s = duration_s
+        self.mix = mix
+        self.timeout_s = timeout_s
+        self.poisson = poisson
+        self.rng = random.Random(seed)
+        # Spread load across many uids so the 60 req/min/user limiter does not skew results
+        self.user_ids = [f"load-user-{i:05d}" for i in range(users)]
+        self.audio = Path(audio_path).read_bytes() if audio_path else None
+        self.audio_name = Path(audio_path).name if audio_path else None
+        if "voice" in mix and self.audio is None:
+            raise ValueError("voice in mix requires --audio <file>")
+        self.stats = {name: EndpointStats(name) for name in mix}
+
+    def _pick_endpoint(self) -> str:
+        names = list(self.mix)
+        return self.rng.choices(names, weights=[self.mix[n] for n in names])[0]
+
+    async def _fire(self, client: httpx.AsyncClient, endpoint: str):
+        uid = self.rng.choice(self.user_ids)
+        start = time.perf_counter()
+        try:
+            if endpoint == "chat":
+                resp = await client.post("/chat", json={"user_uid": uid, "text": self.rng.choice(CHAT_TEXTS)})
+            elif endpoint == "query":
+                resp = await client.post("/query", json={"user_uid": uid, "question": self.rng.choice(QUERY_TEXTS)})
+            else:
+                resp = await client.post(
+                    "/process-voice",
+                    data={"user_uid": uid, "language": "auto"},
+                    files={"file": (self.audio_name, self.audio, "application/octet-stream")},
+                )
+            status = resp.status_code
+        except httpx.HTTPError as e:
+            logger.debug(f"{endpoint} transport error: {e}")
+            status = -1
+        self.stats[endpoint].record(status, (time.perf_counter() - start) * 1000)
+
+    async def run(self) -> Dict[str, Dict[str, float]]:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+        async with httpx.AsyncClient(base_url=self.target, timeout=self.timeout_s, limits=limits) as client:
+            tasks = []
+            start = time.perf_counter()
+            next_at = start
+            while next_at - start < self.duration_s:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self._fire(client, self._pick_endpoint())))
+                gap = self.rng.expovariate(self.rps) if self.poisson else 1.0 / self.rps
+                next_at += gap
+            await asyncio.gather(*tasks)
+            wall_s = time.perf_counter() - start
+
+        self.wall_s = wall_s
+        return summarize(self.stats, wall_s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for /chat, /query, /process-voice")
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--mix", default="chat=1,query=1", help="e.g. chat=5,query=4,voice=1")
+    parser.add_argument("--audio", help="audio file for /process-voice")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--uniform", action="store_true", help="fixed inter-arrival instead of Poisson")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json-out", help="write the report as JSON to this path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    gen = LoadGenerator(
+        target=args.target, rps=args.rps, duration_s=args.duration, mix=parse_mix(args.mix),
+        audio_path=args.audio, users=args.users, timeout_s=args.timeout,
+        poisson=not args.uniform, seed=args.seed,
+    )
+    logger.info(f"🚦 {args.rps} rps for {args.duration}s against {args.target} ({args.mix})")
+    report = asyncio.run(gen.run())
+    print_report(report, gen.wall_s, args.rps)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"target_rps": args.rps, "wall_s": gen.wall_s, "endpoints": report}, f, indent=2)
+        logger.info(f"📝 Report written to {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
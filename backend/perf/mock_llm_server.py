@@ -0,0 +1,238 @@
+"""
+Mock LLM Server: Offline stand-in for the Groq / OpenAI chat-completions API.
+Serves scripted JSON replies with a configurable latency distribution so that
+/chat, /query and /process-voice can be load-tested without spending quota.
+
+Point the Brain at it with:
+    GROQ_BASE_URL=http://127.0.0.1:9100 GROQ_API_KEY=mock uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger("MockLLM")
+
+# --- LATENCY MODEL ---
+class LatencyModel:
+    """
+    Samples a simulated provider latency in milliseconds.
+    Spec format: "<kind>:<args>", e.g.
+        const:200
+        uniform:100,400
+        normal:300,50          (mean, stddev)
+        lognormal:300,0.5      (median, sigma) - closest to real LLM tails
+    """
+
+    KINDS = ("const", "uniform", "normal", "lognormal")
+
+    def __init__(self, spec: str = "const:0", seed: Optional[int] = None):
+        kind, _, raw_args = spec.partition(":")
+        kind = kind.strip().lower()
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency kind '{kind}'. Use one of {self.KINDS}")
+        self.kind = kind
+        self.args = [float(a) for a in raw_args.split(",") if a.strip()] or [0.0]
+        self.spec = spec
+        self._rng = random.Random(seed)
+
+    def sample_ms(self) -> float:
+        a = self.args
+        if self.kind == "const":
+            value = a[0]
+        elif self.kind == "uniform":
+            value = self._rng.uniform(a[0], a[1] if len(a) > 1 else a[0])
+        elif self.kind == "normal":
+            value = self._rng.gauss(a[0], a[1] if len(a) > 1 else 0.0)
+        else:
+            median, sigma = a[0], (a[1] if len(a) > 1 else 0.5)
+            value = self._rng.lognormvariate(0.0, sigma) * median
+        return max(0.0, value)
+
+
+# --- SCRIPTED REPLIES ---
+# Rules are checked in order. A rule matches when its regex is found in the
+# system prompt (field "system") and/or the last user message (field "user").
+# "reply" may be a string or a JSON object (serialized as message content).
+# "{user_uid}" in a reply is replaced with the uid found in the system prompt.
+DEFAULT_SCRIPT: List[Dict[str, Any]] = [
+    {
+        "name": "query_today_sales",
+        "system": r"SQL expert",
+        "user": r"(?i)today|aaj|आज",
+        "reply": {
+            "sql": "SELECT COALESCE(SUM(grand_total), 0) as total_sales FROM bills "
+                   "WHERE user_id = '{user_uid}' AND deleted_at IS NULL "
+                   "AND bill_date >= CAST(strftime('%s', 'now', 'start of day') AS INTEGER)",
+            "explanation": "Today's total sales",
+        },
+    },
+    {
+        "name": "query_dues",
+        "system": r"SQL expert",
+        "user": r"(?i)due|udhar|baki",
+        "reply": {
+            "sql": "SELECT name, total_dues FROM customers WHERE user_id = '{user_uid}' "
+                   "AND deleted_at IS NULL AND total_dues > 0 ORDER BY total_dues DESC LIMIT 5",
+            "explanation": "Top 5 customers by pending dues",
+        },
+    },
+    {
+        "name": "query_default",
+        "system": r"SQL expert",
+        "reply": {
+            "sql": "SELECT name, stock_quantity, unit FROM products WHERE user_id = '{user_uid}' "
+                   "AND deleted_at IS NULL LIMIT 20",
+            "explanation": "Products in stock",
+        },
+    },
+    {
+        "name": "agent_query",
+        "system": r"IMMORTAL",
+        "user": r"(?i)sale|revenue|due|stock|kitna|kitni",
+        "reply": {"text": "Checking...", "intent": "run_query", "data": {"question": "total sales today"}},
+    },
+    {
+        "name": "agent_default",
+        "system": r"IMMORTAL",
+        "reply": {"text": "What is the item name?", "intent": "conversation", "data": None},
+    },
+    {
+        "name": "fallback",
+        "reply": {"text": "OK", "intent": "conversation", "data": None},
+    },
+]
+
+UID_PATTERN = re.compile(r"user_id = '([^'{}]+)'")
+
+
+class ReplyScript:
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules = []
+        for rule in rules or DEFAULT_SCRIPT:
+            self.rules.append({
+                **rule,
+                "_system": re.compile(rule["system"]) if rule.get("system") else None,
+                "_user": re.compile(rule["user"]) if rule.get("user") else None,
+                "_latency": LatencyModel(rule["latency"]) if rule.get("latency") else None,
+            })
+        self.hits: Dict[str, int] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> "ReplyScript":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def match(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        system = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+        user_msgs = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+        user = user_msgs[-1] if user_msgs else ""
+
+        for rule in self.rules:
+            if rule["_system"] and not rule["_system"].search(system):
+                continue
+            if rule["_user"] and not rule["_user"].search(user):
+                continue
+            name = rule.get("name", "unnamed")
+            self.hits[name] = self.hits.get(name, 0) + 1
+            return rule
+        return {"name": "none", "reply": "", "_latency": None}
+
+    @staticmethod
+    def render(rule: Dict[str, Any], messages: List[Dict[str, Any]]) -> str:
+        reply = rule.get("reply", "")
+        content = reply if isinstance(reply, str) else json.dumps(reply, ensure_ascii=False)
+        if "{user_uid}" in content:
+            system = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+            found = UID_PATTERN.search(system)
+            content = content.replace("{user_uid}", found.group(1) if found else "mock-user")
+        return content
+
+
+# --- APP ---
+def create_app(script: Optional[ReplyScript] = None, latency: Optional[LatencyModel] = None) -> FastAPI:
+    app = FastAPI(title="DukanX Mock LLM", version="1.0.0")
+    app.state.script = script or ReplyScript()
+    app.state.latency = latency or LatencyModel(os.getenv("MOCK_LLM_LATENCY", "const:0"))
+    app.state.requests = 0
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        rule = app.state.script.match(messages)
+        model = rule.get("_latency") or app.state.latency
+
+        delay_ms = model.sample_ms()
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        app.state.requests += 1
+
+        content = ReplyScript.render(rule, messages)
+        prompt_tokens = sum(len((m.get("content") or "").split()) for m in messages)
+        completion_tokens = len(content.split())
+        return JSONResponse({
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "logprobs": None,
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+            "x_mock": {"rule": rule.get("name"), "latency_ms": round(delay_ms, 2)},
+        })
+
+    # Groq SDK path, plus the plain OpenAI path for other clients
+    app.add_api_route("/openai/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/")
+    def health_check():
+        return {
+            "status": "online",
+            "latency": app.state.latency.spec,
+            "requests": app.state.requests,
+            "rule_hits": app.state.script.hits,
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Groq/OpenAI chat-completions stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default=os.getenv("MOCK_LLM_LATENCY", "lognormal:300,0.4"),
+                        help="const:MS | uniform:LO,HI | normal:MEAN,SD | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--script", help="JSON file with reply rules (defaults to built-in script)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    script = ReplyScript.from_file(args.script) if args.script else ReplyScript()
+    app = create_app(script, LatencyModel(args.latency, seed=args.seed))
+    logger.info(f"🤖 Mock LLM on http://{args.host}:{args.port} (latency {args.latency})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Synthetic Drift database for QueryEngine benchmarks.
+Mirrors the tables described in QueryEngine.SCHEMA_PROMPT and fills them with
+deterministic, realistically skewed shop data (a few heavy users, many small).
+
+    python -m perf.synthetic_db --out /tmp/dukanx_bench.db --bills 500000
+"""
+
+import argparse
+import logging
+import random
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger("SyntheticDB")
+
+DRIFT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bills (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    invoice_number TEXT,
+    customer_id TEXT,
+    customer_name TEXT,
+    bill_date INTEGER NOT NULL,
+    subtotal REAL DEFAULT 0.0,
+    tax_amount REAL DEFAULT 0.0,
+    discount_amount REAL DEFAULT 0.0,
+    grand_total REAL DEFAULT 0.0,
+    paid_amount REAL DEFAULT 0.0,
+    status TEXT DEFAULT 'DRAFT',
+    payment_mode TEXT,
+    cash_paid REAL DEFAULT 0.0,
+    online_paid REAL DEFAULT 0.0,
+    business_type TEXT DEFAULT 'generalStore',
+    created_at INTEGER,
+    updated_at INTEGER,
+    deleted_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS customers (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    phone TEXT,
+    email TEXT,
+    address TEXT,
+    gstin TEXT,
+    total_billed REAL DEFAULT 0.0,
+    total_paid REAL DEFAULT 0.0,
+    total_dues REAL DEFAULT 0.0,
+    is_active INTEGER DEFAULT 1,
+    created_at INTEGER,
+    deleted_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sku TEXT,
+    barcode TEXT,
+    category TEXT,
+    unit TEXT DEFAULT 'pcs',
+    selling_price REAL NOT NULL,
+    cost_price REAL DEFAULT 0.0,
+    stock_quantity REAL DEFAULT 0.0,
+    low_stock_threshold REAL DEFAULT 10.0,
+    is_active INTEGER DEFAULT 1,
+    hsn_code TEXT,
+    created_at INTEGER,
+    deleted_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS journal_entries (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    voucher_number TEXT,
+    voucher_type TEXT,
+    entry_date INTEGER,
+    narration TEXT,
+    total_debit REAL,
+    total_credit REAL,
+    created_at INTEGER
+);
+"""
+
+PRODUCT_NAMES = [
+    "Amul Milk 500ml", "Amul Butter 100g", "Tata Salt 1kg", "Maggi Noodles 70g", "Parle-G Biscuit",
+    "Aashirvaad Atta 5kg", "Fortune Oil 1L", "Toor Dal 1kg", "Basmati Rice 5kg", "Sugar 1kg",
+    "Tea Powder 250g", "Colgate 100g", "Lux Soap", "Surf Excel 1kg", "Dettol 250ml",
+    "Britannia Bread", "Mother Dairy Curd", "Haldiram Bhujia", "Kurkure", "Lays Chips",
+]
+CUSTOMER_NAMES = ["Raju", "Sharma", "Gupta", "Patel", "Kulkarni", "Iyer", "Khan", "Singh", "Das", "Reddy"]
+PAYMENT_MODES = ["CASH", "UPI", "CARD", "CREDIT"]
+STATUSES = ["PAID", "PAID", "PAID", "PARTIAL", "PENDING"]
+
+DAY = 86400
+
+
+def build(path: str, users: int = 20, bills: int = 200_000, customers_per_user: int = 300,
+          products_per_user: int = 1500, days: int = 3 * 365, seed: int = 7) -> str:
+    """Creates (or replaces) a synthetic Drift DB at path and returns the path."""
+    rng = random.Random(seed)
+    target = Path(path)
+    if target.exists():
+        target.unlink()
+
+    started = time.time()
+    conn = sqlite3.connect(str(target))
+    conn.executescript(DRIFT_SCHEMA)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    now = int(time.time())
+    user_ids = [f"user-{i:03d}" for i in range(users)]
+    # Zipf-ish skew: user-000 is the big wholesaler
+    weights = [1.0 / (i + 1) for i in range(users)]
+
+    customer_ids = {}
+    for uid in user_ids:
+        rows = []
+        for _ in range(customers_per_user):
+            cid = str(uuid.UUID(int=rng.getrandbits(128)))
+            billed = round(rng.uniform(0, 200_000), 2)
+            paid = round(billed * rng.uniform(0.6, 1.0), 2)
+            rows.append((cid, uid, f"{rng.choice(CUSTOMER_NAMES)} {rng.randint(1, 999)}", None,
+                         billed, paid, round(billed - paid, 2), now - rng.randint(0, days) * DAY,
+                         now if rng.random() < 0.02 else None))
+        conn.executemany(
+            "INSERT INTO customers (id, user_id, name, phone, total_billed, total_paid, total_dues, created_at, deleted_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        customer_ids[uid] = [r[0] for r in rows]
+
+        products = []
+        for i in range(products_per_user):
+            base = PRODUCT_NAMES[i % len(PRODUCT_NAMES)]
+            products.append((str(uuid.UUID(int=rng.getrandbits(128))), uid, f"{base} #{i}",
+                             round(rng.uniform(5, 800), 2), round(rng.uniform(0, 200), 1),
+                             now - rng.randint(0, days) * DAY))
+        conn.executemany(
+            "INSERT INTO products (id, user_id, name, selling_price, stock_quantity, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", products)
+
+    batch = []
+    for n in range(bills):
+        uid = rng.choices(user_ids, weights=weights)[0]
+        bill_date = now - int(rng.random() ** 1.5 * days * DAY)  # denser near today
+        subtotal = round(rng.uniform(20, 5000), 2)
+        tax = round(subtotal * 0.05, 2)
+        discount = round(subtotal * rng.choice((0, 0, 0.02, 0.05)), 2)
+        total = round(subtotal + tax - discount, 2)
+        status = rng.choice(STATUSES)
+        paid = total if status == "PAID" else round(total * rng.uniform(0, 0.9), 2)
+        mode = rng.choice(PAYMENT_MODES)
+        batch.append((
+            str(uuid.UUID(int=rng.getrandbits(128))), uid, f"INV-{n:07d}", rng.choice(customer_ids[uid]),
+            bill_date, subtotal, tax, discount, total, paid, status, mode,
+            paid if mode == "CASH" else 0.0, paid if mode in ("UPI", "CARD") else 0.0,
+            bill_date, bill_date, bill_date if rng.random() < 0.01 else None,
+        ))
+        if len(batch) >= 20_000:
+            _insert_bills(conn, batch)
+            batch.clear()
+    if batch:
+        _insert_bills(conn, batch)
+
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    logger.info(f"🧪 Built {target} ({bills} bills, {users} users) in {time.time() - started:.1f}s")
+    return str(target)
+
+
+def _insert_bills(conn: sqlite3.Connection, rows):
+    conn.executemany(
+        "INSERT INTO bills (id, user_id, invoice_number, customer_id, bill_date, subtotal, tax_amount, "
+        "discount_amount, grand_total, paid_amount, status, payment_mode, cash_paid, online_paid, "
+        "created_at, updated_at, deleted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a synthetic Drift SQLite database")
+    parser.add_argument("--out", default="/tmp/dukanx_bench.db")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--bills", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    build(args.out, users=args.users, bills=args.bills, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+PgQueryDatabase: QueryEngine backend for the cloud Postgres (schema_multi_tenant.sql).
+
+Generated SQL runs through an asyncpg pool. Every checkout opens a READ ONLY
+transaction, sets `app.current_business_id` (transaction-local, so it can't
+leak to the next borrower) for the row-level-security policies, and applies
+statement_timeout as the cost budget. The pool must connect as a role subject to
+RLS (dukanx_query in schema_multi_tenant.sql, not the tables' owner); it refuses
+to start otherwise.
+"""
+
+import logging
+import os
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import asyncpg
+
+from sql_guard import PG_TENANT_TABLES, QueryBudgetExceeded
+
+logger = logging.getLogger("PgQueryDatabase")
+
+PG_SCHEMA_PROMPT = """
+You are a SQL expert for DukanX, a business management app.
+Convert natural language questions to PostgreSQL queries.
+
+DATABASE SCHEMA (PostgreSQL, multi-tenant):
+-------------------------------------------
+
+-- customers
+CREATE TABLE customers (
+    id UUID PRIMARY KEY,
+    business_id UUID NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    phone VARCHAR(20),
+    email VARCHAR(100),
+    balance DECIMAL(15, 2),  -- amount the customer owes (dues)
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    is_deleted BOOLEAN DEFAULT FALSE
+);
+
+-- products
+CREATE TABLE products (
+    id UUID PRIMARY KEY,
+    business_id UUID NOT NULL,
+    name VARCHAR(200) NOT NULL,
+    sku VARCHAR(50),
+    price DECIMAL(10, 2) NOT NULL,
+    stock_qty DECIMAL(10, 2),
+    unit VARCHAR(20),
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    is_deleted BOOLEAN DEFAULT FALSE
+);
+
+-- bills (Sales Invoices)
+CREATE TABLE bills (
+    id UUID PRIMARY KEY,
+    business_id UUID NOT NULL,
+    customer_id UUID REFERENCES customers(id),
+    invoice_number VARCHAR(50) NOT NULL,
+    bill_date TIMESTAMPTZ NOT NULL,
+    total_amount DECIMAL(15, 2) NOT NULL,
+    status VARCHAR(20),  -- PAID, ...
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    is_deleted BOOLEAN DEFAULT FALSE
+);
+
+-- bill_items
+CREATE TABLE bill_items (
+    id UUID PRIMARY KEY,
+    business_id UUID NOT NULL,
+    bill_id UUID NOT NULL REFERENCES bills(id),
+    product_id UUID REFERENCES products(id),
+    qty DECIMAL(10, 2) NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    total DECIMAL(15, 2) NOT NULL,
+    is_deleted BOOLEAN DEFAULT FALSE
+);
+
+RULES:
+------
+1. Output ONLY valid JSON: {"sql": "...", "explanation": "..."}
+2. bill_date is TIMESTAMPTZ. Compare it to ranges, never wrap the column in a function:
+   - Today: bill_date >= date_trunc('day', now()) AND bill_date < date_trunc('day', now()) + interval '1 day'
+   - This month: bill_date >= date_trunc('month', now())
+   - Last 7 days: bill_date >= now() - interval '7 days'
+3. ALWAYS filter every table: business_id = '{business_id}' AND is_deleted = false, ANDed into the WHERE clause.
+   With joins, filter each table by its alias: b.business_id = '{business_id}' AND bi.business_id = '{business_id}' ...
+   Only the four tables above exist.
+4. Limit to 20 rows max.
+5. Use these result names where they fit: total_sales, revenue, total_dues, stock_quantity.
+6. Return null sql if question is unanswerable.
+
+EXAMPLES:
+---------
+User: "आज की sale कितनी हुई?"
+Output: {{"sql": "SELECT COALESCE(SUM(total_amount), 0) AS total_sales FROM bills WHERE business_id = '{business_id}' AND is_deleted = false AND bill_date >= date_trunc('day', now())", "explanation": "Today's total sales"}}
+
+User: "Top 5 customers with dues"
+Output: {{"sql": "SELECT name, balance AS total_dues FROM customers WHERE business_id = '{business_id}' AND is_deleted = false AND balance > 0 ORDER BY balance DESC LIMIT 5", "explanation": "Top 5 customers by pending dues"}}
+
+User: "Stock of milk"
+Output: {{"sql": "SELECT name, stock_qty AS stock_quantity, unit FROM products WHERE business_id = '{business_id}' AND is_deleted = false AND name ILIKE '%milk%'", "explanation": "Stock for products matching 'milk'"}}
+"""
+
+
+def _dsn_from_env() -> Optional[str]:
+    dsn = os.getenv("QUERY_PG_DSN") or os.getenv("DATABASE_URL")
+    # DATABASE_URL is written for SQLAlchemy (postgresql+asyncpg://)
+    return dsn.replace("+asyncpg", "") if dsn else None
+
+
+def _to_row(record: asyncpg.Record) -> Dict[str, Any]:
+    return {k: float(v) if isinstance(v, Decimal) else v for k, v in record.items()}
+
+
+class PgQueryBackend:
+    """Shared asyncpg pool; hands out business-scoped PgQueryDatabase views."""
+
+    def __init__(self, dsn: Optional[str] = None, min_size: Optional[int] = None, max_size: Optional[int] = None,
+                 statement_timeout_ms: Optional[int] = None):
+        self.dsn = dsn or _dsn_from_env()
+        self.min_size = min_size or int(os.getenv("QUERY_PG_POOL_MIN", 1))
+        self.max_size = max_size or int(os.getenv("QUERY_PG_POOL_MAX", 10))
+        self.statement_timeout_ms = statement_timeout_ms or int(float(os.getenv("QUERY_TIMEOUT_S", 2.0)) * 1000)
+        self._pool: Optional[asyncpg.Pool] = None
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(
+                self.dsn, min_size=self.min_size, max_size=self.max_size,
+                server_settings={
+                    "default_transaction_read_only": "on",
+                    "idle_in_transaction_session_timeout": str(self.statement_timeout_ms * 5),
+                    "application_name": "dukanx-query-engine",
+                },
+            )
+            try:
+                await self._check_role(self._pool)
+            except Exception:
+                await self._pool.close()
+                self._pool = None
+                raise
+            logger.info(f"🐘 Postgres query pool ready ({self.min_size}-{self.max_size} connections)")
+        return self._pool
+
+    @staticmethod
+    async def _check_role(pool: asyncpg.Pool):
+        """Refuses a role that RLS wouldn't bind: superusers, BYPASSRLS roles and the tables' owner."""
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT current_user AS role, r.rolsuper OR r.rolbypassrls AS bypasses, "
+                "array(SELECT c.relname::text FROM pg_class c WHERE c.oid = ANY($1::regclass[]) "
+                "AND (pg_has_role(c.relowner, 'USAGE') OR NOT c.relrowsecurity)) AS unprotected "
+                "FROM pg_roles r WHERE r.rolname = current_user",
+                sorted(PG_TENANT_TABLES),
+            )
+        if row["bypasses"] or row["unprotected"]:
+            detail = "a superuser or BYPASSRLS role" if row["bypasses"] else \
+                f"owner of, or without RLS on: {', '.join(row['unprotected'])}"
+            raise RuntimeError(
+                f"Query pool role {row['role']!r} is {detail}; connect QUERY_PG_DSN as a role "
+                f"subject to row-level security (dukanx_query in schema_multi_tenant.sql)"
+            )
+
+    @asynccontextmanager
+    async def checkout(self, business_id: str) -> AsyncIterator[asyncpg.Connection]:
+        """A pooled connection inside a READ ONLY transaction scoped to business_id."""
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                # is_local=true: both settings end with the transaction
+                await conn.execute(
+                    "SELECT set_config('app.current_business_id', $1, true), "
+                    "set_config('statement_timeout', $2, true)",
+                    str(business_id), str(self.statement_timeout_ms),
+                )
+                yield conn
+
+    async def resolve_business(self, user_uid: str, business_id: Optional[str] = None) -> Optional[str]:
+        """
+        The business the user may query: business_id if they own it or are staff on it,
+        else their only owned business. None when ambiguous or not allowed.
+        """
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            if business_id:
+                return await conn.fetchval(
+                    "SELECT business_id::text FROM query_accessible_businesses($1) WHERE business_id::text = $2",
+                    user_uid, str(business_id),
+                )
+            owned = await conn.fetch(
+                "SELECT business_id::text FROM query_accessible_businesses($1) WHERE owned LIMIT 2",
+                user_uid,
+            )
+        if len(owned) != 1:
+            logger.warning(f"⚠️ {len(owned)} businesses for {user_uid}; business_id is required")
+            return None
+        return owned[0][0]
+
+    def scoped(self, business_id: str) -> "PgQueryDatabase":
+        return PgQueryDatabase(self, business_id)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+class PgQueryDatabase:
+    """QueryDatabase-compatible view of the Postgres backend for one business."""
+
+    dialect = "postgres"
+    rollups_ready = False
+    product_search_ready = False
+
+    def __init__(self, backend: PgQueryBackend, business_id: str):
+        self.backend = backend
+        self.business_id = business_id
+
+    @property
+    def schema_prompt(self) -> str:
+        return PG_SCHEMA_PROMPT.replace("{business_id}", self.business_id)
+
+    async def refresh_derived(self):
+        """No rollup or search tables in the cloud schema."""
+
+    async def execute(self, sql: str, params: Sequence[Any] = (),
+                      question: Optional[str] = None) -> List[Dict[str, Any]]:
+        async with self.backend.checkout(self.business_id) as conn:
+            try:
+                records = await conn.fetch(sql, *params)
+            except asyncpg.QueryCanceledError as e:
+                raise await self._budget_error(sql, params, question) from e
+        return [_to_row(r) for r in records]
+
+    async def stream(self, sql: str, params: Sequence[Any] = (), question: Optional[str] = None,
+                     batch_size: int = 500) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Server-side cursor; statement_timeout applies to each FETCH."""
+        async with self.backend.checkout(self.business_id) as conn:
+            try:
+                cursor = await conn.cursor(sql, *params)
+                while True:
+                    records = await cursor.fetch(batch_size)
+                    if not records:
+                        return
+                    yield [_to_row(r) for r in records]
+            except asyncpg.QueryCanceledError as e:
+                raise await self._budget_error(sql, params, question) from e
+
+    async def explain(self, sql: str, params: Sequence[Any] = ()) -> List[str]:
+        try:
+            async with self.backend.checkout(self.business_id) as conn:
+                return [r[0] for r in await conn.fetch(f"EXPLAIN {sql}", *params)]
+        except asyncpg.PostgresError as e:
+            return [f"<plan unavailable: {e}>"]
+
+    async def _budget_error(self, sql: str, params: Sequence[Any], question: Optional[str]) -> QueryBudgetExceeded:
+        plan = await self.explain(sql, params)
+        logger.warning(
+            f"⛔ Statement timeout ({self.backend.statement_timeout_ms}ms). "
+            f"Question: {question!r} SQL: {sql} PLAN: {plan}"
+        )
+        return QueryBudgetExceeded(
+            f"Query too expensive and was stopped: statement timeout ({self.backend.statement_timeout_ms}ms)"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {"business_id": self.business_id, "dialect": self.dialect}
@@ -0,0 +1,371 @@
+"""
+ProductSearch: FTS5 trigram index over product names, transliteration-aware.
+
+Names and queries go through the same normalizer: Devanagari is transliterated
+to Latin, then both scripts are folded phonetically (long vowels, aspiration,
+doubled letters), so "दूध", "doodh" and "dudh" all become "dudh". A small
+synonym table bridges Hindi and English grocery words ("dudh" <-> "milk").
+The trigram tokenizer matches any 3+ character substring through the index,
+replacing `LOWER(name) LIKE '%milk%'` full scans.
+
+Each user owns a block of index rowids ([slot << 32, (slot + 1) << 32)), so
+the tenant filter is a rowid range FTS5 applies while walking its doclists
+instead of a per-match column lookup.
+
+Sync: products has no updated_at in the Drift schema, so a change scanner can't
+see renames. Tiny triggers queue changed product ids in qe_product_search_dirty
+(as rollups.py does for bills) and refresh() re-indexes just those rows. Runs on a
+short-lived read-write connection; searches run on the read-only pool.
+"""
+
+import logging
+import re
+import sqlite3
+import time
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("ProductSearch")
+
+# Bump when normalize() changes: the index is rebuilt on next start
+NORMALIZER_VERSION = 1
+
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS qe_product_search USING fts5(
+    search_text, tokenize = 'trigram'
+);
+CREATE TABLE IF NOT EXISTS qe_product_search_docs (
+    doc_id INTEGER PRIMARY KEY,    -- rowid in qe_product_search: (user slot << 32) + n
+    product_id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS qe_product_search_users (
+    user_id TEXT PRIMARY KEY,
+    slot INTEGER NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS qe_product_search_dirty (
+    product_id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS qe_product_search_meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+CREATE TRIGGER IF NOT EXISTS qe_products_search_ai AFTER INSERT ON products BEGIN
+    INSERT OR IGNORE INTO qe_product_search_dirty (product_id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS qe_products_search_au AFTER UPDATE OF id, user_id, name, deleted_at ON products BEGIN
+    INSERT OR IGNORE INTO qe_product_search_dirty (product_id) VALUES (old.id);
+    INSERT OR IGNORE INTO qe_product_search_dirty (product_id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS qe_products_search_ad AFTER DELETE ON products BEGIN
+    INSERT OR IGNORE INTO qe_product_search_dirty (product_id) VALUES (old.id);
+END;
+"""
+
+SLOT_BITS = 32
+_USER_RANGE = (
+    "s.rowid >= (SELECT slot FROM qe_product_search_users WHERE user_id = ?2) << 32 "
+    "AND s.rowid < ((SELECT slot FROM qe_product_search_users WHERE user_id = ?2) + 1) << 32"
+)
+# Rank and cut inside the index, then join only the survivors
+SEARCH_SQL = (
+    "SELECT p.name, p.stock_quantity, p.unit FROM ("
+    "SELECT s.rowid AS doc_id, s.rank AS rank FROM qe_product_search s "
+    f"WHERE qe_product_search MATCH ?1 AND {_USER_RANGE} ORDER BY s.rank LIMIT ?3"
+    ") m JOIN qe_product_search_docs d ON d.doc_id = m.doc_id "
+    "JOIN products p ON p.id = d.product_id "
+    "WHERE p.user_id = ?2 AND p.deleted_at IS NULL ORDER BY m.rank"
+)
+# Queries with no 3+ character term ("ghee" -> "gi") can't use the trigram index: word-prefix LIKE
+SEARCH_LIKE_SQL = (
+    "SELECT p.name, p.stock_quantity, p.unit FROM ("
+    "SELECT s.rowid AS doc_id, length(s.search_text) AS len FROM qe_product_search s "
+    f"WHERE (' ' || s.search_text) LIKE ?1 AND {_USER_RANGE} ORDER BY len LIMIT ?3"
+    ") m JOIN qe_product_search_docs d ON d.doc_id = m.doc_id "
+    "JOIN products p ON p.id = d.product_id "
+    "WHERE p.user_id = ?2 AND p.deleted_at IS NULL ORDER BY m.len"
+)
+
+# --- TRANSLITERATION ---
+_CONSONANTS = {
+    "क": "k", "ख": "kh", "ग": "g", "घ": "gh", "ङ": "n", "च": "ch", "छ": "chh", "ज": "j", "झ": "jh",
+    "ञ": "n", "ट": "t", "ठ": "th", "ड": "d", "ढ": "dh", "ण": "n", "त": "t", "थ": "th", "द": "d",
+    "ध": "dh", "न": "n", "प": "p", "फ": "ph", "ब": "b", "भ": "bh", "म": "m", "य": "y", "र": "r",
+    "ल": "l", "ळ": "l", "व": "v", "श": "sh", "ष": "sh", "स": "s", "ह": "h",
+    "क़": "k", "ख़": "kh", "ग़": "g", "ज़": "z", "ड़": "r", "ढ़": "rh", "फ़": "f", "य़": "y",
+}
+_VOWELS = {
+    "अ": "a", "आ": "aa", "इ": "i", "ई": "ee", "उ": "u", "ऊ": "oo", "ऋ": "ri",
+    "ए": "e", "ऐ": "ai", "ओ": "o", "औ": "au", "ऍ": "e", "ऑ": "o",
+}
+_MATRAS = {
+    "ा": "aa", "ि": "i", "ी": "ee", "ु": "u", "ू": "oo", "ृ": "ri",
+    "े": "e", "ै": "ai", "ो": "o", "ौ": "au", "ॅ": "e", "ॉ": "o",
+}
+_VIRAMA = "्"
+_NUKTA = "़"
+_NASALS = {"ं": "n", "ँ": "n", "ः": "h"}
+_DIGITS = {chr(0x0966 + i): str(i) for i in range(10)}
+
+
+def transliterate(text: str) -> str:
+    """Devanagari -> rough Latin (Hinglish-style), word-final schwa dropped. Other text passes through."""
+    out: List[str] = []
+    pending_a = False
+    # NFC folds consonant + nukta into the precomposed letters above
+    for ch in unicodedata.normalize("NFC", text):
+        if ch in _MATRAS:
+            out.append(_MATRAS[ch])
+            pending_a = False
+            continue
+        if ch == _VIRAMA:
+            pending_a = False
+            continue
+        if ch == _NUKTA:
+            continue
+        if pending_a and ch not in _NASALS:
+            if ch in _CONSONANTS or ch in _VOWELS:
+                out.append("a")
+            pending_a = False
+        if ch in _CONSONANTS:
+            out.append(_CONSONANTS[ch])
+            pending_a = True
+        elif ch in _NASALS:
+            if pending_a:
+                out.append("a")
+                pending_a = False
+            out.append(_NASALS[ch])
+        elif ch in _VOWELS:
+            out.append(_VOWELS[ch])
+        elif ch in _DIGITS:
+            out.append(_DIGITS[ch])
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+# --- PHONETIC FOLDING ---
+_FOLDS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"aa+"), "a"), (re.compile(r"ee+|ii+"), "i"), (re.compile(r"oo+|uu+"), "u"),
+    (re.compile(r"w"), "v"), (re.compile(r"ph"), "f"), (re.compile(r"z"), "j"), (re.compile(r"q"), "k"),
+    (re.compile(r"sh"), "s"), (re.compile(r"ck"), "k"),
+    # Aspiration is spelled inconsistently in Hinglish (dhaniya/daniya, chhole/chole)
+    (re.compile(r"([kgcjtdpb])h"), r"\1"),
+    (re.compile(r"([a-z])\1+"), r"\1"),
+]
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def fold(word: str) -> str:
+    for pattern, repl in _FOLDS:
+        word = pattern.sub(repl, word)
+    return word
+
+
+def normalize(text: str) -> str:
+    """Search form of a product name or query: transliterated, lowercased, folded words."""
+    text = transliterate(text).lower()
+    words = [fold(w) for w in _NON_WORD.split(text) if w]
+    return " ".join(w for w in words if w)
+
+
+# Hindi/Hinglish <-> English grocery words; any member matches the whole group
+SYNONYM_GROUPS = [
+    ["doodh", "दूध", "milk"], ["cheeni", "chini", "चीनी", "shakkar", "sugar"], ["chawal", "चावल", "rice"],
+    ["atta", "आटा", "flour"], ["tel", "तेल", "oil"], ["namak", "नमक", "salt"], ["chai", "चाय", "patti", "tea"],
+    ["sabun", "साबुन", "soap"], ["anda", "ande", "अंडा", "अंडे", "egg", "eggs"], ["makhan", "मक्खन", "butter"],
+    ["dahi", "दही", "curd"], ["haldi", "हल्दी", "turmeric"], ["mirch", "मिर्च", "chilli", "chili"],
+    ["jeera", "जीरा", "cumin"], ["aloo", "आलू", "potato"], ["pyaz", "pyaaz", "प्याज", "onion"],
+    ["tamatar", "टमाटर", "tomato"], ["dal", "daal", "दाल", "lentil"], ["biskut", "बिस्कुट", "biscuit"],
+    ["namkeen", "नमकीन", "bhujia"], ["pani", "पानी", "water"], ["sooji", "सूजी", "rava", "semolina"],
+    ["besan", "बेसन", "gram flour"], ["masala", "मसाला", "spice"], ["kela", "केला", "banana"],
+]
+SYNONYMS: Dict[str, List[str]] = {}
+for _group in SYNONYM_GROUPS:
+    _folded = sorted({normalize(w) for w in _group})
+    for _term in _folded:
+        SYNONYMS.setdefault(_term, [])
+        SYNONYMS[_term] = sorted(set(SYNONYMS[_term]) | set(_folded))
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def match_query(text: str) -> Optional[str]:
+    """
+    FTS5 MATCH expression: every 3+ char query word (or one of its synonyms) must
+    appear as a substring. None if no word is long enough for the trigram index.
+    """
+    clauses = []
+    for word in normalize(text).split():
+        if len(word) < 3:
+            continue
+        terms = [t for t in SYNONYMS.get(word, [word]) if len(t) >= 3] or [word]
+        clauses.append("(" + " OR ".join(_quote(t) for t in terms) + ")")
+    return " AND ".join(clauses) if clauses else None
+
+
+def search_query(user_id: str, text: str, limit: int = 20) -> Tuple[str, Tuple[str, str, int]]:
+    """(sql, params) for a product lookup; falls back to LIKE on the normalized text."""
+    match = match_query(text)
+    if match:
+        return SEARCH_SQL, (match, user_id, limit)
+    return SEARCH_LIKE_SQL, (f"% {normalize(text)}%", user_id, limit)
+
+
+class ProductSearchIndex:
+    def __init__(self, db_path: str, batch_size: int = 5000, merge_pages: int = 500, busy_timeout_ms: int = 5000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        # Incremental segment merge work per refresh; a pile of small segments slows every MATCH
+        self.merge_pages = merge_pages
+        self.busy_timeout_ms = busy_timeout_ms
+        self.ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        return conn
+
+    def ensure_schema(self) -> bool:
+        """Creates the index and triggers; rebuilds when empty or built by another normalizer."""
+        try:
+            conn = self._connect()
+            try:
+                has_products = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products'"
+                ).fetchone()
+                if not has_products:
+                    logger.warning("⚠️ No products table; product search disabled.")
+                    return False
+                conn.executescript(SEARCH_SCHEMA)
+                row = conn.execute(
+                    "SELECT value FROM qe_product_search_meta WHERE key = 'normalizer_version'"
+                ).fetchone()
+                if not row or row[0] != NORMALIZER_VERSION:
+                    self._rebuild(conn)
+            finally:
+                conn.close()
+            self.ready = True
+            return True
+        except sqlite3.Error as e:
+            # e.g. SQLite built without FTS5 / trigram (needs 3.34+)
+            logger.warning(f"⚠️ Could not create product search index: {e}")
+            return False
+
+    def _rebuild(self, conn: sqlite3.Connection):
+        started = time.time()
+        for table in ("qe_product_search", "qe_product_search_docs", "qe_product_search_dirty"):
+            conn.execute(f"DELETE FROM {table}")
+        rows = conn.execute(
+            "SELECT id, user_id, name FROM products WHERE deleted_at IS NULL ORDER BY user_id"
+        ).fetchall()
+        docs, next_id = [], {}
+        for product_id, user_id, name in rows:
+            if user_id not in next_id:
+                next_id[user_id] = self._slot(conn, user_id) << SLOT_BITS
+            next_id[user_id] += 1
+            docs.append((next_id[user_id], product_id, normalize(name or "")))
+        conn.executemany("INSERT INTO qe_product_search_docs (doc_id, product_id) VALUES (?, ?)",
+                         [(doc_id, product_id) for doc_id, product_id, _ in docs])
+        conn.executemany("INSERT INTO qe_product_search (rowid, search_text) VALUES (?, ?)",
+                         [(doc_id, text) for doc_id, _, text in docs])
+        conn.execute(
+            "INSERT INTO qe_product_search_meta (key, value) VALUES ('normalizer_version', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (NORMALIZER_VERSION,),
+        )
+        conn.execute("INSERT INTO qe_product_search (qe_product_search) VALUES ('optimize')")
+        conn.commit()
+        logger.info(f"🔎 Indexed {len(rows)} products in {time.time() - started:.2f}s")
+
+    @staticmethod
+    def _slot(conn: sqlite3.Connection, user_id: str) -> int:
+        conn.execute(
+            "INSERT OR IGNORE INTO qe_product_search_users (user_id, slot) "
+            "VALUES (?, (SELECT COALESCE(MAX(slot), 0) + 1 FROM qe_product_search_users))",
+            (user_id,),
+        )
+        return conn.execute("SELECT slot FROM qe_product_search_users WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    @staticmethod
+    def _next_doc_id(conn: sqlite3.Connection, slot: int) -> int:
+        low = slot << SLOT_BITS
+        last = conn.execute(
+            "SELECT MAX(doc_id) FROM qe_product_search_docs WHERE doc_id >= ? AND doc_id < ?",
+            (low, (slot + 1) << SLOT_BITS),
+        ).fetchone()[0]
+        return (last or low) + 1
+
+    def refresh(self) -> int:
+        """
+        Re-indexes products queued by the triggers. Blocking; call off the event loop.
+        Each batch is claimed and applied in one IMMEDIATE transaction, so a rename
+        re-queueing a product can't slip between reading it and clearing the queue.
+        """
+        if not self.ready:
+            return 0
+        conn = self._connect()
+        done = 0
+        try:
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                ids = [r[0] for r in conn.execute(
+                    "SELECT product_id FROM qe_product_search_dirty LIMIT ?", (self.batch_size,)
+                )]
+                if not ids:
+                    conn.rollback()
+                    break
+                self._apply(conn, ids)
+                conn.commit()
+                done += len(ids)
+                if len(ids) < self.batch_size:
+                    break
+            if done >= self.batch_size:
+                # Bulk catch-up (first sync, catalogue import): merge everything once
+                conn.execute("INSERT INTO qe_product_search (qe_product_search) VALUES ('optimize')")
+                conn.commit()
+            elif done:
+                conn.execute("INSERT INTO qe_product_search (qe_product_search, rank) VALUES ('merge', ?)",
+                             (self.merge_pages,))
+                conn.commit()
+        finally:
+            conn.close()
+        if done:
+            logger.info(f"🔎 Re-indexed {done} changed products")
+        return done
+
+    def _apply(self, conn: sqlite3.Connection, ids: Sequence[str]):
+        marks = ",".join("?" for _ in ids)
+        live = {pid: (user_id, name) for pid, user_id, name in conn.execute(
+            f"SELECT id, user_id, name FROM products WHERE id IN ({marks}) AND deleted_at IS NULL", ids
+        )}
+        docs = dict(conn.execute(
+            f"SELECT product_id, doc_id FROM qe_product_search_docs WHERE product_id IN ({marks})", ids
+        ).fetchall())
+
+        for pid in ids:
+            doc_id = docs.get(pid)
+            if doc_id is not None:
+                conn.execute("DELETE FROM qe_product_search WHERE rowid = ?", (doc_id,))
+            slot = self._slot(conn, live[pid][0]) if pid in live else None
+            if doc_id is not None and doc_id >> SLOT_BITS != slot:
+                # Deleted, or moved to another user's rowid block
+                conn.execute("DELETE FROM qe_product_search_docs WHERE doc_id = ?", (doc_id,))
+                doc_id = None
+            if slot is None:
+                continue
+            if doc_id is None:
+                doc_id = self._next_doc_id(conn, slot)
+                conn.execute("INSERT INTO qe_product_search_docs (doc_id, product_id) VALUES (?, ?)", (doc_id, pid))
+            conn.execute("INSERT INTO qe_product_search (rowid, search_text) VALUES (?, ?)",
+                         (doc_id, normalize(live[pid][1] or "")))
+        conn.execute(f"DELETE FROM qe_product_search_dirty WHERE product_id IN ({marks})", ids)
+
+
+def product_search_for(db_path: Optional[str]) -> Optional[ProductSearchIndex]:
+    """ProductSearchIndex with its schema in place, or None if the DB can't host it."""
+    if not db_path:
+        return None
+    index = ProductSearchIndex(db_path)
+    return index if index.ensure_schema() else None
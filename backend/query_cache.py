@@ -0,0 +1,127 @@
+"""
+QueryResultCache: LRU cache of QueryEngine results, invalidated by data version.
+
+Key: (normalized SQL, bound parameters).
+Validity: every entry is tagged with SQLite's PRAGMA data_version at read time.
+When the version moves (any committed write to the file) the whole cache is
+dropped, so entries stay valid exactly until data actually changes.
+SQL that depends on the clock ('now', CURRENT_DATE, ...) can change without a
+write, so those entries also get a short TTL.
+"""
+
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("QueryCache")
+
+_STRING_OR_WS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|\s+")
+_TIME_DEPENDENT = re.compile(r"'now'|current_(?:date|time|timestamp)|random\s*\(", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside string literals and drop a trailing ';'."""
+    normalized = _STRING_OR_WS.sub(lambda m: m.group(1) or " ", sql.strip())
+    return normalized.rstrip("; ")
+
+
+def estimate_size(rows: List[Dict[str, Any]]) -> int:
+    """Rough in-memory footprint in bytes (good enough for a cap, cheap to compute)."""
+    size = 64
+    for row in rows:
+        size += 64
+        for key, value in row.items():
+            size += 50 + len(key)
+            if isinstance(value, (str, bytes)):
+                size += len(value)
+    return size
+
+
+class QueryResultCache:
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, time_dependent_ttl_s: float = 60.0):
+        self.max_bytes = max_bytes
+        self.time_dependent_ttl_s = time_dependent_ttl_s
+        # key -> (rows, size_bytes, expires_at or None)
+        self._entries: "OrderedDict[Tuple[str, tuple], Tuple[List[Dict[str, Any]], int, Optional[float]]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(sql: str, params: Sequence[Any] = ()) -> Tuple[str, tuple]:
+        return normalize_sql(sql), tuple(params)
+
+    def _sync_version(self, version: int):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                logger.debug(f"♻️ data_version {self._version} -> {version}, dropping {len(self._entries)} entries")
+            self._entries.clear()
+            self.bytes = 0
+            self._version = version
+
+    def get(self, key: Tuple[str, tuple], version: int) -> Optional[List[Dict[str, Any]]]:
+        self._sync_version(version)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        rows, size, expires_at = entry
+        if expires_at is not None and time.monotonic() > expires_at:
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return rows
+
+    def put(self, key: Tuple[str, tuple], version: int, rows: List[Dict[str, Any]]):
+        """version must be the data_version read *before* the query ran."""
+        if version != self._version:
+            # A write landed while the query ran; the result may already be stale
+            return
+        size = estimate_size(rows)
+        if size > self.max_bytes // 4:
+            return  # one giant export shouldn't flush the whole cache
+
+        expires_at = None
+        if _TIME_DEPENDENT.search(key[0]):
+            expires_at = time.monotonic() + self.time_dependent_ttl_s
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (rows, size, expires_at)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "data_version": self._version,
+        }
@@ -0,0 +1,123 @@
+"""
+QueryDatabase: Everything QueryEngine needs for one SQLite file.
+Bundles the read-only pool, the data_version-keyed result cache, the
+daily rollups and the product search index, so the engine can serve one local Drift DB or many per-shop
+files (see tenant_router.py) through the same calls.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from sqlite_pool import SQLitePool
+from query_cache import QueryResultCache
+from sql_guard import sql_guard
+from index_provisioner import ensure_indexes
+from rollups import rollup_for
+from product_search import product_search_for
+
+logger = logging.getLogger("QueryDatabase")
+
+
+class QueryDatabase:
+    dialect = "sqlite"
+
+    def __init__(self, db_path: str, pool_size: Optional[int] = None, cache_bytes: Optional[int] = None,
+                 provision_indexes: Optional[bool] = None, rollups: Optional[bool] = None,
+                 product_search: Optional[bool] = None):
+        """Blocking (index provisioning, rollup/search schema): construct off the event loop when serving."""
+        self.db_path = db_path
+        if provision_indexes is None:
+            provision_indexes = os.getenv("QUERY_PROVISION_INDEXES", "1") != "0"
+        if rollups is None:
+            rollups = os.getenv("QUERY_ROLLUPS", "1") != "0"
+        if product_search is None:
+            product_search = os.getenv("QUERY_PRODUCT_SEARCH", "1") != "0"
+
+        # Composite indexes for the (rewritten) query shapes; one-off read-write step
+        if provision_indexes:
+            ensure_indexes(db_path)
+        # Read-only pooled connections; queries run on the pool's threads
+        self.pool = SQLitePool(db_path, size=pool_size)
+        # Results stay cached until PRAGMA data_version says the file changed
+        self.result_cache = QueryResultCache(
+            max_bytes=cache_bytes or int(os.getenv("QUERY_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+        )
+        # Per-user daily sales rollups, caught up incrementally when the DB changes
+        self.rollups = rollup_for(db_path) if rollups else None
+        # Trigram index over normalized product names, fed by trigger-queued changes
+        self.product_search = product_search_for(db_path) if product_search else None
+        self._derived_version: Optional[int] = None
+        self._derived_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def rollups_ready(self) -> bool:
+        return bool(self.rollups and self.rollups.ready)
+
+    @property
+    def product_search_ready(self) -> bool:
+        return bool(self.product_search and self.product_search.ready)
+
+    async def refresh_derived(self):
+        """
+        Catch rollups and the product search index up with app writes;
+        a no-op while PRAGMA data_version is unchanged.
+        """
+        if not self.rollups and not self.product_search:
+            return
+        if self._derived_lock is None:
+            self._derived_lock = asyncio.Lock()
+        if await self.pool.current_data_version() == self._derived_version:
+            return
+        async with self._derived_lock:
+            if await self.pool.current_data_version() == self._derived_version:
+                return
+            for name, part in (("Rollup", self.rollups), ("Product search", self.product_search)):
+                if not part:
+                    continue
+                try:
+                    await asyncio.to_thread(part.refresh)
+                except Exception as e:
+                    # Stale derived tables beat a failed query; base-table SQL still works
+                    logger.warning(f"⚠️ {name} refresh failed: {e}")
+                    return
+            # Read after our own writes so they don't look like a new change
+            self._derived_version = await self.pool.current_data_version()
+
+    async def execute(self, sql: str, params: Sequence[Any] = (),
+                      question: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Runs sql on the read-only pool under sql_guard's instruction/time budget
+        (raises QueryBudgetExceeded), serving repeats from the result cache.
+        """
+        key = self.result_cache.make_key(sql, params)
+        version = await self.pool.current_data_version()
+        cached = self.result_cache.get(key, version)
+        if cached is not None:
+            return cached
+
+        results = await self.pool.run(sql_guard.execute_bounded, sql, params, question)
+        self.result_cache.put(key, version, results)
+        return results
+
+    def stream(self, sql: str, params: Sequence[Any] = (), question: Optional[str] = None,
+               batch_size: int = 500) -> AsyncIterator[List[Dict[str, Any]]]:
+        """fetchmany() batches on a dedicated connection; never cached."""
+        return self.pool.stream(sql_guard.iter_bounded, sql, params, question, batch_size)
+
+    async def explain(self, sql: str, params: Sequence[Any] = ()) -> List[str]:
+        """EXPLAIN QUERY PLAN details, for the slow-query log."""
+        return await self.pool.run(sql_guard.explain, sql, params)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "db_path": self.db_path,
+            "result_cache": self.result_cache.stats(),
+            "rollups": self.rollups.last_refresh if self.rollups else None,
+            "product_search": self.product_search_ready,
+        }
+
+    def close(self):
+        """Blocking: waits for in-flight pool work."""
+        self.pool.close()
@@ -3,28 +3,63 @@ QueryEngine: Text-to-SQL for Business Queries
 Translates natural language questions into SQL, executes, and formats results.
 """
 
+import asyncio
 import logging
 import json
-import sqlite3
 import os
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, List, Optional
 from groq import AsyncGroq
 from dotenv import load_dotenv
 
+from sql_guard import SQLGuardError, pg_sql_guard, sql_guard
+import query_templates
+from query_templates import TemplateMatch
+from product_search import search_query
+from sql_rewriter import sql_rewriter
+from query_database import QueryDatabase
+from tenant_router import TenantRouter
+from slow_query_log import slow_query_log
+
 load_dotenv()
 
 logger = logging.getLogger("QueryEngine")
 
+# Streaming mode: rows per fetchmany() batch, hard row cap, rows kept for the text summary
+STREAM_BATCH_ROWS = int(os.getenv("QUERY_STREAM_BATCH_ROWS", 500))
+STREAM_MAX_ROWS = int(os.getenv("QUERY_STREAM_MAX_ROWS", 100_000))
+FORMAT_PREFIX_ROWS = 10
+
 class QueryEngine:
     def __init__(self, db_path: Optional[str] = None):
         self.api_key = os.getenv("GROQ_API_KEY")
         self.client = AsyncGroq(api_key=self.api_key)
         self.model = "llama-3.1-8b-instant"
         
-        # Database path - set via environment or auto-detect
-        self.db_path = db_path or os.getenv("DUKANX_DB_PATH") or self._find_db()
-        logger.info(f"📂 Database Path: {self.db_path or 'NOT FOUND (using mock)'}")
+        # Cloud: the multi-tenant Postgres schema, scoped per business by RLS
+        self.pg = None
+        if not db_path and os.getenv("QUERY_BACKEND", "sqlite") == "postgres":
+            from pg_query_database import PgQueryBackend
+            self.pg = PgQueryBackend()
+        
+        # Hosted: one SQLite file per shop under DUKANX_TENANT_DB_DIR, opened on demand
+        tenant_dir = None if db_path or self.pg else os.getenv("DUKANX_TENANT_DB_DIR")
+        self.router = TenantRouter(tenant_dir) if tenant_dir else None
+        
+        # Local: a single database path - set via environment or auto-detect
+        self.db_path = None
+        self.db: Optional[QueryDatabase] = None
+        if self.pg:
+            logger.info("🐘 Query backend: Postgres")
+        elif self.router:
+            logger.info(f"📂 Tenant DB Directory: {tenant_dir}")
+        else:
+            self.db_path = db_path or os.getenv("DUKANX_DB_PATH") or self._find_db()
+            logger.info(f"📂 Database Path: {self.db_path or 'NOT FOUND (using mock)'}")
+            # Pool, result cache and rollups for the file
+            self.db = QueryDatabase(self.db_path) if self.db_path else None
         
         # Accurate schema from DukanX Drift tables
         self.SCHEMA_PROMPT = """
@@ -106,6 +141,26 @@ CREATE TABLE journal_entries (
     created_at INTEGER
 );
 
+-- qe_daily_sales (Pre-aggregated: one row per user per local day, deleted bills excluded)
+CREATE TABLE qe_daily_sales (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,  -- 'YYYY-MM-DD', local time
+    day_start INTEGER NOT NULL,  -- Unix timestamp of local midnight
+    sales REAL, tax REAL, discount REAL, paid REAL,
+    cash_paid REAL, online_paid REAL,
+    bill_count INTEGER
+);
+
+-- qe_daily_payment_modes (Pre-aggregated: per user, local day and payment_mode)
+CREATE TABLE qe_daily_payment_modes (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    day_start INTEGER NOT NULL,
+    payment_mode TEXT NOT NULL,  -- 'UNKNOWN' when the bill had none
+    total REAL, paid REAL,
+    bill_count INTEGER
+);
+
 RULES:
 ------
 1. Output ONLY valid JSON: {"sql": "...", "explanation": "..."}
@@ -113,9 +168,14 @@ RULES:
    - Today: datetime(bill_date, 'unixepoch') >= datetime('now', 'start of day')
    - This month: strftime('%Y-%m', datetime(bill_date, 'unixepoch')) = strftime('%Y-%m', 'now')
    - This week: bill_date >= strftime('%s', 'now', '-7 days')
-3. ALWAYS filter: user_id = '{user_uid}' AND deleted_at IS NULL
+3. ALWAYS filter: user_id = '{user_uid}' AND deleted_at IS NULL, ANDed into the WHERE clause
+   (qe_daily_* tables only need user_id; they have no deleted_at).
+   With joins, filter each table by its alias: b.user_id = '{user_uid}' AND c.user_id = '{user_uid}' ...
 4. Limit to 20 rows max.
 5. Return null sql if question is unanswerable.
+6. For sales/collection totals or day-wise trends over whole days, weeks, months or years,
+   prefer qe_daily_sales / qe_daily_payment_modes over summing bills, filtering on day:
+   - This month: day >= date('now', 'localtime', 'start of month')
 
 EXAMPLES:
 ---------
@@ -129,7 +189,10 @@ User: "Stock of milk"
 Output: {{"sql": "SELECT name, stock_quantity, unit FROM products WHERE user_id = '{user_uid}' AND deleted_at IS NULL AND LOWER(name) LIKE '%milk%'", "explanation": "Stock for products matching 'milk'"}}
 
 User: "This month revenue"
-Output: {{"sql": "SELECT COALESCE(SUM(grand_total), 0) as revenue FROM bills WHERE user_id = '{user_uid}' AND deleted_at IS NULL AND strftime('%Y-%m', datetime(bill_date, 'unixepoch')) = strftime('%Y-%m', 'now')", "explanation": "Total revenue this month"}}
+Output: {{"sql": "SELECT COALESCE(SUM(sales), 0) as revenue FROM qe_daily_sales WHERE user_id = '{user_uid}' AND day >= date('now', 'localtime', 'start of month')", "explanation": "Total revenue this month"}}
+
+User: "Cash vs online this week"
+Output: {{"sql": "SELECT payment_mode, SUM(total) as total FROM qe_daily_payment_modes WHERE user_id = '{user_uid}' AND day >= date('now', 'localtime', '-6 days') GROUP BY payment_mode ORDER BY total DESC", "explanation": "Sales by payment mode, last 7 days"}}
 """
 
     def _find_db(self) -> Optional[str]:
@@ -167,17 +230,59 @@ Output: {{"sql": "SELECT COALESCE(SUM(grand_total), 0) as revenue FROM bills WHE
         logger.warning("⚠️ No database file found. Will use mock data.")
         return None
 
-    async def run_query(self, user_uid: str, question: str) -> Dict[str, Any]:
+    @asynccontextmanager
+    async def _database(self, user_uid: str, business_id: Optional[str] = None) -> AsyncIterator[Optional[QueryDatabase]]:
         """
-        Main entry point.
-        1. Translate question to SQL using LLM.
-        2. Execute SQL against local database.
-        3. Format and return results.
+        The database serving user_uid: a business-scoped Postgres view, their own
+        file when routed, else the local one.
         """
-        logger.info(f"📊 Query Request: {question} (User: {user_uid})")
+        if self.pg:
+            business_id = await self.pg.resolve_business(user_uid, business_id)
+            yield self.pg.scoped(business_id) if business_id else None
+        elif self.router:
+            async with self.router.acquire(user_uid) as db:
+                yield db
+        else:
+            yield self.db
+
+    async def _plan(self, user_uid: str, question: str, db: Optional[QueryDatabase],
+                    max_rows: Optional[int] = None, template: Optional[TemplateMatch] = None) -> Dict[str, Any]:
+        """
+        Steps 0-2 of a query: pick template or generated SQL, guard and rewrite it.
+        template skips matching (voice intents). Returns {"sql", "params",
+        "explanation", "template"} or a failure response.
+        """
+        if (self.router or self.pg) and db is None:
+            return {"success": False, "text": "No data has been synced for this shop yet.", "data": None}
+        postgres = getattr(db, "dialect", "sqlite") == "postgres"
+        if db:
+            await db.refresh_derived()
+        
+        # 0. Known intents: precompiled template, no LLM round trip (templates are SQLite SQL)
+        if postgres:
+            template = None
+        elif template is None:
+            template = query_templates.match(user_uid, question)
+        if template:
+            sql, params = template.sql, template.params
+            if template.search and db and db.product_search_ready:
+                # Trigram index over transliterated names instead of a LIKE '%x%' scan
+                sql, params = search_query(user_uid, template.search)
+            elif template.rollup_sql and db and db.rollups_ready:
+                # Same params, same answer: the rollup variant just reads day buckets instead of bills
+                sql = template.rollup_sql
+            return {
+                "sql": sql,
+                "params": params,
+                "explanation": template.explanation,
+                "template": template.name,
+                "generate_ms": 0.0,
+            }
         
         # 1. Generate SQL
-        sql_result = await self._generate_sql(user_uid, question)
+        started = time.perf_counter()
+        sql_result = await self._generate_sql(user_uid, question, db.schema_prompt if postgres else None)
+        generate_ms = (time.perf_counter() - started) * 1000
         
         if not sql_result.get("sql"):
             return {
@@ -187,36 +292,144 @@ Output: {{"sql": "SELECT COALESCE(SUM(grand_total), 0) as revenue FROM bills WHE
             }
         
         sql = sql_result["sql"]
-        explanation = sql_result.get("explanation", "")
         
-        # 2. Execute SQL
+        # 2. Guard: single SELECT, tenant filters, bounded LIMIT; then make it index-friendly
         try:
-            results = self._execute_sql(sql)
-        except Exception as e:
-            logger.error(f"SQL Execution Error: {e}")
+            if postgres:
+                sql = pg_sql_guard.check(sql, db.business_id, max_rows=max_rows)
+            else:
+                sql = sql_rewriter.rewrite(sql_guard.check(sql, user_uid, max_rows=max_rows))
+        except SQLGuardError as e:
+            logger.warning(f"🛡️ Rejected SQL ({e}): {sql}")
             return {
                 "success": False,
-                "text": f"Query failed: {str(e)}",
+                "text": f"I can't run that query safely: {e}",
                 "data": None,
                 "sql": sql
             }
         
-        # 3. Format Response
-        formatted = self._format_results(results, explanation, question)
+        return {"sql": sql, "params": (), "explanation": sql_result.get("explanation", ""), "template": None,
+                "generate_ms": generate_ms}
+
+    async def run_query(self, user_uid: str, question: str, business_id: Optional[str] = None,
+                        template: Optional[TemplateMatch] = None) -> Dict[str, Any]:
+        """
+        Main entry point.
+        0. Use a precompiled template if the question is a known intent.
+        1. Otherwise translate question to SQL using LLM.
+        2. Guard the SQL (single SELECT, tenant filters, LIMIT).
+        3. Execute SQL against the user's database under a cost budget.
+        4. Format and return results.
+        """
+        logger.info(f"📊 Query Request: {question} (User: {user_uid})")
+        
+        async with self._database(user_uid, business_id) as db:
+            plan = await self._plan(user_uid, question, db, template=template)
+            if "success" in plan:
+                return plan
+            sql = plan["sql"]
+            
+            # 3. Execute SQL (timed separately from generation for the slow-query log)
+            started = time.perf_counter()
+            try:
+                results = await self._execute_sql(db, sql, plan["params"], question=question)
+            except Exception as e:
+                logger.error(f"SQL Execution Error: {e}")
+                await self._log_if_slow(db, plan, question, None, (time.perf_counter() - started) * 1000, str(e))
+                return {
+                    "success": False,
+                    "text": f"Query failed: {str(e)}",
+                    "data": None,
+                    "sql": sql
+                }
+            execute_ms = (time.perf_counter() - started) * 1000
+            await self._log_if_slow(db, plan, question, len(results), execute_ms)
         
+        # 4. Format Response
+        formatted = self._format_results(results, plan["explanation"], question)
+        
+        data = {
+            "rows": results,
+            "count": len(results),
+            "sql": sql,
+            "timings": {"generate_ms": round(plan["generate_ms"], 1), "execute_ms": round(execute_ms, 1)}
+        }
+        if plan["template"]:
+            data["template"] = plan["template"]
         return {
             "success": True,
             "text": formatted["text"],
-            "data": {
-                "rows": results,
-                "count": len(results),
-                "sql": sql
-            }
+            "data": data
         }
 
-    async def _generate_sql(self, user_uid: str, question: str) -> Dict[str, Any]:
-        """Use LLM to convert question to SQL."""
-        prompt = self.SCHEMA_PROMPT.replace("{user_uid}", user_uid)
+    async def check_stock(self, user_uid: str, product_name: str,
+                          business_id: Optional[str] = None) -> Dict[str, Any]:
+        """Stock lookup by product name (voice check_stock intent); Hindi, Hinglish or English."""
+        template = query_templates.stock_template(user_uid, product_name)
+        return await self.run_query(user_uid, f"Stock of {product_name}", business_id, template=template)
+
+    async def stream_query(self, user_uid: str, question: str, batch_size: Optional[int] = None,
+                           business_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of run_query for large results (exports, long lists).
+        Yields {"rows": [...]} per fetchmany batch, then one final
+        {"done": True, "success", "text", "count", "sql"} event. Only the first
+        FORMAT_PREFIX_ROWS rows are kept for the text summary; results aren't cached.
+        """
+        logger.info(f"📊 Streaming Query Request: {question} (User: {user_uid})")
+        batch_size = batch_size or STREAM_BATCH_ROWS
+        
+        # The database stays pinned (not evicted/closed) until the stream ends
+        async with self._database(user_uid, business_id) as db:
+            plan = await self._plan(user_uid, question, db, max_rows=STREAM_MAX_ROWS)
+            if "success" in plan:
+                yield {"done": True, **plan}
+                return
+            sql = plan["sql"]
+            
+            prefix: List[Dict[str, Any]] = []
+            count = 0
+            try:
+                if db:
+                    batches = db.stream(sql, plan["params"], question, batch_size)
+                else:
+                    batches = self._mock_batches(sql)
+                async for batch in batches:
+                    if len(prefix) < FORMAT_PREFIX_ROWS:
+                        prefix.extend(batch[:FORMAT_PREFIX_ROWS - len(prefix)])
+                    count += len(batch)
+                    yield {"rows": batch}
+            except Exception as e:
+                logger.error(f"SQL Streaming Error after {count} rows: {e}")
+                yield {"done": True, "success": False, "text": f"Query failed: {str(e)}", "count": count, "sql": sql}
+                return
+        
+        formatted = self._format_results(prefix, plan["explanation"], question, total=count)
+        done = {"done": True, "success": True, "text": formatted["text"], "count": count, "sql": sql}
+        if plan["template"]:
+            done["template"] = plan["template"]
+        yield done
+
+    async def _log_if_slow(self, db: Optional[QueryDatabase], plan: Dict[str, Any], question: str,
+                           rows: Optional[int], execute_ms: float, error: Optional[str] = None):
+        """Slow calls go to slow_query_log, with the plan when the SQL itself was slow."""
+        if not slow_query_log.is_slow(plan["generate_ms"], execute_ms):
+            return
+        query_plan = None
+        if db and execute_ms >= slow_query_log.execute_threshold_ms:
+            try:
+                query_plan = await db.explain(plan["sql"], plan["params"])
+            except Exception as e:
+                query_plan = [f"<plan unavailable: {e}>"]
+        await asyncio.to_thread(
+            slow_query_log.record, question=question, sql=plan["sql"], rows=rows,
+            generate_ms=plan["generate_ms"], execute_ms=execute_ms, plan=query_plan,
+            template=plan["template"], error=error, dialect=getattr(db, "dialect", "sqlite"),
+        )
+
+    async def _generate_sql(self, user_uid: str, question: str, schema_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """Use LLM to convert question to SQL (schema_prompt overrides the SQLite one)."""
+        prompt = schema_prompt or self.SCHEMA_PROMPT.replace("{user_uid}", user_uid)
         
         try:
             completion = await self.client.chat.completions.create(
@@ -242,23 +455,30 @@ Output: {{"sql": "SELECT COALESCE(SUM(grand_total), 0) as revenue FROM bills WHE
             logger.error(f"SQL Generation Error: {e}")
             return {"sql": None, "explanation": f"LLM Error: {str(e)}"}
 
-    def _execute_sql(self, sql: str) -> List[Dict[str, Any]]:
-        """Execute SQL and return results as list of dicts."""
-        if not self.db_path:
+    async def _execute_sql(self, db: Optional[QueryDatabase], sql: str, params: tuple = (),
+                           question: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Execute SQL on the database's read-only pool and return results as list of dicts.
+        Runs under sql_guard's instruction/time budget (raises QueryBudgetExceeded).
+        """
+        if not db:
             # Return mock data for testing when no DB is available
             logger.warning("No database found. Returning mock data.")
             return self._get_mock_data(sql)
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute(sql)
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-        finally:
-            conn.close()
+        return await db.execute(sql, params, question)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Result cache (local DB) or router stats (per-shop DBs)."""
+        if self.pg:
+            return {"backend": "postgres"}
+        if self.router:
+            return {"tenants": self.router.stats()}
+        return self.db.result_cache.stats() if self.db else {}
+
+    async def _mock_batches(self, sql: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        logger.warning("No database found. Streaming mock data.")
+        yield self._get_mock_data(sql)
 
     def _get_mock_data(self, sql: str) -> List[Dict[str, Any]]:
         """Return mock data for testing without a real database."""
@@ -277,30 +497,41 @@ Output: {{"sql": "SELECT COALESCE(SUM(grand_total), 0) as revenue FROM bills WHE
         else:
             return [{"message": "Mock data - no database connected"}]
 
-    def _format_results(self, results: List[Dict], explanation: str, question: str) -> Dict[str, str]:
-        """Format query results into natural language."""
+    def _format_results(self, results: List[Dict], explanation: str, question: str,
+                        total: Optional[int] = None) -> Dict[str, str]:
+        """
+        Format query results into natural language.
+        results may be just a prefix of the rows (streaming); total is then the full count.
+        """
+        count = total if total is not None else len(results)
         if not results:
             return {"text": "No data found for your query."}
         
         # Single aggregation result
-        if len(results) == 1:
+        if count == 1:
             row = results[0]
             if "total_sales" in row:
                 val = row["total_sales"] or 0
-                return {"text": f"Today's total sales: ₹{val:,.2f}"}
+                label = explanation or "Today's total sales"
+                return {"text": f"{label}: ₹{val:,.2f}"}
+            elif "revenue" in row:
+                val = row["revenue"] or 0
+                return {"text": f"{explanation or 'Revenue'}: ₹{val:,.2f}"}
             elif "total_dues" in row:
                 return {"text": f"Pending dues: ₹{row['total_dues']:,.2f}"}
             elif "stock_quantity" in row:
                 return {"text": f"{row.get('name', 'Product')}: {row['stock_quantity']} {row.get('unit', 'units')} in stock."}
         
         # List results
-        if len(results) > 1:
+        if count > 1:
             # Format as a simple list
             lines = [explanation + ":"] if explanation else []
-            for i, row in enumerate(results[:10], 1):
+            for i, row in enumerate(results[:FORMAT_PREFIX_ROWS], 1):
                 # Dynamically format based on keys
                 if "name" in row and "total_dues" in row:
                     lines.append(f"{i}. {row['name']}: ₹{row['total_dues']:,.2f}")
+                elif "name" in row and "stock_quantity" in row:
+                    lines.append(f"{i}. {row['name']}: {row['stock_quantity']} {row.get('unit') or 'units'}")
                 elif "name" in row and "grand_total" in row:
                     lines.append(f"{i}. {row['name']}: ₹{row['grand_total']:,.2f}")
                 elif "customer_name" in row:
@@ -310,13 +541,14 @@ Output: {{"sql": "SELECT COALESCE(SUM(grand_total), 0) as revenue FROM bills WHE
                     parts = [f"{k}: {v}" for k, v in row.items() if v is not None]
                     lines.append(f"{i}. " + ", ".join(parts[:3]))
             
-            if len(results) > 10:
-                lines.append(f"... and {len(results) - 10} more.")
+            shown = min(len(results), FORMAT_PREFIX_ROWS)
+            if count > shown:
+                lines.append(f"... and {count - shown} more.")
             
             return {"text": "\n".join(lines)}
         
         # Fallback
-        return {"text": f"Found {len(results)} results. {explanation}"}
+        return {"text": f"Found {count} results. {explanation}"}
 
 
 # Singleton instance
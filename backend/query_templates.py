@@ -0,0 +1,279 @@
+"""
+QueryTemplates: Hand-written SQL for the most common business questions.
+A lightweight local matcher extracts slots (period, product name, top-N) and
+returns parameterized, index-friendly SQL, so the bulk of /query traffic skips
+the LLM round trip. Anything not confidently matched falls back to text-to-SQL.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger("QueryTemplates")
+
+
+@dataclass
+class TemplateMatch:
+    name: str
+    sql: str
+    params: Tuple[Any, ...]
+    explanation: str
+    rollup_sql: Optional[str] = None  # same params, reads qe_daily_sales (see rollups.py)
+    search: Optional[str] = None  # product name for the FTS index (see product_search.py)
+
+
+# --- SLOT EXTRACTION ---
+# (pattern, period key) - first match wins, so specific phrases come first
+PERIOD_PATTERNS: List[Tuple[str, str]] = [
+    (r"\byesterday\b|\bkal\b|कल", "yesterday"),
+    (r"\blast month\b|\bpichhle mahine\b|\bpichle mahine\b|पिछले महीने", "last_month"),
+    (r"\blast week\b|\bpichhle hafte\b|\bpichle hafte\b|पिछले हफ्ते", "last_week"),
+    (r"\blast 7 days\b|\bpast week\b|\bsaat din\b", "last_7_days"),
+    (r"\bthis week\b|\bis hafte\b|इस हफ्ते", "this_week"),
+    (r"\bthis month\b|\bis mahine\b|इस महीने", "this_month"),
+    (r"\bthis year\b|\bis saal\b|इस साल", "this_year"),
+    (r"\btoday\b|\baaj\b|आज", "today"),
+]
+# Left over after the matched phrase, these name some other period ("day before yesterday",
+# "sales in march this year"): no template covers it, so the question goes to the LLM
+OTHER_PERIOD = re.compile(
+    r"\b(?:last|previous|prev|next|ago|before|after|since|until|till|pichhle|pichle|agle|agla|pehle|pahle|"
+    r"baad|parso|january|february|march|april|may|june|july|august|september|october|november|december|"
+    r"jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec)\b|पिछले|अगले|पहले|बाद|परसों",
+    re.IGNORECASE,
+)
+
+PERIOD_LABELS = {
+    "today": "Today's",
+    "yesterday": "Yesterday's",
+    "this_week": "This week's",
+    "last_week": "Last week's",
+    "last_7_days": "Last 7 days'",
+    "this_month": "This month's",
+    "last_month": "Last month's",
+    "this_year": "This year's",
+}
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                "eight": 8, "nine": 9, "ten": 10, "twenty": 20}
+
+# Questions that need grouping/comparison logic are left to the LLM
+COMPLEX_MARKERS = re.compile(
+    r"\b(each|per|by customer|by product|compare|vs|versus|average|avg|trend|between|growth|profit|"
+    r"category|categories|wise)\b", re.IGNORECASE
+)
+
+
+def period_range(period: str, now: Optional[datetime] = None) -> Tuple[int, int]:
+    """[start, end) as Unix seconds in server-local time."""
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "today":
+        start, end = today, today + timedelta(days=1)
+    elif period == "yesterday":
+        start, end = today - timedelta(days=1), today
+    elif period == "this_week":
+        start = today - timedelta(days=today.weekday())
+        end = today + timedelta(days=1)
+    elif period == "last_week":
+        end = today - timedelta(days=today.weekday())
+        start = end - timedelta(days=7)
+    elif period == "last_7_days":
+        start, end = today - timedelta(days=6), today + timedelta(days=1)
+    elif period == "this_month":
+        start, end = today.replace(day=1), today + timedelta(days=1)
+    elif period == "last_month":
+        end = today.replace(day=1)
+        start = (end - timedelta(days=1)).replace(day=1)
+    elif period == "this_year":
+        start, end = today.replace(month=1, day=1), today + timedelta(days=1)
+    else:
+        raise ValueError(f"Unknown period '{period}'")
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def _period_slot(text: str) -> Tuple[Optional[str], str]:
+    """(period, text with the period phrase removed)."""
+    for pattern, period in PERIOD_PATTERNS:
+        m = re.search(pattern, text, re.IGNORECASE)
+        if m:
+            rest = f"{text[:m.start()]} {text[m.end():]}"
+            return (None if OTHER_PERIOD.search(rest) else period), rest
+    return None, text
+
+
+def extract_period(text: str) -> Optional[str]:
+    return _period_slot(text)[0]
+
+
+def _top_n_slot(text: str, default: int = 5, max_n: int = 50) -> Tuple[int, str]:
+    """(N, text with the number removed)."""
+    m = re.search(r"\btop\s+(\d+|" + "|".join(NUMBER_WORDS) + r")\b", text, re.IGNORECASE)
+    if not m:
+        m = re.search(r"\b(\d+)\s+(?:customers|log|logon|grahak)\b", text, re.IGNORECASE)
+    if not m:
+        return default, text
+    raw = m.group(1).lower()
+    n = NUMBER_WORDS.get(raw) or int(raw)
+    return max(1, min(n, max_n)), f"{text[:m.start(1)]} {text[m.end(1):]}"
+
+
+def extract_top_n(text: str, default: int = 5, max_n: int = 50) -> int:
+    return _top_n_slot(text, default, max_n)[0]
+
+
+PRODUCT_PATTERNS = [
+    r"\bstock (?:of|for) (?P<name>.+?)(?: left| remaining| available| do i have)?$",
+    r"\bhow (?:much|many) (?P<name>.+?) (?:is |are )?(?:left|remaining|in stock|do i have)\b",
+    r"^(?P<name>.+?) (?:ka|ki|ke) stock\b",
+    r"^(?P<name>.+?) (?:kitna|kitni|kitne) (?:hai|bacha|bachi|bache|stock)\b",
+    r"^(?P<name>.+?) का स्टॉक",
+    r"^(?P<name>.+?) (?:कितना|कितनी|कितने) (?:है|बचा|बची|बचे|स्टॉक)",
+]
+_FILLER = re.compile(r"^(?:the|my|a|an)\s+|\s+(?:please|plz|hai|h)$", re.IGNORECASE)
+
+
+def _product_slot(text: str) -> Tuple[Optional[str], str]:
+    """(product name, text with the name removed)."""
+    cleaned = text.strip().rstrip("?.!। ")
+    for pattern in PRODUCT_PATTERNS:
+        m = re.search(pattern, cleaned, re.IGNORECASE)
+        if m:
+            name = _FILLER.sub("", m.group("name").strip()).strip(" '\"")
+            # "how much stock do i have" names no product
+            if name and len(name) <= 60 and _leftover(name, STOCK_VOCAB):
+                return name, f"{cleaned[:m.start('name')]} {cleaned[m.end('name'):]}"
+    return None, text
+
+
+def extract_product(text: str) -> Optional[str]:
+    return _product_slot(text)[0]
+
+
+# --- STRICT MATCHING ---
+# A template only answers when every word is one of its own or part of a slot it filled.
+# A leftover customer, product, payment mode or threshold would be silently ignored and
+# give a confident wrong answer, so such questions go to the LLM instead.
+_WORD = re.compile(r"[a-z0-9_\u0900-\u097f]+")
+COMMON_WORDS = {
+    "what", "whats", "s", "is", "was", "are", "were", "my", "the", "a", "an", "of", "for", "in", "so", "far",
+    "show", "me", "tell", "give", "get", "please", "plz", "total", "overall", "how", "much", "many", "i",
+    "do", "did", "does", "we", "our", "have", "store", "shop", "dukan", "kya", "hai", "tha", "thi", "h",
+    "ka", "ki", "ke", "kul", "kitna", "kitni", "kitne", "mera", "meri", "mere", "hamara", "hamari",
+    "batao", "bata", "dikhao", "क्या", "है", "था", "थी", "का", "की", "के", "कुल", "कितना", "कितनी",
+    "कितने", "मेरा", "मेरी", "मेरे", "बताओ", "दिखाओ",
+}
+SALES_VOCAB = {"sale", "sales", "revenue", "bikri", "kamai", "turnover", "collection", "amount",
+               "बिक्री", "कमाई"}
+DUES_VOCAB = {"due", "dues", "udhar", "udhaar", "baki", "baaki", "pending", "outstanding", "amount",
+              "customer", "customers", "grahak", "log", "logon", "owe", "owed", "all", "market", "se",
+              "बकाया", "उधार", "बाकी", "ग्राहक"}
+TOP_DUES_VOCAB = DUES_VOCAB | {
+    "top", "highest", "most", "biggest", "largest", "sabse", "zyada", "jyada", "list", "which", "kaun",
+    "who", "whose", "kiska", "kiski", "kiske", "with", "has", "owes", "debtors", "people",
+    "सबसे", "ज़्यादा", "ज्यादा", "कौन", "किसका", "किसकी",
+} | set(NUMBER_WORDS)
+STOCK_VOCAB = {"stock", "left", "remaining", "available", "inventory", "bacha", "bachi", "bache",
+               "स्टॉक", "बचा", "बची", "बचे"}
+
+
+def _leftover(text: str, vocab: Set[str]) -> List[str]:
+    """Words of text that are neither vocab nor COMMON_WORDS."""
+    return [w for w in _WORD.findall(text.lower()) if w not in vocab and w not in COMMON_WORDS]
+
+
+# --- TEMPLATES ---
+SALES_TOTAL_SQL = (
+    "SELECT COALESCE(SUM(grand_total), 0) AS total_sales, COUNT(*) AS bill_count "
+    "FROM bills WHERE user_id = ? AND deleted_at IS NULL AND bill_date >= ? AND bill_date < ?"
+)
+# Period ranges are local-midnight aligned, so whole day buckets give the same totals
+ROLLUP_SALES_TOTAL_SQL = (
+    "SELECT COALESCE(SUM(sales), 0) AS total_sales, COALESCE(SUM(bill_count), 0) AS bill_count "
+    "FROM qe_daily_sales WHERE user_id = ? AND day_start >= ? AND day_start < ?"
+)
+TOP_DUES_SQL = (
+    "SELECT name, total_dues FROM customers "
+    "WHERE user_id = ? AND deleted_at IS NULL AND total_dues > 0 "
+    "ORDER BY total_dues DESC LIMIT ?"
+)
+PRODUCT_STOCK_SQL = (
+    "SELECT name, stock_quantity, unit FROM products "
+    "WHERE user_id = ? AND deleted_at IS NULL AND name LIKE ? ESCAPE '\\' "
+    "ORDER BY stock_quantity DESC LIMIT 20"
+)
+TOTAL_DUES_SQL = (
+    "SELECT COALESCE(SUM(total_dues), 0) AS total_dues FROM customers "
+    "WHERE user_id = ? AND deleted_at IS NULL AND total_dues > 0"
+)
+
+SALES_WORDS = re.compile(r"\b(sale|sales|revenue|bikri|kamai|turnover|collection)\b|बिक्री|कमाई|sale", re.IGNORECASE)
+DUES_WORDS = re.compile(r"\b(due|dues|udhar|udhaar|baki|baaki|pending|outstanding)\b|बकाया|उधार", re.IGNORECASE)
+TOP_WORDS = re.compile(r"\b(top|highest|most|sabse|list|which|kaun|who)\b|सबसे", re.IGNORECASE)
+STOCK_WORDS = re.compile(r"\b(stock|left|remaining|inventory|kitna|kitni|bacha)\b|स्टॉक|कितना|कितनी|बचा|बची",
+                         re.IGNORECASE)
+
+
+def _like_pattern(name: str) -> str:
+    escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _match_sales(user_uid: str, text: str) -> Optional[TemplateMatch]:
+    if not SALES_WORDS.search(text):
+        return None
+    period, rest = _period_slot(text)
+    if period is None or _leftover(rest, SALES_VOCAB):
+        return None
+    start, end = period_range(period)
+    noun = "revenue" if re.search(r"revenue|kamai|कमाई", text, re.IGNORECASE) else "total sales"
+    return TemplateMatch("sales_total", SALES_TOTAL_SQL, (user_uid, start, end),
+                         f"{PERIOD_LABELS[period]} {noun}", rollup_sql=ROLLUP_SALES_TOTAL_SQL)
+
+
+def _match_dues(user_uid: str, text: str) -> Optional[TemplateMatch]:
+    if not DUES_WORDS.search(text):
+        return None
+    if TOP_WORDS.search(text):
+        n, rest = _top_n_slot(text)
+        if _leftover(rest, TOP_DUES_VOCAB):
+            return None
+        return TemplateMatch("top_dues", TOP_DUES_SQL, (user_uid, n),
+                             f"Top {n} customers by pending dues")
+    if re.search(r"\b(total|kul|kitna|kitni|how much)\b|कुल|कितना", text, re.IGNORECASE) \
+            and not _leftover(text, DUES_VOCAB):
+        return TemplateMatch("total_dues", TOTAL_DUES_SQL, (user_uid,), "Total pending dues")
+    return None
+
+
+def _match_stock(user_uid: str, text: str) -> Optional[TemplateMatch]:
+    if not STOCK_WORDS.search(text):
+        return None
+    name, rest = _product_slot(text)
+    if not name or _leftover(rest, STOCK_VOCAB):
+        return None
+    return stock_template(user_uid, name)
+
+
+def stock_template(user_uid: str, name: str) -> TemplateMatch:
+    """Stock lookup for a product name; also used directly by the voice check_stock intent."""
+    return TemplateMatch("product_stock", PRODUCT_STOCK_SQL, (user_uid, _like_pattern(name)),
+                         f"Stock for products matching '{name}'", search=name)
+
+
+MATCHERS: List[Callable[[str, str], Optional[TemplateMatch]]] = [_match_dues, _match_sales, _match_stock]
+
+
+def match(user_uid: str, question: str) -> Optional[TemplateMatch]:
+    """Returns a TemplateMatch for well-known intents, or None to use text-to-SQL."""
+    text = " ".join(question.split())
+    if not text or COMPLEX_MARKERS.search(text):
+        return None
+    for matcher in MATCHERS:
+        result = matcher(user_uid, text)
+        if result:
+            logger.info(f"⚡ Template '{result.name}' matched: {question}")
+            return result
+    return None
@@ -0,0 +1,269 @@
+"""
+Rollups: Incrementally maintained per-user daily sales facts for QueryEngine.
+
+Tables (created in the Drift DB next to the app's tables, 'qe_' prefixed):
+  qe_daily_sales          (user_id, day, day_start, sales, tax, discount, paid,
+                           cash_paid, online_paid, bill_count)
+  qe_daily_payment_modes  (user_id, day, day_start, payment_mode, total, paid, bill_count)
+  qe_rollup_bill_day      bill_id -> (user_id, day_start) it was last counted in
+  qe_rollup_dirty         ids of bills changed since the last refresh
+  qe_rollup_state         bootstrap marker
+
+Tiny triggers queue the id of every inserted, updated or deleted bill in
+qe_rollup_dirty (as product_search does for products). A timestamp scanner can't
+be trusted here: bills synced in from another device keep their older client
+updated_at and would land behind its high-water mark. refresh() works out every
+(user, day) bucket the queued bills touch - including the bucket a bill moved
+*out of*, or was hard-deleted from - and recomputes just those buckets from the
+raw rows. Days are local-time days, matching the ranges query_templates computes.
+"""
+
+import logging
+import sqlite3
+import time
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger("Rollups")
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS qe_daily_sales (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,             -- 'YYYY-MM-DD' (local time)
+    day_start INTEGER NOT NULL,    -- Unix timestamp of local midnight
+    sales REAL NOT NULL DEFAULT 0,
+    tax REAL NOT NULL DEFAULT 0,
+    discount REAL NOT NULL DEFAULT 0,
+    paid REAL NOT NULL DEFAULT 0,
+    cash_paid REAL NOT NULL DEFAULT 0,
+    online_paid REAL NOT NULL DEFAULT 0,
+    bill_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day_start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS qe_daily_payment_modes (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    day_start INTEGER NOT NULL,
+    payment_mode TEXT NOT NULL,
+    total REAL NOT NULL DEFAULT 0,
+    paid REAL NOT NULL DEFAULT 0,
+    bill_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day_start, payment_mode)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS qe_rollup_bill_day (
+    bill_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    day_start INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS qe_rollup_state (
+    key TEXT PRIMARY KEY,
+    value
+);
+CREATE TABLE IF NOT EXISTS qe_rollup_dirty (
+    bill_id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS qe_bills_rollup_ai AFTER INSERT ON bills BEGIN
+    INSERT OR IGNORE INTO qe_rollup_dirty (bill_id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS qe_bills_rollup_au AFTER UPDATE OF id, user_id, bill_date, grand_total, tax_amount,
+    discount_amount, paid_amount, cash_paid, online_paid, payment_mode, deleted_at ON bills BEGIN
+    INSERT OR IGNORE INTO qe_rollup_dirty (bill_id) VALUES (old.id);
+    INSERT OR IGNORE INTO qe_rollup_dirty (bill_id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS qe_bills_rollup_ad AFTER DELETE ON bills BEGIN
+    INSERT OR IGNORE INTO qe_rollup_dirty (bill_id) VALUES (old.id);
+END;
+-- Index of the old updated_at scanner
+DROP INDEX IF EXISTS qe_bills_change;
+"""
+
+# Local-day bucket of a bill: (day text, local-midnight epoch)
+_DAY_EXPR = "date(bill_date, 'unixepoch', 'localtime')"
+_DAY_START_EXPR = "CAST(strftime('%s', bill_date, 'unixepoch', 'localtime', 'start of day', 'utc') AS INTEGER)"
+
+_RECOMPUTE_SALES = f"""
+INSERT INTO qe_daily_sales (user_id, day, day_start, sales, tax, discount, paid, cash_paid, online_paid, bill_count)
+SELECT user_id, {_DAY_EXPR}, ?, COALESCE(SUM(grand_total), 0), COALESCE(SUM(tax_amount), 0),
+       COALESCE(SUM(discount_amount), 0), COALESCE(SUM(paid_amount), 0), COALESCE(SUM(cash_paid), 0),
+       COALESCE(SUM(online_paid), 0), COUNT(*)
+FROM bills
+WHERE user_id = ? AND deleted_at IS NULL AND bill_date >= ? AND bill_date < ?
+GROUP BY user_id
+"""
+
+_RECOMPUTE_MODES = f"""
+INSERT INTO qe_daily_payment_modes (user_id, day, day_start, payment_mode, total, paid, bill_count)
+SELECT user_id, {_DAY_EXPR}, ?, COALESCE(payment_mode, 'UNKNOWN'), COALESCE(SUM(grand_total), 0),
+       COALESCE(SUM(paid_amount), 0), COUNT(*)
+FROM bills
+WHERE user_id = ? AND deleted_at IS NULL AND bill_date >= ? AND bill_date < ?
+GROUP BY user_id, COALESCE(payment_mode, 'UNKNOWN')
+"""
+
+
+class RollupMaintainer:
+    def __init__(self, db_path: str, batch_size: int = 20_000, busy_timeout_ms: int = 5000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.ready = False
+        self.last_refresh: Dict[str, float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        return conn
+
+    def ensure_schema(self) -> bool:
+        try:
+            conn = self._connect()
+            try:
+                has_bills = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bills'"
+                ).fetchone()
+                if not has_bills:
+                    logger.warning("⚠️ No bills table; rollups disabled.")
+                    return False
+                conn.executescript(ROLLUP_SCHEMA)
+                conn.commit()
+            finally:
+                conn.close()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Could not create rollup tables: {e}")
+            return False
+
+    @staticmethod
+    def _day_bounds(conn: sqlite3.Connection, day_start: int) -> int:
+        """Next local midnight (handles DST-length days)."""
+        return conn.execute(
+            "SELECT CAST(strftime('%s', ?, 'unixepoch', 'localtime', '+1 day', 'start of day', 'utc') AS INTEGER)",
+            (day_start,),
+        ).fetchone()[0]
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Applies all queued bill changes. Blocking; call off the event loop.
+        Each batch is claimed and applied in one IMMEDIATE transaction, so an app write
+        re-queueing a bill can't slip between reading the queue and clearing it.
+        Returns {"changed_bills", "buckets"}.
+        """
+        started = time.time()
+        conn = self._connect()
+        changed_bills = 0
+        buckets_done = 0
+        try:
+            bootstrapped = conn.execute("SELECT 1 FROM qe_rollup_state WHERE key = 'bootstrapped'").fetchone()
+            if not bootstrapped:
+                changed_bills = self._bootstrap(conn)
+
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                ids = [row[0] for row in conn.execute(
+                    "SELECT bill_id FROM qe_rollup_dirty LIMIT ?", (self.batch_size,)
+                )]
+                if not ids:
+                    conn.rollback()
+                    break
+
+                buckets_done += self._apply(conn, ids)
+                changed_bills += len(ids)
+                conn.executemany("DELETE FROM qe_rollup_dirty WHERE bill_id = ?", [(i,) for i in ids])
+                conn.commit()
+
+                if len(ids) < self.batch_size:
+                    break
+        finally:
+            conn.close()
+
+        self.ready = True
+        self.last_refresh = {"at": time.time(), "seconds": round(time.time() - started, 3)}
+        if changed_bills:
+            logger.info(f"📈 Rollups: {changed_bills} changed bills -> {buckets_done} day buckets "
+                        f"in {time.time() - started:.2f}s")
+        return {"changed_bills": changed_bills, "buckets": buckets_done}
+
+    def _bootstrap(self, conn: sqlite3.Connection) -> int:
+        """First run: one set-based GROUP BY over all bills instead of bucket-by-bucket."""
+        conn.execute("BEGIN IMMEDIATE")
+        for table in ("qe_daily_sales", "qe_daily_payment_modes", "qe_rollup_bill_day", "qe_rollup_dirty"):
+            conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"""
+            INSERT INTO qe_daily_sales (user_id, day, day_start, sales, tax, discount, paid, cash_paid, online_paid, bill_count)
+            SELECT user_id, {_DAY_EXPR}, {_DAY_START_EXPR}, COALESCE(SUM(grand_total), 0), COALESCE(SUM(tax_amount), 0),
+                   COALESCE(SUM(discount_amount), 0), COALESCE(SUM(paid_amount), 0), COALESCE(SUM(cash_paid), 0),
+                   COALESCE(SUM(online_paid), 0), COUNT(*)
+            FROM bills WHERE deleted_at IS NULL AND bill_date IS NOT NULL
+            GROUP BY user_id, {_DAY_START_EXPR}
+        """)
+        conn.execute(f"""
+            INSERT INTO qe_daily_payment_modes (user_id, day, day_start, payment_mode, total, paid, bill_count)
+            SELECT user_id, {_DAY_EXPR}, {_DAY_START_EXPR}, COALESCE(payment_mode, 'UNKNOWN'),
+                   COALESCE(SUM(grand_total), 0), COALESCE(SUM(paid_amount), 0), COUNT(*)
+            FROM bills WHERE deleted_at IS NULL AND bill_date IS NOT NULL
+            GROUP BY user_id, {_DAY_START_EXPR}, COALESCE(payment_mode, 'UNKNOWN')
+        """)
+        cur = conn.execute(f"""
+            INSERT INTO qe_rollup_bill_day (bill_id, user_id, day_start)
+            SELECT id, user_id, {_DAY_START_EXPR} FROM bills WHERE bill_date IS NOT NULL
+        """)
+        # Scanner high-water marks of earlier versions
+        conn.execute("DELETE FROM qe_rollup_state WHERE key IN ('bills_hw_ts', 'bills_hw_id')")
+        conn.execute(
+            "INSERT INTO qe_rollup_state (key, value) VALUES ('bootstrapped', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (int(time.time()),),
+        )
+        conn.commit()
+        return cur.rowcount
+
+    def _apply(self, conn: sqlite3.Connection, ids) -> int:
+        buckets: Set[Tuple[str, int]] = set()
+        current = []
+
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" for _ in chunk)
+            # Buckets the bills were previously counted in (bill_date or user may have changed)
+            for user_id, day_start in conn.execute(
+                f"SELECT user_id, day_start FROM qe_rollup_bill_day WHERE bill_id IN ({marks})", chunk
+            ):
+                buckets.add((user_id, day_start))
+            # ... and the ones they are in now (hard-deleted bills are simply absent)
+            current.extend(conn.execute(
+                f"SELECT id, user_id, {_DAY_START_EXPR} FROM bills WHERE id IN ({marks}) AND bill_date IS NOT NULL",
+                chunk,
+            ).fetchall())
+
+        for bill_id, user_id, day_start in current:
+            buckets.add((user_id, day_start))
+
+        conn.executemany("DELETE FROM qe_rollup_bill_day WHERE bill_id = ?", [(i,) for i in ids])
+        conn.executemany("INSERT INTO qe_rollup_bill_day (bill_id, user_id, day_start) VALUES (?, ?, ?)", current)
+
+        for user_id, day_start in buckets:
+            day_end = self._day_bounds(conn, day_start)
+            conn.execute("DELETE FROM qe_daily_sales WHERE user_id = ? AND day_start = ?", (user_id, day_start))
+            conn.execute("DELETE FROM qe_daily_payment_modes WHERE user_id = ? AND day_start = ?", (user_id, day_start))
+            conn.execute(_RECOMPUTE_SALES, (day_start, user_id, day_start, day_end))
+            conn.execute(_RECOMPUTE_MODES, (day_start, user_id, day_start, day_end))
+        return len(buckets)
+
+    def rebuild(self) -> Dict[str, int]:
+        """Drops all rollup state and recomputes from scratch."""
+        conn = self._connect()
+        try:
+            for table in ("qe_daily_sales", "qe_daily_payment_modes", "qe_rollup_bill_day", "qe_rollup_dirty",
+                          "qe_rollup_state"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.commit()
+        finally:
+            conn.close()
+        return self.refresh()
+
+
+def rollup_for(db_path: Optional[str]) -> Optional[RollupMaintainer]:
+    """RollupMaintainer with its schema in place, or None if the DB can't host rollups."""
+    if not db_path:
+        return None
+    maintainer = RollupMaintainer(db_path)
+    return maintainer if maintainer.ensure_schema() else None
@@ -66,6 +66,8 @@ CREATE TABLE customers (
 );
 CREATE INDEX idx_customers_biz ON customers(business_id);
 CREATE INDEX idx_customers_updated ON customers(updated_at);
+-- Pull pages walk (updated_at, id) per business (keyset pagination)
+CREATE INDEX idx_customers_sync_cursor ON customers(business_id, updated_at, id);
 
 -- 5. Products / Inventory
 CREATE TABLE products (
@@ -83,6 +85,7 @@ CREATE TABLE products (
     is_deleted BOOLEAN DEFAULT FALSE
 );
 CREATE INDEX idx_products_biz ON products(business_id);
+CREATE INDEX idx_products_sync_cursor ON products(business_id, updated_at, id);
 
 -- 6. Bills / Invoices
 CREATE TABLE bills (
@@ -94,6 +97,9 @@ CREATE TABLE bills (
     bill_date TIMESTAMP WITH TIME ZONE NOT NULL,
     total_amount DECIMAL(15, 2) NOT NULL,
     status VARCHAR(20) DEFAULT 'PAID',
+    -- Content hashes of the last pushed header and item set; pushes matching them are skipped
+    header_hash VARCHAR(32),
+    items_hash VARCHAR(32),
     
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
@@ -101,6 +107,9 @@ CREATE TABLE bills (
 );
 CREATE INDEX idx_bills_biz ON bills(business_id);
 CREATE INDEX idx_bills_updated ON bills(updated_at);
+CREATE INDEX idx_bills_sync_cursor ON bills(business_id, updated_at, id);
+-- Existing databases: ALTER TABLE bills ADD COLUMN header_hash VARCHAR(32), ADD COLUMN items_hash VARCHAR(32);
+-- (NULL hashes never match, so each bill's first push afterwards takes the full path)
 
 -- 7. Bill Items
 CREATE TABLE bill_items (
@@ -118,13 +127,95 @@ CREATE TABLE bill_items (
     is_deleted BOOLEAN DEFAULT FALSE
 );
 CREATE INDEX idx_bill_items_biz ON bill_items(business_id);
+CREATE INDEX idx_bill_items_bill ON bill_items(bill_id);
+CREATE INDEX idx_bill_items_sync_cursor ON bill_items(business_id, updated_at, id);
+
+-- 8. Sync Change Log
+-- Every accepted write gets the next per-business seq; pulls ask for "everything after seq N".
+-- The counter row is locked for the length of a push, so seqs become visible in order.
+CREATE TABLE sync_sequences (
+    business_id UUID PRIMARY KEY REFERENCES businesses(business_id),
+    last_seq BIGINT NOT NULL DEFAULT 0
+);
+
+-- Compacted: one row per record, holding its latest seq
+CREATE TABLE sync_changes (
+    business_id UUID NOT NULL REFERENCES businesses(business_id),
+    seq BIGINT NOT NULL,
+    entity VARCHAR(20) NOT NULL, -- customers, products, bills, bill_items
+    entity_id UUID NOT NULL,
+    PRIMARY KEY (business_id, seq),
+    CONSTRAINT uq_sync_changes_entity UNIQUE (entity, entity_id)
+);
+
+-- Backfill for databases that predate the change log (run once, before clients switch to after_seq):
+-- INSERT INTO sync_changes (business_id, seq, entity, entity_id)
+-- SELECT business_id, ROW_NUMBER() OVER (PARTITION BY business_id ORDER BY updated_at, entity, id), entity, id
+-- FROM (
+--     SELECT business_id, updated_at, 'customers' AS entity, id FROM customers
+--     UNION ALL SELECT business_id, updated_at, 'products', id FROM products
+--     UNION ALL SELECT business_id, updated_at, 'bills', id FROM bills
+--     UNION ALL SELECT business_id, updated_at, 'bill_items', id FROM bill_items
+-- ) AS existing;
+-- INSERT INTO sync_sequences (business_id, last_seq)
+-- SELECT business_id, MAX(seq) FROM sync_changes GROUP BY business_id;
+
+-- 9. Streaming Push Progress
+-- Lines of a streamed upload committed so far; updated in the same transaction as each batch
+CREATE TABLE sync_uploads (
+    upload_id UUID PRIMARY KEY, -- chosen by the client
+    business_id UUID NOT NULL REFERENCES businesses(business_id),
+    committed_lines BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
 
 -- ROW LEVEL SECURITY (RLS) POLICIES
--- Example for Customers table
+-- Tenant tables only show rows of the business in app.current_business_id (set per
+-- transaction by the /query engine). FORCE applies the policies to the table owner too;
+-- the API service, which connects as the owner and scopes writes by business_id itself,
+-- gets an explicit pass-through policy.
 
 ALTER TABLE customers ENABLE ROW LEVEL SECURITY;
-
+ALTER TABLE customers FORCE ROW LEVEL SECURITY;
 CREATE POLICY tenant_isolation_policy ON customers
-    USING (business_id = current_setting('app.current_business_id')::UUID);
+    USING (business_id = current_setting('app.current_business_id', true)::UUID);
+CREATE POLICY service_access_policy ON customers TO CURRENT_USER USING (true) WITH CHECK (true);
+
+ALTER TABLE products ENABLE ROW LEVEL SECURITY;
+ALTER TABLE products FORCE ROW LEVEL SECURITY;
+CREATE POLICY tenant_isolation_policy ON products
+    USING (business_id = current_setting('app.current_business_id', true)::UUID);
+CREATE POLICY service_access_policy ON products TO CURRENT_USER USING (true) WITH CHECK (true);
+
+ALTER TABLE bills ENABLE ROW LEVEL SECURITY;
+ALTER TABLE bills FORCE ROW LEVEL SECURITY;
+CREATE POLICY tenant_isolation_policy ON bills
+    USING (business_id = current_setting('app.current_business_id', true)::UUID);
+CREATE POLICY service_access_policy ON bills TO CURRENT_USER USING (true) WITH CHECK (true);
+
+ALTER TABLE bill_items ENABLE ROW LEVEL SECURITY;
+ALTER TABLE bill_items FORCE ROW LEVEL SECURITY;
+CREATE POLICY tenant_isolation_policy ON bill_items
+    USING (business_id = current_setting('app.current_business_id', true)::UUID);
+CREATE POLICY service_access_policy ON bill_items TO CURRENT_USER USING (true) WITH CHECK (true);
+
+-- Query engine role (QUERY_PG_DSN): not the owner, so the tenant policies bind it.
+-- Reads the tenant tables only; businesses / business_users have no RLS, so it gets no
+-- grant on them and resolve_business goes through query_accessible_businesses instead.
+CREATE ROLE dukanx_query LOGIN NOSUPERUSER NOBYPASSRLS;
+-- ALTER ROLE dukanx_query PASSWORD '...';
+GRANT SELECT ON customers, products, bills, bill_items TO dukanx_query;
 
--- Similar policies should be applied to all business-scoped tables.
+-- Live businesses a user owns or is staff on (runs as the owner)
+CREATE OR REPLACE FUNCTION query_accessible_businesses(p_user_id TEXT)
+RETURNS TABLE (business_id UUID, owned BOOLEAN)
+LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public AS $$
+    SELECT b.business_id, b.owner_id::text = p_user_id
+    FROM businesses b
+    WHERE b.is_deleted IS NOT TRUE
+      AND (b.owner_id::text = p_user_id
+           OR EXISTS (SELECT 1 FROM business_users bu
+                      WHERE bu.business_id = b.business_id AND bu.user_id::text = p_user_id));
+$$;
+REVOKE ALL ON FUNCTION query_accessible_businesses(TEXT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION query_accessible_businesses(TEXT) TO dukanx_query;
@@ -1,7 +1,14 @@
 import google.generativeai as genai
 from config import settings
+import asyncio
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterable, Optional
+
+from services.image_preprocess import phash, preprocess_image
+from services.product_image_cache import product_image_cache
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
@@ -13,31 +20,49 @@ if settings.GEMINI_API_KEY:
 else:
     logger.warning("GEMINI_API_KEY not found. AI features will be disabled.")
 
+PRODUCT_IMAGE_PROMPT = """
+            Analyze this product image.
+            Identify the Item Name, Category, and if visible, the Brand and Size/Weight.
+
+            OUTPUT JSON FORMAT:
+            {
+                "name": "Concise Product Name (e.g. Maggi Noodles)",
+                "category": "Suggested Category (e.g. Snacks, Groceries)",
+                "brand": "Brand Name or null",
+                "size": "Size with unit or null (e.g. 70g)",
+                "description": "Short visual description"
+            }
+            """
+
+@dataclass
+class InsightRequest:
+    """One business in a batch insight run."""
+    business_id: str
+    stats: dict
+    stock_summary: list = field(default_factory=list)
+    kind: str = "daily"  # "daily" -> generate_daily_insight, "dashboard" -> generate_dashboard_insight
+
 class GeminiService:
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None):
         self.model = genai.GenerativeModel(settings.AI_MODEL)
-    
-    def generate_daily_insight(self, stats: dict, stock_summary: list) -> dict:
-        """
-        Orchestrates the AI generation process:
-        1. Context Preparation
-        2. Prompt Engineering
-        3. Gemini Call
-        4. Cleaning & Parsing
-        """
-        if not settings.GEMINI_API_KEY:
-             return self._fallback_response("AI Key Missing")
+        self.max_concurrency = max_concurrency or settings.AI_MAX_CONCURRENCY
+        # Global limit on in-flight Gemini calls (async paths). Created lazily so it
+        # binds to the running event loop, not the import-time one.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Fallback pool when the SDK has no native async method
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="gemini")
 
-        try:
-            # 1. Prepare Context
-            context_str = json.dumps({
-                "sales_data": stats,
-                "low_stock_alerts": stock_summary
-            }, indent=2)
-
-            # 2. System Prompt
-            prompt = f"""
-            You are 'DukanX AI', a smart business assistant for a shop owner. 
+    # --- PROMPTS & PARSING (shared by sync and async paths) ---
+    def _daily_insight_prompt(self, stats: dict, stock_summary: list) -> str:
+        # 1. Prepare Context
+        context_str = json.dumps({
+            "sales_data": stats,
+            "low_stock_alerts": stock_summary
+        }, indent=2)
+
+        # 2. System Prompt
+        return f"""
+            You are 'DukanX AI', a smart business assistant for a shop owner.
             Analyze the following JSON data representing today's business.
 
             DATA:
@@ -45,7 +70,7 @@ class GeminiService:
 
             TASK:
             Provide a daily business summary.
-            
+
             RULES:
             1. Output MUST be valid JSON.
             2. Do NOT hallucinate data not present in the input.
@@ -59,6 +84,63 @@ class GeminiService:
             }}
             """
 
+    def _dashboard_insight_prompt(self, context_data: dict) -> str:
+        return f"""
+            You are 'DukanX AI'.
+            Analyze this daily business snapshot and provide a 3-sentence summary for the shop owner.
+            Use simple English. Focus on what matters: Sales, Stock, and Profit.
+
+            DATA:
+            {json.dumps(context_data, indent=2)}
+
+            OUTPUT FORMAT:
+            Just the plain text paragraph. No JSON.
+            Example:
+            "Tea Powder sold the most today. Sugar stock is low and should be reordered. Cooking Oil sales are slow and causing minor loss."
+            """
+
+    @staticmethod
+    def _extract_json(raw_text: str) -> dict:
+        # Basic cleanup if markdown backticks exist
+        if "```json" in raw_text:
+            raw_text = raw_text.split("```json")[1].split("```")[0]
+        elif "```" in raw_text:
+            raw_text = raw_text.split("```")[1].split("```")[0]
+        return json.loads(raw_text.strip())
+
+    @classmethod
+    def _parse_daily_insight(cls, raw_text: str) -> dict:
+        data = cls._extract_json(raw_text)
+        # Simple Schema Validation (Optional but recommended)
+        return {
+            "summary": data.get("summary", "No summary available."),
+            "highlights": data.get("highlights", []),
+            "suggestions": data.get("suggestions", [])
+        }
+
+    @staticmethod
+    def _image_failure() -> dict:
+        return {
+            "name": "",
+            "category": "Uncategorized",
+            "error": "Could not analyze image. Please enter manually."
+        }
+
+    # --- SYNC API ---
+    def generate_daily_insight(self, stats: dict, stock_summary: list) -> dict:
+        """
+        Orchestrates the AI generation process:
+        1. Context Preparation
+        2. Prompt Engineering
+        3. Gemini Call
+        4. Cleaning & Parsing
+        """
+        if not settings.GEMINI_API_KEY:
+             return self._fallback_response("AI Key Missing")
+
+        try:
+            prompt = self._daily_insight_prompt(stats, stock_summary)
+
             # 3. Call Gemini
             # Using generation_config to enforce JSON if supported, or just prompting.
             # Gemini 1.5 often respects "Output JSON" instructions well.
@@ -71,21 +153,7 @@ class GeminiService:
             )
 
             # 4. Parse Response
-            raw_text = response.text
-            # Basic cleanup if markdown backticks exist
-            if "```json" in raw_text:
-                raw_text = raw_text.split("```json")[1].split("```")[0]
-            elif "```" in raw_text:
-                raw_text = raw_text.split("```")[1].split("```")[0]
-
-            data = json.loads(raw_text.strip())
-            
-            # Simple Schema Validation (Optional but recommended)
-            return {
-                "summary": data.get("summary", "No summary available."),
-                "highlights": data.get("highlights", []),
-                "suggestions": data.get("suggestions", [])
-            }
+            return self._parse_daily_insight(response.text)
 
         except Exception as e:
             logger.error(f"Gemini Error: {e}")
@@ -98,7 +166,6 @@ class GeminiService:
             "suggestions": [f"Error: {reason}"]
         }
 
-# Singleton
     def generate_dashboard_insight(self, context_data: dict) -> str:
         """
         Generates a concise, 3-sentence simple language explanation for the dashboard.
@@ -107,21 +174,7 @@ class GeminiService:
              return "AI Insights are unavailable. Please check your internet or API Key."
 
         try:
-            prompt = f"""
-            You are 'DukanX AI'.
-            Analyze this daily business snapshot and provide a 3-sentence summary for the shop owner.
-            Use simple English. Focus on what matters: Sales, Stock, and Profit.
-            
-            DATA:
-            {json.dumps(context_data, indent=2)}
-
-            OUTPUT FORMAT:
-            Just the plain text paragraph. No JSON.
-            Example:
-            "Tea Powder sold the most today. Sugar stock is low and should be reordered. Cooking Oil sales are slow and causing minor loss."
-            """
-
-            response = self.model.generate_content(prompt)
+            response = self.model.generate_content(self._dashboard_insight_prompt(context_data))
             return response.text.replace("```", "").strip()
 
         except Exception as e:
@@ -129,54 +182,148 @@ class GeminiService:
             return "Could not generate insight at this moment."
 
 
-    def analyze_product_image(self, image_bytes: bytes) -> dict:
+    def analyze_product_image(self, image_bytes: bytes, owner_uid: Optional[str] = None) -> dict:
         """
         Analyzes an image to identify the product details (Name, Category).
         Returns a dictionary with suggestions.
+        With owner_uid, near-duplicates of that owner's earlier photos are served
+        from the perceptual-hash cache without calling the model.
         """
         if not settings.GEMINI_API_KEY:
              return self._fallback_response("AI Key Missing")
 
         try:
-            import PIL.Image
-            import io
-            
-            image = PIL.Image.open(io.BytesIO(image_bytes))
-            
-            prompt = """
-            Analyze this product image.
-            Identify the Item Name, Category, and if visible, the Brand and Size/Weight.
-            
-            OUTPUT JSON FORMAT:
-            {
-                "name": "Concise Product Name (e.g. Maggi Noodles)",
-                "category": "Suggested Category (e.g. Snacks, Groceries)",
-                "brand": "Brand Name or null",
-                "size": "Size with unit or null (e.g. 70g)",
-                "description": "Short visual description"
-            }
-            """
-            
+            # Downsize / crop / recompress before anything else
+            image, _ = preprocess_image(image_bytes)
+
+            image_hash = phash(image) if owner_uid else None
+            if owner_uid:
+                cached = product_image_cache.lookup(owner_uid, image_hash)
+                if cached:
+                    return cached
+
             # Gemini Vision Request
             # Note: gemini-1.5-flash supports images.
-            response = self.model.generate_content([prompt, image])
-            
-            raw_text = response.text
-             # Basic cleanup
-            if "```json" in raw_text:
-                raw_text = raw_text.split("```json")[1].split("```")[0]
-            elif "```" in raw_text:
-                 raw_text = raw_text.split("```")[1].split("```")[0]
-                 
-            return json.loads(raw_text.strip())
+            response = self.model.generate_content([PRODUCT_IMAGE_PROMPT, image])
+            result = self._extract_json(response.text)
+
+            if owner_uid:
+                product_image_cache.store(owner_uid, image_hash, result)
+            return result
 
         except Exception as e:
             logger.error(f"Gemini Vision Error: {e}")
-            return {
-                "name": "", 
-                "category": "Uncategorized", 
-                "error": "Could not analyze image. Please enter manually."
-            }
+            return self._image_failure()
+
+    # --- ASYNC API (safe to await from FastAPI routes) ---
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _generate_async(self, contents, **kwargs):
+        """
+        Single choke point for async Gemini calls.
+        Uses the SDK's native generate_content_async when available, otherwise
+        runs the blocking call on the service thread pool. Never blocks the loop.
+        """
+        async with self._get_semaphore():
+            native = getattr(self.model, "generate_content_async", None)
+            if native is not None:
+                return await native(contents, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, lambda: self.model.generate_content(contents, **kwargs)
+            )
+
+    async def generate_daily_insight_async(self, stats: dict, stock_summary: list) -> dict:
+        """Async variant of generate_daily_insight."""
+        if not settings.GEMINI_API_KEY:
+             return self._fallback_response("AI Key Missing")
+
+        try:
+            response = await self._generate_async(
+                self._daily_insight_prompt(stats, stock_summary),
+                generation_config=genai.types.GenerationConfig(temperature=0.4)
+            )
+            return self._parse_daily_insight(response.text)
+
+        except Exception as e:
+            logger.error(f"Gemini Error: {e}")
+            return self._fallback_response(str(e))
+
+    async def generate_dashboard_insight_async(self, context_data: dict) -> str:
+        """Async variant of generate_dashboard_insight."""
+        if not settings.GEMINI_API_KEY:
+             return "AI Insights are unavailable. Please check your internet or API Key."
+
+        try:
+            response = await self._generate_async(self._dashboard_insight_prompt(context_data))
+            return response.text.replace("```", "").strip()
+
+        except Exception as e:
+            logger.error(f"Gemini Insight Error: {e}")
+            return "Could not generate insight at this moment."
+
+    async def analyze_product_image_async(self, image_bytes: bytes, owner_uid: Optional[str] = None) -> dict:
+        """Async variant of analyze_product_image. Preprocessing and hashing also run off-loop."""
+        if not settings.GEMINI_API_KEY:
+             return self._fallback_response("AI Key Missing")
+
+        try:
+            loop = asyncio.get_running_loop()
+
+            def prepare():
+                image, _ = preprocess_image(image_bytes)
+                image_hash = phash(image) if owner_uid else None
+                cached = product_image_cache.lookup(owner_uid, image_hash) if owner_uid else None
+                return image, image_hash, cached
+
+            image, image_hash, cached = await loop.run_in_executor(self._executor, prepare)
+            if cached:
+                return cached
+
+            response = await self._generate_async([PRODUCT_IMAGE_PROMPT, image])
+            result = self._extract_json(response.text)
+
+            if owner_uid:
+                await loop.run_in_executor(
+                    self._executor, lambda: product_image_cache.store(owner_uid, image_hash, result)
+                )
+            return result
+
+        except Exception as e:
+            logger.error(f"Gemini Vision Error: {e}")
+            return self._image_failure()
+
+    async def generate_insights_batch(
+        self, requests: Iterable[InsightRequest], max_parallel: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Runs insight generation for many businesses with bounded parallelism.
+        Yields {"business_id", "kind", "insight"} in completion order, so callers
+        can persist or stream each result as soon as it is ready.
+        The global concurrency limit still applies on top of max_parallel.
+        """
+        batch_limit = asyncio.Semaphore(max_parallel or settings.AI_BATCH_PARALLELISM)
+
+        async def run_one(req: InsightRequest) -> dict:
+            async with batch_limit:
+                if req.kind == "dashboard":
+                    insight = await self.generate_dashboard_insight_async(req.stats)
+                else:
+                    insight = await self.generate_daily_insight_async(req.stats, req.stock_summary)
+            return {"business_id": req.business_id, "kind": req.kind, "insight": insight}
+
+        tasks = [asyncio.ensure_future(run_one(r)) for r in requests]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consumer stopped early (or was cancelled): don't leave calls running
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
 
 # Singleton
 ai_service = GeminiService()
@@ -0,0 +1,124 @@
+"""
+Image preprocessing for product recognition.
+Phone uploads are 3-12 MP; the model needs far less. Before a Gemini call we:
+1. Fix EXIF orientation
+2. Crop to the object (trim uniform background around it)
+3. Downscale to a pixel budget
+4. Recompress as JPEG
+Also provides a DCT perceptual hash (pHash) used to spot re-photographed SKUs.
+"""
+
+import io
+import logging
+import math
+from typing import Tuple
+
+import numpy as np
+from PIL import Image, ImageChops, ImageOps
+
+from config import settings
+
+logger = logging.getLogger("ImagePreprocess")
+
+# Background trimming: pixels closer than this (0-255) to the border colour count as background
+BG_TOLERANCE = 28
+# Keep a margin around the detected object so labels at the edge are not cut
+CROP_MARGIN = 0.04
+# Ignore crops that would remove almost nothing or leave a tiny sliver
+MIN_CROP_GAIN = 0.10
+MIN_OBJECT_FRACTION = 0.05
+
+
+def crop_to_object(image: Image.Image) -> Image.Image:
+    """Trim the uniform background around the product (estimated from the corners)."""
+    rgb = image.convert("RGB")
+    w, h = rgb.size
+    corners = [rgb.getpixel(p) for p in ((0, 0), (w - 1, 0), (0, h - 1), (w - 1, h - 1))]
+    bg_colour = tuple(sorted(c[i] for c in corners)[1] for i in range(3))  # robust to one odd corner
+
+    diff = ImageChops.difference(rgb, Image.new("RGB", rgb.size, bg_colour)).convert("L")
+    mask = diff.point(lambda v: 255 if v > BG_TOLERANCE else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return image
+
+    left, top, right, bottom = bbox
+    box_area = (right - left) * (bottom - top)
+    if box_area < MIN_OBJECT_FRACTION * w * h or box_area > (1 - MIN_CROP_GAIN) * w * h:
+        return image
+
+    mx, my = int(w * CROP_MARGIN), int(h * CROP_MARGIN)
+    return image.crop((max(0, left - mx), max(0, top - my), min(w, right + mx), min(h, bottom + my)))
+
+
+def fit_pixel_budget(image: Image.Image, max_pixels: int) -> Image.Image:
+    w, h = image.size
+    if w * h <= max_pixels:
+        return image
+    scale = math.sqrt(max_pixels / float(w * h))
+    return image.resize((max(1, int(w * scale)), max(1, int(h * scale))), Image.LANCZOS)
+
+
+def preprocess_image(
+    image_bytes: bytes,
+    max_pixels: int = None,
+    jpeg_quality: int = None,
+) -> Tuple[Image.Image, bytes]:
+    """
+    Returns (processed PIL image, recompressed JPEG bytes).
+    The PIL image is what gets sent to the model; the bytes are for logging/storage.
+    """
+    max_pixels = max_pixels or settings.AI_IMAGE_MAX_PIXELS
+    jpeg_quality = jpeg_quality or settings.AI_IMAGE_JPEG_QUALITY
+
+    image = Image.open(io.BytesIO(image_bytes))
+    # Large JPEGs decode much faster at reduced scale; draft() only ever picks >= requested size
+    if image.format == "JPEG":
+        side = int(math.sqrt(max_pixels)) * 2
+        image.draft("RGB", (side, side))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    original_size = image.size
+
+    image = crop_to_object(image)
+    image = fit_pixel_budget(image, max_pixels)
+
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=jpeg_quality, optimize=True)
+    out = buf.getvalue()
+    logger.debug(
+        f"🖼️ {original_size} -> {image.size}, {len(image_bytes) // 1024}KB -> {len(out) // 1024}KB"
+    )
+    return Image.open(io.BytesIO(out)), out
+
+
+# --- PERCEPTUAL HASH ---
+_DCT_SIZE = 32
+_HASH_SIZE = 8
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    m[0, :] *= 1 / math.sqrt(2)
+    return m * math.sqrt(2 / n)
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def phash(image: Image.Image) -> int:
+    """64-bit DCT perceptual hash. Robust to resize, recompression and small lighting shifts."""
+    gray = image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.float64)
+    dct = _DCT @ pixels @ _DCT.T
+    low = dct[:_HASH_SIZE, :_HASH_SIZE].flatten()
+    median = np.median(low[1:])  # skip DC term, it only encodes overall brightness
+    bits = low > median
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
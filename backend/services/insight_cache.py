@@ -0,0 +1,182 @@
+"""
+InsightCache: Precomputed daily/dashboard insights with stale-while-revalidate reads.
+
+Building an insight means Firestore reads (bills + stock), stats aggregation and a
+Gemini call - several seconds per owner. Instead:
+- A scheduled job precomputes insights for all active owners (bounded concurrency).
+- Results are stored at owners/{uid}/insights/{kind} with a schema version and timestamp.
+- Reads return the cached insight immediately; if it is older than the TTL a single
+  background refresh is started for that owner/kind.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from core.database import db
+from services.ai_service import ai_service
+from tools.calculators import calculate_period_stats
+from tools.data_fetchers import fetch_all_stock, iter_sales_chunks
+
+logger = logging.getLogger("InsightCache")
+
+# Bump when prompt/output shape changes: older stored insights are treated as missing
+INSIGHT_VERSION = 1
+INSIGHT_KINDS = ("daily", "dashboard")
+
+
+class InsightCache:
+    def __init__(
+        self,
+        ttl_s: Optional[float] = None,
+        max_parallel: Optional[int] = None,
+    ):
+        self.ttl_s = ttl_s or float(os.getenv("INSIGHT_TTL_S", 30 * 60))
+        self.max_parallel = max_parallel or int(os.getenv("INSIGHT_PRECOMPUTE_PARALLELISM", 4))
+        # L1: { (owner_uid, kind): {"version", "generated_at", "insight"} }
+        self._memory: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # In-flight refreshes, so N dashboard opens trigger one rebuild
+        self._refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    # --- STORAGE ---
+    def _doc(self, owner_uid: str, kind: str):
+        return db.collection('owners').document(owner_uid).collection('insights').document(kind)
+
+    def _load(self, owner_uid: str, kind: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get((owner_uid, kind))
+        if entry is None and db is not None:
+            snap = self._doc(owner_uid, kind).get()
+            if snap.exists:
+                entry = snap.to_dict()
+                self._memory[(owner_uid, kind)] = entry
+        if entry and entry.get("version") != INSIGHT_VERSION:
+            return None
+        return entry
+
+    def _save(self, owner_uid: str, kind: str, insight: Any) -> Dict[str, Any]:
+        entry = {"version": INSIGHT_VERSION, "generated_at": time.time(), "insight": insight}
+        self._memory[(owner_uid, kind)] = entry
+        if db is not None:
+            self._doc(owner_uid, kind).set(entry)
+        return entry
+
+    # --- BUILD ---
+    @staticmethod
+    def _build_context(owner_uid: str) -> Dict[str, Any]:
+        """Blocking Firestore reads + aggregation. Always run off the event loop."""
+        stats = calculate_period_stats(iter_sales_chunks(owner_uid, days=1))
+        stock = fetch_all_stock(owner_uid)
+        low_stock = [s for s in stock if s["quantity"] <= s["lowStockThreshold"]]
+        return {"stats": stats, "low_stock": low_stock, "stock_item_count": len(stock)}
+
+    async def _build(self, owner_uid: str, kinds: Iterable[str] = INSIGHT_KINDS) -> Dict[str, Dict[str, Any]]:
+        context = await asyncio.to_thread(self._build_context, owner_uid)
+        entries = {}
+        for kind in kinds:
+            if kind == "dashboard":
+                insight = await ai_service.generate_dashboard_insight_async({
+                    "sales": context["stats"],
+                    "low_stock": context["low_stock"],
+                    "stock_item_count": context["stock_item_count"],
+                })
+            else:
+                insight = await ai_service.generate_daily_insight_async(context["stats"], context["low_stock"])
+            entries[kind] = await asyncio.to_thread(self._save, owner_uid, kind, insight)
+        return entries
+
+    # --- READ PATH (stale-while-revalidate) ---
+    def _is_stale(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("generated_at", 0) > self.ttl_s
+
+    def _schedule_refresh(self, owner_uid: str, kind: str):
+        key = (owner_uid, kind)
+        task = self._refreshing.get(key)
+        if task is not None and not task.done():
+            return
+
+        async def refresh():
+            try:
+                await self._build(owner_uid, kinds=(kind,))
+            except Exception as e:
+                logger.error(f"Insight refresh failed for {owner_uid}/{kind}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def get_insight(self, owner_uid: str, kind: str = "daily") -> Dict[str, Any]:
+        """
+        Returns {"insight", "generated_at", "version", "stale"}.
+        Cached -> returned immediately (refresh kicked off in background if stale).
+        Missing -> built inline once (cold start for a new owner).
+        """
+        if kind not in INSIGHT_KINDS:
+            raise ValueError(f"Unknown insight kind '{kind}'")
+
+        entry = await asyncio.to_thread(self._load, owner_uid, kind)
+        if entry is None:
+            entry = (await self._build(owner_uid, kinds=(kind,)))[kind]
+            return {**entry, "stale": False}
+
+        stale = self._is_stale(entry)
+        if stale:
+            self._schedule_refresh(owner_uid, kind)
+        return {**entry, "stale": stale}
+
+    # --- PRECOMPUTE JOB ---
+    @staticmethod
+    def list_active_owners() -> List[str]:
+        """Owner uids with an owners/{uid} document that is not explicitly deactivated."""
+        owners = []
+        for doc in db.collection('owners').stream():
+            if (doc.to_dict() or {}).get("isActive", True):
+                owners.append(doc.id)
+        return owners
+
+    async def precompute_all(self, owner_uids: Optional[List[str]] = None) -> Dict[str, int]:
+        """Rebuilds insights for every active owner with bounded concurrency."""
+        if owner_uids is None:
+            owner_uids = await asyncio.to_thread(self.list_active_owners)
+
+        limit = asyncio.Semaphore(self.max_parallel)
+        started = time.time()
+        ok = failed = 0
+
+        async def run_one(uid: str) -> bool:
+            async with limit:
+                try:
+                    await self._build(uid)
+                    return True
+                except Exception as e:
+                    logger.error(f"Precompute failed for {uid}: {e}")
+                    return False
+
+        for done in asyncio.as_completed([run_one(uid) for uid in owner_uids]):
+            if await done:
+                ok += 1
+            else:
+                failed += 1
+
+        logger.info(f"🧠 Precomputed insights for {ok} owners ({failed} failed) in {time.time() - started:.1f}s")
+        return {"owners": len(owner_uids), "ok": ok, "failed": failed}
+
+    async def run_scheduler(self, interval_s: float):
+        """Long-running loop: precompute every interval_s seconds."""
+        while True:
+            try:
+                await self.precompute_all()
+            except Exception as e:
+                logger.error(f"Insight precompute run failed: {e}")
+            await asyncio.sleep(interval_s)
+
+
+# Singleton
+insight_cache = InsightCache()
+
+
+if __name__ == "__main__":
+    # One-shot run for cron: python -m services.insight_cache
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(insight_cache.precompute_all())
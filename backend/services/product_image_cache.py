@@ -0,0 +1,117 @@
+"""
+ProductImageCache: Per-owner perceptual-hash index of past product recognitions.
+Shops re-photograph the same SKUs constantly; a near-duplicate image (small
+Hamming distance between pHashes) returns the earlier suggestion without a model call.
+Persisted at owners/{uid}/image_hashes/{hash_hex}; hot owners are kept in memory.
+Called from GeminiService's worker threads, so the in-memory LRUs sit behind a lock
+(Firestore reads and writes happen outside it).
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import settings
+from core.database import db
+from services.image_preprocess import hamming
+
+logger = logging.getLogger("ProductImageCache")
+
+
+class ProductImageCache:
+    def __init__(self, max_distance: Optional[int] = None, max_entries_per_owner: int = 2000,
+                 max_owners_in_memory: int = 500):
+        self.max_distance = settings.AI_IMAGE_HASH_MAX_DISTANCE if max_distance is None else max_distance
+        self.max_entries_per_owner = max_entries_per_owner
+        self.max_owners_in_memory = max_owners_in_memory
+        # { owner_uid: OrderedDict[hash_int -> {"result", "created_at"}] } - LRU at both levels
+        self._owners: "OrderedDict[str, OrderedDict[int, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _collection(self, owner_uid: str):
+        return db.collection('owners').document(owner_uid).collection('image_hashes')
+
+    def _index(self, owner_uid: str) -> "OrderedDict[int, Dict[str, Any]]":
+        """The owner's index, loaded on first use. Only touch it with self._lock held."""
+        with self._lock:
+            index = self._owners.get(owner_uid)
+            if index is not None:
+                self._owners.move_to_end(owner_uid)
+                return index
+
+        index = OrderedDict()
+        if db is not None:
+            try:
+                docs = self._collection(owner_uid).order_by('created_at').limit_to_last(self.max_entries_per_owner).get()
+                for doc in docs:
+                    d = doc.to_dict()
+                    index[int(doc.id, 16)] = {"result": d.get("result"), "created_at": d.get("created_at")}
+            except Exception as e:
+                logger.warning(f"Could not load image hashes for {owner_uid}: {e}")
+
+        with self._lock:
+            # Another thread may have loaded it meanwhile
+            index = self._owners.setdefault(owner_uid, index)
+            self._owners.move_to_end(owner_uid)
+            while len(self._owners) > self.max_owners_in_memory:
+                self._owners.popitem(last=False)
+            return index
+
+    def lookup(self, owner_uid: str, image_hash: int) -> Optional[Dict[str, Any]]:
+        """Closest stored result within max_distance bits, or None."""
+        index = self._index(owner_uid)
+        with self._lock:
+            best_hash, best_distance = None, self.max_distance + 1
+            for stored in index:
+                distance = hamming(stored, image_hash)
+                if distance < best_distance:
+                    best_hash, best_distance = stored, distance
+                    if distance == 0:
+                        break
+
+            if best_hash is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            index.move_to_end(best_hash)
+            result = {**index[best_hash]["result"], "cached": True, "hash_distance": best_distance}
+        logger.info(f"🖼️ Image cache hit for {owner_uid} (distance {best_distance})")
+        return result
+
+    def store(self, owner_uid: str, image_hash: int, result: Dict[str, Any]):
+        # Never cache failures - the next attempt should reach the model
+        if not result or result.get("error") or not result.get("name"):
+            return
+        index = self._index(owner_uid)
+        entry = {"result": result, "created_at": time.time()}
+        with self._lock:
+            index[image_hash] = entry
+            index.move_to_end(image_hash)
+            while len(index) > self.max_entries_per_owner:
+                index.popitem(last=False)
+
+        if db is not None:
+            try:
+                self._collection(owner_uid).document(f"{image_hash:016x}").set(entry)
+            except Exception as e:
+                logger.warning(f"Could not persist image hash for {owner_uid}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses, owners = self.hits, self.misses, len(self._owners)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 3) if total else 0.0,
+            "owners_in_memory": owners,
+        }
+
+
+# Singleton
+product_image_cache = ProductImageCache()
@@ -0,0 +1,132 @@
+"""
+SlowQueryLog: Records /query calls whose SQL (or SQL generation) was slow.
+
+QueryEngine times LLM generation and SQL execution separately. Calls over a
+threshold are kept here with the question, SQL, row count, both timings and
+the query plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on Postgres):
+- a bounded in-process ring of recent entries,
+- an append-only JSONL file (SLOW_QUERY_LOG_PATH, "" to disable),
+- per-shape aggregates (literals stripped) so recurring offenders stand out.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from sql_guard import tokenize
+
+logger = logging.getLogger("SlowQueryLog")
+
+
+def fingerprint(sql: str) -> str:
+    """Query shape: keywords/identifiers lowercased, string and number literals -> ?."""
+    parts = []
+    for kind, text in tokenize(sql):
+        if kind in ("string", "number"):
+            parts.append("?")
+        elif kind == "word":
+            parts.append(text.lower())
+        else:
+            parts.append(text)
+    return " ".join(parts)
+
+
+class SlowQueryLog:
+    def __init__(self, execute_threshold_ms: Optional[float] = None, generate_threshold_ms: Optional[float] = None,
+                 max_entries: int = 500, max_shapes: int = 1000, path: Optional[str] = None):
+        self.execute_threshold_ms = execute_threshold_ms or float(os.getenv("SLOW_QUERY_MS", 250))
+        self.generate_threshold_ms = generate_threshold_ms or float(os.getenv("SLOW_GENERATION_MS", 3000))
+        self.max_shapes = max_shapes
+        if path is None:
+            path = os.getenv("SLOW_QUERY_LOG_PATH", "logs/slow_queries.jsonl")
+        self.path = Path(path) if path else None
+
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=max_entries)
+        self._shapes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def is_slow(self, generate_ms: float, execute_ms: float) -> bool:
+        return execute_ms >= self.execute_threshold_ms or generate_ms >= self.generate_threshold_ms
+
+    def record(self, *, question: str, sql: str, rows: Optional[int], generate_ms: float, execute_ms: float,
+               plan: Optional[List[str]] = None, template: Optional[str] = None, error: Optional[str] = None,
+               dialect: str = "sqlite"):
+        """Blocking (file append): call via asyncio.to_thread from the event loop."""
+        shape = fingerprint(sql)
+        entry = {
+            "at": time.time(),
+            "question": question,
+            "sql": sql,
+            "shape": shape,
+            "rows": rows,
+            "generate_ms": round(generate_ms, 1),
+            "execute_ms": round(execute_ms, 1),
+            "plan": plan,
+            "template": template,
+            "error": error,
+            "dialect": dialect,
+        }
+        with self._lock:
+            self._recent.append(entry)
+            agg = self._shapes.get(shape)
+            if agg is None:
+                if len(self._shapes) >= self.max_shapes:
+                    # Drop the shape seen longest ago
+                    oldest = min(self._shapes, key=lambda k: self._shapes[k]["last_at"])
+                    del self._shapes[oldest]
+                agg = self._shapes[shape] = {"shape": shape, "count": 0, "total_execute_ms": 0.0,
+                                             "max_execute_ms": 0.0, "total_generate_ms": 0.0}
+            agg["count"] += 1
+            agg["total_execute_ms"] += execute_ms
+            agg["total_generate_ms"] += generate_ms
+            agg["max_execute_ms"] = max(agg["max_execute_ms"], execute_ms)
+            agg["last_at"] = entry["at"]
+            agg["last_question"] = question
+            agg["last_sql"] = sql
+            if plan:
+                agg["last_plan"] = plan
+
+        logger.warning(f"🐢 Slow query: generate {generate_ms:.0f}ms, execute {execute_ms:.0f}ms, "
+                       f"rows {rows}. Question: {question!r} SQL: {sql} PLAN: {plan}")
+        if self.path:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            except OSError as e:
+                logger.warning(f"⚠️ Could not append to {self.path}: {e}")
+
+    def top_shapes(self, limit: int = 20, min_count: int = 1) -> List[Dict[str, Any]]:
+        """Shapes by total execution time spent over the threshold, i.e. recurring offenders first."""
+        with self._lock:
+            shapes = [dict(s) for s in self._shapes.values() if s["count"] >= min_count]
+        for s in shapes:
+            s["avg_execute_ms"] = round(s["total_execute_ms"] / s["count"], 1)
+            s["avg_generate_ms"] = round(s["total_generate_ms"] / s["count"], 1)
+            s["total_execute_ms"] = round(s["total_execute_ms"], 1)
+            s["max_execute_ms"] = round(s["max_execute_ms"], 1)
+            del s["total_generate_ms"]
+        shapes.sort(key=lambda s: s["total_execute_ms"], reverse=True)
+        return shapes[:limit]
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._recent)[-limit:][::-1]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "execute_threshold_ms": self.execute_threshold_ms,
+            "generate_threshold_ms": self.generate_threshold_ms,
+            "entries": len(self._recent),
+            "shapes": len(self._shapes),
+            "path": str(self.path) if self.path else None,
+        }
+
+
+# Singleton
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,655 @@
+"""
+SQLGuard: Safety and cost checks for LLM-generated SQL before it reaches SQLite.
+
+1. Parse: exactly one statement, and it must be a SELECT (optionally WITH ... SELECT).
+2. Tenancy: only allow-listed tables may be read; every reference to one needs
+   `[alias.]user_id = '<uid>'` (soft-deletable ones also `deleted_at IS NULL`) ANDed
+   into its SELECT's WHERE, and no other user's id may appear.
+3. LIMIT: injected when missing, clamped when too large. Comments are stripped
+   first, so the SQL that runs is the SQL that was checked.
+4. Budget: execution runs under a progress_handler that aborts after an
+   instruction or wall-clock budget, and aborted queries are logged with their plan.
+
+`pg_sql_guard` applies steps 1-3 to the Postgres backend's SQL (business_id
+tenancy, is_deleted soft deletes); there the budget is statement_timeout.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger("SQLGuard")
+
+TENANT_TABLES = {"bills", "customers", "products", "journal_entries",
+                 "qe_daily_sales", "qe_daily_payment_modes"}
+SOFT_DELETE_TABLES = {"bills", "customers", "products"}
+FORBIDDEN_KEYWORDS = {
+    "insert", "update", "delete", "drop", "alter", "create", "attach", "detach",
+    "pragma", "vacuum", "reindex", "analyze", "begin", "commit", "rollback", "savepoint", "release",
+}
+
+# Postgres: the transaction is read-only, but set_config() could switch the RLS tenant.
+# Only these tables are readable (users, businesses, sync_* are not)
+PG_TENANT_TABLES = {"customers", "products", "bills", "bill_items"}
+PG_PRIVATE_TABLES = {"users", "businesses", "business_users", "sync_sequences", "sync_changes", "sync_uploads"}
+PG_FORBIDDEN_KEYWORDS = FORBIDDEN_KEYWORDS | {
+    "set", "reset", "set_config", "current_setting", "copy", "grant", "revoke", "truncate", "lock",
+    "listen", "notify", "call", "do", "execute", "prepare", "discard", "query_accessible_businesses",
+}
+# Function families that read settings, files, other tables or other servers
+PG_FORBIDDEN_NAMES = re.compile(r"^(?:pg_|lo_|dblink|(?:query|cursor|table|schema|database)_to_)|_to_xml")
+
+# Names a CTE may never take, so it cannot pass for a real table: system catalogs and
+# the engine's own tables
+SYSTEM_TABLE_PREFIXES = ("sqlite_", "pg_", "qe_", "information_schema")
+
+_TOKEN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<ident>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+    |(?P<number>\d+(?:\.\d*)?)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<op>\S)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+# Words that can follow a table name without being its alias
+_NOT_ALIAS = {
+    "where", "group", "order", "having", "limit", "offset", "window", "fetch", "union", "intersect",
+    "except", "on", "using", "join", "inner", "left", "right", "full", "outer", "cross", "natural",
+}
+# Words before "(" that open a parenthesised expression rather than a function call
+_EXPR_WORDS = {
+    "and", "or", "not", "where", "on", "in", "exists", "select", "when", "then", "else", "by",
+    "having", "between", "like", "ilike", "is", "distinct", "using", "values", "from", "any", "all",
+}
+# What may follow a tenant / soft-delete predicate for it to stand alone as a condition
+_PREDICATE_END = _NOT_ALIAS | {"and", "or", ")", ","}
+
+
+class SQLGuardError(ValueError):
+    """Generated SQL rejected before execution."""
+
+
+class QueryBudgetExceeded(Exception):
+    """Query aborted by the instruction/time budget."""
+
+
+def tokenize(sql: str) -> List[Tuple[str, str]]:
+    """(kind, text) tokens with comments removed."""
+    tokens = []
+    for m in _TOKEN.finditer(sql):
+        kind = m.lastgroup
+        if kind == "comment":
+            continue
+        tokens.append((kind, m.group(kind)))
+    return tokens
+
+
+def strip_comments(sql: str) -> str:
+    """sql with each comment replaced by a space, so what runs is exactly what was checked."""
+    parts, pos = [], 0
+    for m in _TOKEN.finditer(sql):
+        if m.lastgroup == "comment":
+            parts.append(sql[pos:m.start()])
+            parts.append(" ")
+            pos = m.end()
+    parts.append(sql[pos:])
+    return "".join(parts)
+
+
+def _closing(tokens: List[Tuple[str, str]], j: int) -> int:
+    """Index of the ")" matching the "(" at tokens[j]; IndexError if unbalanced."""
+    depth = 0
+    while True:
+        if tokens[j] == ("op", "("):
+            depth += 1
+        elif tokens[j] == ("op", ")"):
+            depth -= 1
+            if depth == 0:
+                return j
+        j += 1
+
+
+def _unquote(ident: str) -> str:
+    if ident[:1] in ('"', "`", "[") and len(ident) >= 2:
+        return ident[1:-1]
+    return ident
+
+
+class _Clause:
+    """The clause of a SELECT being scanned; alias is the table an ON clause may filter."""
+
+    __slots__ = ("kind", "alias", "mixed")
+
+    def __init__(self, kind: str, alias: Optional[str] = None):
+        self.kind = kind
+        self.alias = alias
+        self.mixed = False  # has an OR at its own level
+
+
+class _Frame:
+    """One level of parentheses: a SELECT, a function call, or a grouped expression."""
+
+    __slots__ = ("kind", "scope", "clause", "joined", "conj", "negated", "mixed", "case", "between", "ctes")
+
+    def __init__(self, kind: str, scope: Optional["_Scope"] = None):
+        self.kind = kind
+        self.scope = scope
+        self.clause = _Clause("other")
+        self.joined: Optional[Tuple[Optional[str], bool]] = None  # (alias, preserved by RIGHT/FULL JOIN)
+        self.conj = False  # group opened where an ANDed condition may start
+        self.negated = False
+        self.mixed = False
+        self.case = 0
+        self.between = 0
+        self.ctes: Set[str] = set()  # CTE names defined by the WITH of this SELECT
+
+
+class _Predicate:
+    __slots__ = ("kind", "alias", "clause", "groups")
+
+    def __init__(self, kind: str, alias: Optional[str], clause: _Clause, groups: List[_Frame]):
+        self.kind = kind  # "tenant" or "live"
+        self.alias = alias
+        self.clause = clause
+        self.groups = groups
+
+
+class _Scope:
+    """One SELECT: the (table, alias) pairs it reads (table None for CTEs) and its predicates."""
+
+    def __init__(self):
+        self.refs: List[Tuple[Optional[str], str]] = []
+        self.preds: List[_Predicate] = []
+
+    def filtered(self, kind: str, alias: str, candidates: List[str]) -> bool:
+        """Whether a kind predicate filters alias; unqualified ones resolve when only one candidate has the column."""
+        for p in self.preds:
+            if p.kind != kind or p.clause.mixed or any(g.mixed for g in p.groups):
+                continue
+            target = p.alias if p.alias is not None else (candidates[0] if len(candidates) == 1 else None)
+            if target == alias and (p.clause.kind == "where" or p.clause.alias == alias):
+                return True
+        return False
+
+
+class SQLGuard:
+    def __init__(self, max_rows: Optional[int] = None, max_instructions: Optional[int] = None,
+                 timeout_s: Optional[float] = None, progress_interval: int = 10_000,
+                 tenant_tables: Optional[Set[str]] = None, soft_delete_tables: Optional[Set[str]] = None,
+                 tenant_column: str = "user_id", soft_delete_column: str = "deleted_at",
+                 forbidden_keywords: Optional[Set[str]] = None, allowed_tables: Optional[Set[str]] = None,
+                 private_tables: Optional[Set[str]] = None, forbidden_names: Optional[re.Pattern] = None):
+        self.tenant_tables = tenant_tables if tenant_tables is not None else TENANT_TABLES
+        # Tables generated SQL may read at all (besides its own CTEs)
+        self.allowed_tables = allowed_tables if allowed_tables is not None else self.tenant_tables
+        # Tables that exist but may not be read (nor shadowed by a CTE)
+        self.private_tables = private_tables or set()
+        self.soft_delete_tables = soft_delete_tables if soft_delete_tables is not None else SOFT_DELETE_TABLES
+        self.tenant_column = tenant_column
+        self.soft_delete_column = soft_delete_column
+        self.forbidden_keywords = forbidden_keywords or FORBIDDEN_KEYWORDS
+        self.forbidden_names = forbidden_names
+        self.max_rows = max_rows or int(os.getenv("QUERY_MAX_ROWS", 200))
+        self.max_instructions = max_instructions or int(os.getenv("QUERY_MAX_INSTRUCTIONS", 50_000_000))
+        self.timeout_s = timeout_s or float(os.getenv("QUERY_TIMEOUT_S", 2.0))
+        self.progress_interval = progress_interval
+
+    # --- STATIC CHECKS ---
+    def check(self, sql: str, user_uid: str, max_rows: Optional[int] = None) -> str:
+        """
+        Returns the SQL to execute (LIMIT applied) or raises SQLGuardError.
+        user_uid is the tenant id the tenant column must equal (business_id for pg_sql_guard).
+        """
+        sql = strip_comments(sql)
+        tokens = tokenize(sql)
+        while tokens and tokens[-1] == ("op", ";"):
+            tokens.pop()
+        if not tokens:
+            raise SQLGuardError("Empty SQL")
+        if ("op", ";") in tokens:
+            raise SQLGuardError("Only a single statement is allowed")
+        if ("op", "$") in tokens:
+            raise SQLGuardError("Dollar quoting and parameters are not allowed")
+
+        words = [t.lower() for k, t in tokens if k == "word"]
+        first = words[0] if words else ""
+        if first not in ("select", "with"):
+            raise SQLGuardError("Only SELECT queries are allowed")
+        # Quoted identifiers too: "pg_sleep"(5) is still a call
+        names = words + [_unquote(t).lower() for k, t in tokens if k == "ident"]
+        bad = self.forbidden_keywords.intersection(names)
+        if bad:
+            raise SQLGuardError(f"Keyword not allowed: {sorted(bad)[0].upper()}")
+        if self.forbidden_names is not None:
+            bad = sorted(name for name in names if self.forbidden_names.search(name))
+            if bad:
+                raise SQLGuardError(f"Function not allowed: {bad[0]}")
+
+        self._check_tenancy(tokens, user_uid)
+        return self._apply_limit(sql, tokens, max_rows or self.max_rows)
+
+    def _cte_defs(self, tokens: List[Tuple[str, str]], i: int) -> Tuple[bool, List[Tuple[str, int, int]]]:
+        """
+        The WITH clause starting at tokens[i]: whether it is RECURSIVE, and per CTE
+        `name [(cols)] AS [[NOT] MATERIALIZED] (...)` its name and the indexes of its body's parentheses.
+        """
+        n = len(tokens)
+        j = i + 1
+        recursive = j < n and tokens[j][1].lower() == "recursive"
+        j += recursive
+        defs = []
+        try:
+            while True:
+                if tokens[j][0] not in ("word", "ident"):
+                    raise SQLGuardError("Unsupported WITH clause")
+                name = _unquote(tokens[j][1]).lower()
+                if self._protected(name):
+                    raise SQLGuardError(f"CTE name shadows a table: {name}")
+                j += 1
+                if tokens[j] == ("op", "("):  # column list
+                    j = _closing(tokens, j) + 1
+                if tokens[j][1].lower() != "as":
+                    raise SQLGuardError("Unsupported WITH clause")
+                j += 1
+                while tokens[j][1].lower() in ("not", "materialized"):
+                    j += 1
+                if tokens[j] != ("op", "("):
+                    raise SQLGuardError("Unsupported WITH clause")
+                close = _closing(tokens, j)
+                defs.append((name, j, close))
+                j = close + 1
+                if j < n and tokens[j] == ("op", ","):
+                    j += 1
+                    continue
+                return recursive, defs
+        except IndexError:
+            raise SQLGuardError("Unsupported WITH clause")
+
+    def _protected(self, name: str) -> bool:
+        """Real (or system) tables a CTE may not take the name of."""
+        return name in self.allowed_tables or name in self.private_tables or name.startswith(SYSTEM_TABLE_PREFIXES)
+
+    def _alias(self, tokens: List[Tuple[str, str]], j: int, name: str) -> Tuple[str, int]:
+        """Alias of the table ending before j (the table name itself if none), and the index after it."""
+        if j < len(tokens) and tokens[j][0] == "word" and tokens[j][1].lower() == "as":
+            j += 1
+        if j < len(tokens) and (tokens[j][0] == "ident"
+                                or (tokens[j][0] == "word" and tokens[j][1].lower() not in _NOT_ALIAS)):
+            return _unquote(tokens[j][1]).lower(), j + 1
+        return name, j
+
+    def _scan(self, tokens: List[Tuple[str, str]]) -> List[_Scope]:
+        """
+        Walks the statement once, per SELECT (each UNION branch, subquery and CTE body
+        is a scope): the tables it reads and the tenant / soft-delete predicates that
+        filter them. A predicate only counts where it is ANDed into a WHERE (or into
+        the ON of the table it joins): not inside OR, NOT, CASE, function calls or
+        the select list, and not compared further (`user_id = 'u' IS NOT NULL`).
+        """
+        root = _Frame("select", _Scope())
+        frames, scopes = [root], [root.scope]
+        expect_table, join_preserves = False, None
+        between_ands = set()  # indexes of ANDs that belong to BETWEEN
+        # A CTE is visible in the main SELECT of its WITH (and that SELECT's subqueries), in later
+        # CTE bodies of the same WITH, and in its own body only WITH RECURSIVE
+        cte_bodies: Dict[int, Set[str]] = {}  # index of a body's "(" -> names visible inside it
+        cte_ends: Dict[int, Tuple[_Frame, Set[str]]] = {}  # index of the last body's ")" -> (frame, names)
+        n = len(tokens)
+        i = 0
+        while i < n:
+            kind, text = tokens[i]
+            low = text.lower()
+            frame = frames[-1]
+
+            if expect_table:
+                expect_table = False
+                if kind == "word" and low in ("lateral", "only"):
+                    expect_table = True
+                    i += 1
+                    continue
+                if kind in ("word", "ident"):
+                    name = _unquote(text).lower()
+                    if i + 2 < n and tokens[i + 1] == ("op", "."):
+                        raise SQLGuardError(f"Table not allowed: {name}.{_unquote(tokens[i + 2][1]).lower()}")
+                    if i + 1 < n and tokens[i + 1] == ("op", "("):
+                        raise SQLGuardError(f"Table function not allowed: {name}")
+                    is_cte = any(name in f.ctes for f in frames)
+                    if not is_cte and name not in self.allowed_tables:
+                        raise SQLGuardError(f"Table not allowed: {name}")
+                    alias, i = self._alias(tokens, i + 1, name)
+                    frame.scope.refs.append((None if is_cte else name, alias))
+                    if join_preserves is not None:
+                        frame.joined = (alias, join_preserves)
+                        join_preserves = None
+                    continue
+                if text != "(" or i + 1 >= n or tokens[i + 1][1].lower() not in ("select", "with"):
+                    raise SQLGuardError("Unsupported FROM clause")
+                if join_preserves is not None:
+                    frame.joined = (None, join_preserves)  # derived table: its own scope is checked
+                    join_preserves = None
+
+            if kind == "op" and text == "(":
+                nxt = tokens[i + 1][1].lower() if i + 1 < n else ""
+                prev_kind, prev = tokens[i - 1] if i else ("op", "")
+                prev = prev.lower()
+                if nxt in ("select", "with") or i in cte_bodies:
+                    frames.append(_Frame("select", _Scope()))
+                    frames[-1].ctes = cte_bodies.get(i, set())
+                    scopes.append(frames[-1].scope)
+                elif prev_kind == "ident" or (prev_kind == "word" and prev not in _EXPR_WORDS):
+                    frames.append(_Frame("call"))
+                else:
+                    group = _Frame("group")
+                    group.negated = prev == "not"
+                    group.conj = prev in ("where", "on") or (prev == "and" and i - 1 not in between_ands) \
+                        or (prev == "(" and frame.kind == "group" and frame.conj)
+                    frames.append(group)
+            elif kind == "op" and text == ")":
+                if len(frames) > 1:
+                    frames.pop()
+                if i in cte_ends:
+                    owner, names = cte_ends.pop(i)
+                    owner.ctes |= names
+            elif kind == "op" and text == ",":
+                if frame.kind == "group":
+                    frame.mixed = True  # row constructor / IN list
+                elif frame.kind == "select" and frame.clause.kind in ("from", "on"):
+                    expect_table = True
+                    frame.clause = _Clause("from")
+            elif kind == "word":
+                if low == "case":
+                    frame.case += 1
+                elif low == "end" and frame.case:
+                    frame.case -= 1
+                elif low == "between":
+                    frame.between += 1
+                elif low == "and" and frame.between:
+                    frame.between -= 1
+                    between_ands.add(i)
+                elif low == "or":
+                    if frame.kind == "group":
+                        frame.mixed = True
+                    elif frame.kind == "select":
+                        frame.clause.mixed = True
+                elif frame.kind == "select":
+                    prev = tokens[i - 1][1].lower() if i else ""
+                    if low == "with" and (i == 0 or prev == "("):
+                        recursive, defs = self._cte_defs(tokens, i)
+                        names = [name for name, _, _ in defs]
+                        for k, (_, open_at, _) in enumerate(defs):
+                            cte_bodies[open_at] = set(names if recursive else names[:k])
+                        cte_ends[defs[-1][2]] = (frame, set(names))
+                    elif low == "from" and prev != "distinct":
+                        frame.clause = _Clause("from")
+                        expect_table = True
+                    elif low == "join":
+                        back = {t.lower() for _, t in tokens[max(0, i - 3):i]}
+                        join_preserves = bool(back & {"right", "full"})
+                        frame.clause = _Clause("from")
+                        expect_table = True
+                    elif low == "on":
+                        alias, preserves = frame.joined or (None, True)
+                        frame.clause = _Clause("on", alias=None if preserves else alias)
+                    elif low == "where":
+                        frame.clause = _Clause("where")
+                    elif low in ("select", "group", "order", "having", "limit", "offset", "window",
+                                 "fetch", "using", "values"):
+                        frame.clause = _Clause("other")
+                    elif low in ("union", "intersect", "except"):
+                        frame.scope = _Scope()
+                        scopes.append(frame.scope)
+                        frame.clause = _Clause("other")
+                if low in (self.tenant_column, self.soft_delete_column):
+                    self._record_predicate(tokens, i, frames, between_ands)
+            i += 1
+        return scopes
+
+    def _record_predicate(self, tokens: List[Tuple[str, str]], i: int, frames: List[_Frame], between_ands: Set[int]):
+        """Adds the tenant / soft-delete predicate at i (if it is one) to the enclosing scope."""
+        n = len(tokens)
+        after = [t.lower() for _, t in tokens[i + 1:i + 5]]
+        start = i - 2 if i >= 2 and tokens[i - 1] == ("op", ".") and tokens[i - 2][0] in ("word", "ident") else i
+        alias = _unquote(tokens[start][1]).lower() if start < i else None
+
+        end = None
+        if tokens[i][1].lower() == self.tenant_column:
+            if after[:1] == ["="] and i + 2 < n and tokens[i + 2][0] == "string":
+                end, pred = i + 3, "tenant"
+        elif after[:2] == ["is", "null"] or after[:2] in (["=", "false"], ["is", "false"]):
+            end, pred = i + 3, "live"
+        elif after[:3] == ["is", "not", "true"]:
+            end, pred = i + 4, "live"
+        elif self.soft_delete_column != "deleted_at" and start >= 1 and tokens[start - 1][1].lower() == "not":
+            end, pred, start = i + 1, "live", start - 1  # NOT [alias.]is_deleted
+        if end is None:
+            return
+        if end < n and tokens[end][1].lower() not in _PREDICATE_END:
+            return
+        prev = tokens[start - 1][1].lower() if start else ""
+        if not (prev in ("where", "on", "(") or (prev == "and" and start - 1 not in between_ands)):
+            return
+
+        for depth in range(len(frames) - 1, -1, -1):
+            frame = frames[depth]
+            if frame.case:
+                return
+            if frame.kind == "select":
+                if frame.clause.kind in ("where", "on"):
+                    frame.scope.preds.append(_Predicate(pred, alias, frame.clause, frames[depth + 1:]))
+                return
+            if frame.kind != "group" or not frame.conj or frame.negated:
+                return
+
+    def _check_tenancy(self, tokens: List[Tuple[str, str]], user_uid: str):
+        # Any tenant_column = '<literal>' naming someone else is rejected outright
+        for i, (kind, text) in enumerate(tokens[:-2]):
+            if kind == "word" and text.lower() == self.tenant_column and tokens[i + 1] == ("op", "=") \
+                    and tokens[i + 2][0] == "string" and tokens[i + 2][1][1:-1].replace("''", "'") != user_uid:
+                raise SQLGuardError("Query references another user's data")
+
+        for scope in self._scan(tokens):
+            for pred, tables, message in (
+                ("tenant", self.tenant_tables, f"Missing {self.tenant_column} = '{user_uid}' filter"),
+                ("live", self.soft_delete_tables, f"Missing {self.soft_delete_column} "
+                                                   f"{'IS NULL' if self.soft_delete_column == 'deleted_at' else '= false'} filter"),
+            ):
+                needed = [alias for name, alias in scope.refs if name in tables]
+                for alias in needed:
+                    if not scope.filtered(pred, alias, needed):
+                        raise SQLGuardError(message if len(needed) == 1 else f"{message} for {alias}")
+
+    def _apply_limit(self, sql: str, tokens: List[Tuple[str, str]], max_rows: int) -> str:
+        """sql must already be comment-free (see strip_comments), or a trailing -- comment would swallow the LIMIT."""
+        depth = 0
+        limit_at = None
+        for i, (kind, text) in enumerate(tokens):
+            if kind == "op" and text == "(":
+                depth += 1
+            elif kind == "op" and text == ")":
+                depth -= 1
+            elif depth == 0 and kind == "word" and text.lower() == "limit":
+                limit_at = i
+
+        body = re.sub(r"[\s;]+$", "", sql)
+        if limit_at is None:
+            return f"{body} LIMIT {max_rows}"
+
+        rest = tokens[limit_at + 1:]
+        if len(rest) == 1 and rest[0][0] == "number" and "." not in rest[0][1]:
+            if int(rest[0][1]) <= max_rows:
+                return body
+            # Clamp the trailing number in place
+            clamped, n = re.subn(r"\d+$", str(max_rows), body)
+            if n:
+                return clamped
+        # OFFSET / expressions: don't rewrite, bound from outside
+        return f"SELECT * FROM ({body}) AS bounded LIMIT {max_rows}"
+
+    # --- EXECUTION BUDGET ---
+    def _install_budget(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        """Arms the progress handler; the returned state gets 'reason' set on abort."""
+        state: Dict[str, Any] = {"started": time.monotonic(), "reason": None}
+        deadline = state["started"] + self.timeout_s
+        max_ticks = max(1, self.max_instructions // self.progress_interval)
+        ticks = 0
+
+        def on_progress():
+            nonlocal ticks
+            ticks += 1
+            if ticks > max_ticks:
+                state["reason"] = f"instruction budget ({self.max_instructions:,}) exceeded"
+                return 1
+            if time.monotonic() > deadline:
+                state["reason"] = f"time budget ({self.timeout_s:.1f}s) exceeded"
+                return 1
+            return 0
+
+        conn.set_progress_handler(on_progress, self.progress_interval)
+        return state
+
+    def _budget_error(self, conn: sqlite3.Connection, state: Dict[str, Any], sql: str,
+                      params: Sequence[Any], question: Optional[str]) -> "QueryBudgetExceeded":
+        elapsed_ms = (time.monotonic() - state["started"]) * 1000
+        plan = self.explain(conn, sql, params)
+        logger.warning(
+            f"⛔ Aborted query after {elapsed_ms:.0f}ms ({state['reason']}). "
+            f"Question: {question!r} SQL: {sql} PLAN: {plan}"
+        )
+        return QueryBudgetExceeded(f"Query too expensive and was stopped: {state['reason']}")
+
+    def execute_bounded(self, conn: sqlite3.Connection, sql: str, params: Sequence[Any] = (),
+                        question: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Runs sql on conn with the instruction/time budget. Call on the connection's thread
+        (e.g. via SQLitePool.run). Raises QueryBudgetExceeded on abort.
+        """
+        state = self._install_budget(conn)
+        try:
+            cursor = conn.execute(sql, params)
+            try:
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        except sqlite3.OperationalError as e:
+            if state["reason"] is None:
+                raise
+            raise self._budget_error(conn, state, sql, params, question) from e
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def iter_bounded(self, conn: sqlite3.Connection, sql: str, params: Sequence[Any] = (),
+                     question: Optional[str] = None, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Like execute_bounded, but yields fetchmany() batches. Each batch gets the full
+        budget, so a long export is bounded per step rather than in total (cap the total
+        with check(max_rows=...)). Meant for SQLitePool.stream.
+        """
+        cursor = None
+        try:
+            state = self._install_budget(conn)
+            try:
+                cursor = conn.execute(sql, params)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        return
+                    conn.set_progress_handler(None, 0)
+                    yield batch
+                    state = self._install_budget(conn)
+            except sqlite3.OperationalError as e:
+                if state["reason"] is None:
+                    raise
+                raise self._budget_error(conn, state, sql, params, question) from e
+        finally:
+            conn.set_progress_handler(None, 0)
+            if cursor is not None:
+                cursor.close()
+
+    @staticmethod
+    def explain(conn: sqlite3.Connection, sql: str, params: Sequence[Any] = ()) -> List[str]:
+        try:
+            return [row["detail"] if isinstance(row, dict) else row[3]
+                    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+        except sqlite3.Error as e:
+            return [f"<plan unavailable: {e}>"]
+
+
+# Singletons
+sql_guard = SQLGuard()
+pg_sql_guard = SQLGuard(
+    tenant_tables=PG_TENANT_TABLES,
+    soft_delete_tables=PG_TENANT_TABLES,
+    tenant_column="business_id",
+    soft_delete_column="is_deleted",
+    forbidden_keywords=PG_FORBIDDEN_KEYWORDS,
+    private_tables=PG_PRIVATE_TABLES,
+    forbidden_names=PG_FORBIDDEN_NAMES,
+)
+
+
+if __name__ == "__main__":
+    # Self-check: python sql_guard.py
+    _ALLOWED = [
+        ("SELECT c.name, SUM(b.grand_total) FROM bills b JOIN customers c ON c.id = b.customer_id "
+         "AND c.user_id = 'u1' AND c.deleted_at IS NULL WHERE b.user_id = 'u1' AND b.deleted_at IS NULL "
+         "AND (b.payment_mode = 'CASH' OR b.payment_mode = 'UPI') GROUP BY c.name", None),
+        ("SELECT * FROM bills WHERE user_id = 'u1' AND deleted_at IS NULL -- newest first",
+         "SELECT * FROM bills WHERE user_id = 'u1' AND deleted_at IS NULL LIMIT 200"),
+        ("SELECT * FROM bills WHERE user_id = 'u1' AND deleted_at IS NULL LIMIT 5000 -- many",
+         "SELECT * FROM bills WHERE user_id = 'u1' AND deleted_at IS NULL LIMIT 200"),
+        ("WITH RECURSIVE n(k) AS (SELECT 1 UNION ALL SELECT k + 1 FROM n WHERE k < 3), "
+         "paid AS (SELECT customer_id FROM bills WHERE user_id = 'u1' AND deleted_at IS NULL) "
+         "SELECT k, (SELECT COUNT(*) FROM paid) FROM n", None),
+    ]
+    _REJECTED = [
+        "SELECT * FROM bills WHERE user_id = 'u1' AND deleted_at IS NULL OR 1=1",
+        "SELECT * FROM bills WHERE user_id = 'u1' OR user_id <> 'u1' AND deleted_at IS NULL",
+        "SELECT b.* FROM bills b JOIN customers c ON c.id = b.customer_id WHERE b.user_id = 'u1' AND b.deleted_at IS NULL",
+        "SELECT * FROM bills WHERE NOT (user_id = 'u1' AND deleted_at IS NULL)",
+        "SELECT * FROM bills WHERE user_id = 'u1' IS NOT NULL AND deleted_at IS NULL",
+        "SELECT * FROM bills WHERE user_id = 'u1' AND deleted_at IS NULL UNION SELECT * FROM bills",
+        "SELECT * FROM bills /* WHERE user_id = 'u1' AND deleted_at IS NULL",
+        "SELECT * FROM sqlite_master",
+        "SELECT * FROM sqlite_master WHERE name IN (WITH sqlite_master AS (SELECT 1) SELECT * FROM sqlite_master)",
+        "SELECT * FROM bills WHERE user_id = 'u1' AND deleted_at IS NULL AND id IN (WITH x AS (SELECT 1) SELECT 1) "
+        "AND customer_id IN (SELECT * FROM x)",
+        "WITH bills AS (SELECT 1) SELECT * FROM bills",
+    ]
+    for _sql, _expected in _ALLOWED:
+        _out = sql_guard.check(_sql, "u1")
+        assert _expected is None or _out == _expected, _out
+    for _sql in _REJECTED:
+        try:
+            sql_guard.check(_sql, "u1")
+        except SQLGuardError:
+            continue
+        raise AssertionError(f"not rejected: {_sql}")
+    _PG_REJECTED = [
+        "SELECT email, password_hash FROM users",
+        "SELECT * FROM businesses",
+        "SELECT email, password_hash FROM users WHERE id IN (WITH users AS (SELECT 1) SELECT * FROM users)",
+        "SELECT query_to_xml('select * from users', true, true, '') FROM bills "
+        "WHERE business_id = 'b1' AND is_deleted = false",
+        "SELECT current_setting('app.current_business_id') FROM bills WHERE business_id = 'b1' AND is_deleted = false",
+        "SELECT \"pg_sleep\"(5) FROM bills WHERE business_id = 'b1' AND is_deleted = false",
+        "SELECT * FROM bills WHERE business_id = 'b1' AND is_deleted = false OR true",
+        "SELECT * FROM bills WHERE business_id = 'b1' AND NOT is_deleted = false",
+    ]
+    pg_sql_guard.check("SELECT p.name, SUM(bi.qty) FROM bill_items bi JOIN products p ON p.id = bi.product_id "
+                       "AND p.business_id = 'b1' AND NOT p.is_deleted WHERE bi.business_id = 'b1' "
+                       "AND bi.is_deleted = false AND EXTRACT(YEAR FROM bi.created_at) = 2024 GROUP BY p.name", "b1")
+    for _sql in _PG_REJECTED:
+        try:
+            pg_sql_guard.check(_sql, "b1")
+        except SQLGuardError:
+            continue
+        raise AssertionError(f"not rejected: {_sql}")
+    print(f"✅ {len(_ALLOWED) + 1} allowed, {len(_REJECTED) + len(_PG_REJECTED)} rejected")
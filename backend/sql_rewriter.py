@@ -0,0 +1,134 @@
+"""
+SargableRewriter: Rewrites index-hostile predicates in generated SQL.
+
+The schema prompt teaches the LLM patterns that wrap the column in a function:
+    datetime(bill_date, 'unixepoch') >= datetime('now', 'start of day')
+    strftime('%Y-%m', datetime(bill_date, 'unixepoch')) = strftime('%Y-%m', 'now')
+    LOWER(name) LIKE '%milk%'
+SQLite can't use an index through those. Each is rewritten to an equivalent
+predicate on the raw column: date expressions become epoch-integer ranges
+(evaluated once, in-process, with SQLite's own date functions so modifiers keep
+their exact meaning), and LOWER() is dropped where LIKE/NOCASE already fold case.
+"""
+
+import logging
+import re
+import sqlite3
+from datetime import datetime, timezone
+from typing import List, Optional
+
+logger = logging.getLogger("SQLRewriter")
+
+_COL = r"(?P<col>[A-Za-z_][\w]*(?:\.[A-Za-z_][\w]*)?)"
+_MODS = r"(?P<mods>(?:\s*,\s*'[^']*')*)"
+_EPOCH_COL = r"datetime\(\s*" + _COL + r"\s*,\s*'unixepoch'\s*\)"
+
+# datetime(col, 'unixepoch') OP datetime|date('now', ...)
+_CMP_NOW = re.compile(
+    _EPOCH_COL + r"\s*(?P<op>>=|<=|>|<)\s*(?P<fn>datetime|date)\(\s*'now'" + _MODS + r"\s*\)",
+    re.IGNORECASE,
+)
+# strftime(FMT, datetime(col, 'unixepoch')) = strftime(FMT, 'now', ...)
+_PERIOD_EQ = re.compile(
+    r"strftime\(\s*'(?P<fmt>%Y-%m-%d|%Y-%m|%Y)'\s*,\s*" + _EPOCH_COL
+    + r"\s*\)\s*=\s*strftime\(\s*'(?P=fmt)'\s*,\s*'now'" + _MODS + r"\s*\)",
+    re.IGNORECASE,
+)
+# date(col, 'unixepoch') = date('now', ...)
+_DATE_EQ = re.compile(
+    r"date\(\s*" + _COL + r"\s*,\s*'unixepoch'\s*\)\s*=\s*date\(\s*'now'" + _MODS + r"\s*\)",
+    re.IGNORECASE,
+)
+# strftime('%s', 'now', ...) anywhere -> integer literal
+_EPOCH_NOW = re.compile(r"strftime\(\s*'%s'\s*,\s*'now'" + _MODS + r"\s*\)", re.IGNORECASE)
+# LOWER(col) LIKE 'lit' / LOWER(col) = 'lit'
+_LOWER_LIKE = re.compile(r"LOWER\(\s*" + _COL + r"\s*\)\s+LIKE\s+(?P<lit>'(?:[^']|'')*')", re.IGNORECASE)
+_LOWER_EQ = re.compile(r"LOWER\(\s*" + _COL + r"\s*\)\s*=\s*(?P<lit>'(?:[^']|'')*')", re.IGNORECASE)
+
+_PERIOD_UNIT = {"%Y-%m-%d": ("start of day", "+1 day"),
+                "%Y-%m": ("start of month", "+1 month"),
+                "%Y": ("start of year", "+1 year")}
+
+
+def _parse_mods(raw: str) -> List[str]:
+    return [m.replace("''", "'") for m in re.findall(r"'((?:[^']|'')*)'", raw or "")]
+
+
+class SargableRewriter:
+    def __init__(self):
+        self.rewrites = 0
+
+    @staticmethod
+    def _epoch(ref: str, mods: List[str]) -> Optional[int]:
+        """Evaluates strftime('%s', ref, *mods) with SQLite's date engine."""
+        conn = sqlite3.connect(":memory:")
+        try:
+            placeholders = ", ".join("?" for _ in mods)
+            sql = f"SELECT CAST(strftime('%s', ?{', ' + placeholders if mods else ''}) AS INTEGER)"
+            value = conn.execute(sql, (ref, *mods)).fetchone()[0]
+            return int(value) if value is not None else None
+        finally:
+            conn.close()
+
+    def rewrite(self, sql: str, now: Optional[datetime] = None) -> str:
+        # One reference instant for the whole statement, like SQLite's 'now'
+        ref = (now or datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S")
+        original = sql
+
+        def cmp_now(m: re.Match) -> str:
+            mods = _parse_mods(m.group("mods"))
+            bound = self._epoch(ref, mods + (["start of day"] if m.group("fn").lower() == "date" else []))
+            if bound is None:
+                return m.group(0)
+            op = m.group("op")
+            if m.group("fn").lower() == "date":
+                # 'YYYY-MM-DD HH:MM:SS' vs 'YYYY-MM-DD': midnight already sorts after the date
+                op = {">": ">=", "<=": "<"}.get(op, op)
+            return f"{m.group('col')} {op} {bound}"
+
+        def period_eq(m: re.Match) -> str:
+            start_mod, next_mod = _PERIOD_UNIT[m.group("fmt")]
+            mods = _parse_mods(m.group("mods"))
+            start = self._epoch(ref, mods + [start_mod])
+            end = self._epoch(ref, mods + [start_mod, next_mod])
+            if start is None or end is None:
+                return m.group(0)
+            return f"({m.group('col')} >= {start} AND {m.group('col')} < {end})"
+
+        def date_eq(m: re.Match) -> str:
+            mods = _parse_mods(m.group("mods"))
+            start = self._epoch(ref, mods + ["start of day"])
+            end = self._epoch(ref, mods + ["start of day", "+1 day"])
+            if start is None or end is None:
+                return m.group(0)
+            return f"({m.group('col')} >= {start} AND {m.group('col')} < {end})"
+
+        def epoch_now(m: re.Match) -> str:
+            value = self._epoch(ref, _parse_mods(m.group("mods")))
+            return str(value) if value is not None else m.group(0)
+
+        def lower_like(m: re.Match) -> str:
+            # LIKE is already case-insensitive for ASCII, and SQLite's LOWER() is ASCII-only
+            lit = m.group("lit")
+            if lit != lit.lower():
+                return m.group(0)
+            return f"{m.group('col')} LIKE {lit}"
+
+        def lower_eq(m: re.Match) -> str:
+            lit = m.group("lit")
+            if lit != lit.lower():
+                return m.group(0)
+            return f"{m.group('col')} = {lit} COLLATE NOCASE"
+
+        for pattern, fn in ((_PERIOD_EQ, period_eq), (_DATE_EQ, date_eq), (_CMP_NOW, cmp_now),
+                            (_EPOCH_NOW, epoch_now), (_LOWER_LIKE, lower_like), (_LOWER_EQ, lower_eq)):
+            sql = pattern.sub(fn, sql)
+
+        if sql != original:
+            self.rewrites += 1
+            logger.debug(f"🔧 Rewrote SQL: {original} -> {sql}")
+        return sql
+
+
+# Singleton
+sql_rewriter = SargableRewriter()
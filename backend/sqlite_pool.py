@@ -0,0 +1,166 @@
+"""
+SQLitePool: Pooled, read-only connections to the Drift database.
+
+- Connections open in read-only URI mode (file:...?mode=ro) with query_only on,
+  so generated SQL can never write.
+- WAL-friendly: readers never take write locks, and busy_timeout rides out
+  the app's checkpoints instead of failing with "database is locked".
+- mmap_size / cache_size tuned for analytics scans.
+- sqlite3's per-connection prepared-statement cache (cached_statements) is
+  sized up so repeated query shapes skip re-preparing.
+- Every query runs on a dedicated thread pool (one connection per worker
+  thread), so `await pool.execute(...)` never blocks the event loop.
+- `pool.stream(...)` walks large results batch by batch on its own connection.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+logger = logging.getLogger("SQLitePool")
+
+_END = object()
+
+
+def dict_row_factory(cursor: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class SQLitePool:
+    def __init__(
+        self,
+        db_path: str,
+        size: Optional[int] = None,
+        mmap_size: Optional[int] = None,
+        cache_size_kb: Optional[int] = None,
+        statement_cache: Optional[int] = None,
+        busy_timeout_ms: int = 5000,
+    ):
+        self.db_path = str(Path(db_path).resolve())
+        self.size = size or int(os.getenv("SQLITE_POOL_SIZE", 4))
+        self.mmap_size = mmap_size if mmap_size is not None else int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+        self.cache_size_kb = cache_size_kb or int(os.getenv("SQLITE_CACHE_SIZE_KB", 32 * 1024))
+        self.statement_cache = statement_cache or int(os.getenv("SQLITE_STATEMENT_CACHE", 256))
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="sqlite-ro")
+        self._closed = False
+        # Dedicated connection for PRAGMA data_version: the value is only comparable
+        # across reads from the *same* connection, so it can't come from the workers.
+        self._probe: Optional[sqlite3.Connection] = None
+        self._probe_lock = threading.Lock()
+
+    # --- CONNECTIONS ---
+    def _open(self, register: bool = True) -> sqlite3.Connection:
+        uri = Path(self.db_path).as_uri() + "?mode=ro"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.statement_cache,
+            timeout=self.busy_timeout_ms / 1000,
+        )
+        conn.row_factory = dict_row_factory
+        # journal_mode can't be changed read-only; if the app runs WAL we read WAL
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if register:
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Connection bound to the calling worker thread (opened lazily)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def data_version(self) -> int:
+        """
+        Changes whenever another connection commits to the database file
+        (the app, a sync job...). Cheap enough to call before every cached read.
+        """
+        with self._probe_lock:
+            if self._probe is None:
+                self._probe = self._open()
+            return self._probe.execute("PRAGMA data_version").fetchone()["data_version"]
+
+    async def current_data_version(self) -> int:
+        """
+        data_version() off the event loop: it can wait on the probe lock and busy_timeout.
+        Uses the default executor so a pool saturated by slow queries doesn't delay cache hits.
+        """
+        if self._closed:
+            raise RuntimeError("SQLitePool is closed")
+        return await asyncio.to_thread(self.data_version)
+
+    # --- EXECUTION ---
+    def execute_sync(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        """Runs on the calling thread. Only use from pool workers or scripts."""
+        cursor = self.connection().execute(sql, params)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def run_sync(self, fn, *args):
+        """Calls fn(connection, *args) on the calling thread's pooled connection."""
+        return fn(self.connection(), *args)
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        if self._closed:
+            raise RuntimeError("SQLitePool is closed")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.execute_sync, sql, params)
+
+    async def run(self, fn, *args):
+        """Runs fn(connection, *args) on a pool thread. For multi-statement work."""
+        if self._closed:
+            raise RuntimeError("SQLitePool is closed")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.run_sync, fn, *args)
+
+    async def stream(self, fn, *args) -> AsyncIterator[Any]:
+        """
+        Iterates the generator fn(connection, *args) on pool threads, one item per hop,
+        so a slow consumer never pins a worker. The connection is dedicated to the stream
+        (an open cursor can't share a worker's connection) and closed when it ends.
+        """
+        if self._closed:
+            raise RuntimeError("SQLitePool is closed")
+        loop = asyncio.get_running_loop()
+        conn = await loop.run_in_executor(self._executor, self._open, False)
+        it = fn(conn, *args)
+        try:
+            while True:
+                item = await loop.run_in_executor(self._executor, next, it, _END)
+                if item is _END:
+                    break
+                yield item
+        finally:
+            await loop.run_in_executor(self._executor, it.close)
+            conn.close()
+
+    def close(self):
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
@@ -0,0 +1,149 @@
+"""
+TenantRouter: Maps a user_uid to its own SQLite file for hosted deployments.
+One database per shop ({root}/{user_uid}.db), so isolation is physical rather
+than a user_id predicate the LLM has to remember. Files are opened lazily on
+first access and kept in an LRU of QueryDatabase handles (pool + cache +
+rollups) capped at TENANT_MAX_OPEN; evicted handles close once their last
+in-flight query or stream lets go.
+"""
+
+import asyncio
+import logging
+import os
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from query_database import QueryDatabase
+
+logger = logging.getLogger("TenantRouter")
+
+# Firebase uids and our own ids; anything else could escape root_dir
+_SAFE_UID = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+
+class _Handle:
+    __slots__ = ("db", "in_use", "evicted")
+
+    def __init__(self, db: QueryDatabase):
+        self.db = db
+        self.in_use = 0
+        self.evicted = False
+
+
+class TenantRouter:
+    def __init__(self, root_dir: str, max_open: Optional[int] = None, pool_size: Optional[int] = None,
+                 cache_bytes: Optional[int] = None):
+        self.root = Path(root_dir)
+        self.max_open = max_open or int(os.getenv("TENANT_MAX_OPEN", 64))
+        # Per-tenant pools stay small: max_open x pool_size threads/connections in total
+        self.pool_size = pool_size or int(os.getenv("TENANT_POOL_SIZE", 2))
+        self.cache_bytes = cache_bytes or int(os.getenv("TENANT_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+
+        self._handles: "OrderedDict[str, _Handle]" = OrderedDict()
+        self._open_locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.opens = 0
+        self.evictions = 0
+        self.missing = 0
+
+    def path_for(self, user_uid: str) -> Path:
+        if not _SAFE_UID.fullmatch(user_uid or ""):
+            raise ValueError(f"Invalid tenant id: {user_uid!r}")
+        return self.root / f"{user_uid}.db"
+
+    @asynccontextmanager
+    async def acquire(self, user_uid: str) -> AsyncIterator[Optional[QueryDatabase]]:
+        """
+        The tenant's QueryDatabase (None if the shop has no file yet), pinned
+        open for the duration of the block.
+        """
+        handle = await self._checkout(user_uid)
+        if handle is None:
+            yield None
+            return
+        try:
+            yield handle.db
+        finally:
+            handle.in_use -= 1
+            if handle.evicted and handle.in_use == 0:
+                await self._close(handle)
+
+    async def _checkout(self, user_uid: str) -> Optional[_Handle]:
+        handle = self._handles.get(user_uid)
+        if handle is not None:
+            # No await between lookup and pin, so eviction can't close it under us
+            handle.in_use += 1
+            self._handles.move_to_end(user_uid)
+            self.hits += 1
+            return handle
+
+        try:
+            path = self.path_for(user_uid)
+        except ValueError as e:
+            logger.warning(f"⚠️ {e}")
+            self.missing += 1
+            return None
+        lock = self._open_locks.setdefault(user_uid, asyncio.Lock())
+        evicted: List[_Handle] = []
+        async with lock:
+            handle = self._handles.get(user_uid)
+            if handle is None:
+                if not path.exists():
+                    self.missing += 1
+                    self._open_locks.pop(user_uid, None)
+                    return None
+                db = await asyncio.to_thread(
+                    QueryDatabase, str(path), pool_size=self.pool_size, cache_bytes=self.cache_bytes
+                )
+                handle = _Handle(db)
+                self._handles[user_uid] = handle
+                self.opens += 1
+                logger.info(f"📂 Opened tenant DB {path.name} ({len(self._handles)}/{self.max_open} open)")
+                evicted = self._evict_over_cap()
+            handle.in_use += 1
+            self._handles.move_to_end(user_uid)
+        self._open_locks.pop(user_uid, None)
+
+        for old in evicted:
+            if old.in_use == 0:
+                await self._close(old)
+        return handle
+
+    def _evict_over_cap(self) -> List[_Handle]:
+        evicted = []
+        while len(self._handles) > self.max_open:
+            uid, old = self._handles.popitem(last=False)
+            old.evicted = True
+            evicted.append(old)
+            self.evictions += 1
+            logger.info(f"🗃️ Evicting tenant DB {uid} (LRU)")
+        return evicted
+
+    @staticmethod
+    async def _close(handle: _Handle):
+        try:
+            await asyncio.to_thread(handle.db.close)
+        except Exception as e:
+            logger.warning(f"⚠️ Error closing {handle.db.db_path}: {e}")
+
+    async def close_all(self):
+        handles = list(self._handles.values())
+        self._handles.clear()
+        for handle in handles:
+            handle.evicted = True
+            if handle.in_use == 0:
+                await self._close(handle)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open": len(self._handles),
+            "max_open": self.max_open,
+            "hits": self.hits,
+            "opens": self.opens,
+            "evictions": self.evictions,
+            "missing": self.missing,
+            "in_use": sum(h.in_use for h in self._handles.values()),
+        }
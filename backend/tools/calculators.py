@@ -1,39 +1,62 @@
-def calculate_period_stats(bills: list):
+import heapq
+
+
+def calculate_period_stats(bills, top_n: int = 5):
     """
     Calculates total revenue, bill count, average bill value.
+    bills is a list of bill dicts, or any other iterable yielding lists of
+    bills (chunks, e.g. iter_sales_chunks) - only one chunk is held at a time.
     """
-    if not bills:
-        return {
-            "total_revenue": 0,
-            "bill_count": 0,
-            "avg_bill_value": 0,
-            "top_items": []
-        }
+    chunks = [bills] if isinstance(bills, list) else bills
+    stats = PeriodStats()
+    for chunk in chunks:
+        stats.add(chunk)
+    return stats.result(top_n)
 
-    total_revenue = sum(float(b.get('grandTotal', 0)) for b in bills)
-    bill_count = len(bills)
-    
-    # Item analysis
-    item_counts = {}
-    for b in bills:
-        items = b.get('items', [])
-        for item in items:
-            name = item.get('vegName') or item.get('itemName') or "Unknown"
-            qty = float(item.get('qty', 0))
-            item_counts[name] = item_counts.get(name, 0) + qty
-
-    # Sort top items
-    sorted_items = sorted(item_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-    top_items = [{"name": k, "qty": v} for k, v in sorted_items]
-    total_units = sum(item_counts.values())
 
-    return {
-        "total_revenue": total_revenue,
-        "bill_count": bill_count,
-        "avg_bill_value": total_revenue / bill_count if bill_count else 0,
-        "top_items": top_items,
-        "total_units_sold": total_units
-    }
+class PeriodStats:
+    """
+    Running period totals, fed one chunk of bills at a time. Memory is bounded
+    by the number of distinct items, not the number of bills in the period.
+    """
+
+    def __init__(self):
+        self.total_revenue = 0.0
+        self.bill_count = 0
+        self.item_counts = {}
+
+    def add(self, bills: list):
+        self.total_revenue += sum(safe_float(b.get('grandTotal', 0)) for b in bills)
+        self.bill_count += len(bills)
+
+        # Item analysis
+        item_counts = self.item_counts
+        for b in bills:
+            for item in b.get('items') or []:
+                name = item.get('vegName') or item.get('itemName') or "Unknown"
+                item_counts[name] = item_counts.get(name, 0) + safe_float(item.get('qty', 0))
+
+    def result(self, top_n: int = 5) -> dict:
+        if not self.bill_count:
+            return {
+                "total_revenue": 0,
+                "bill_count": 0,
+                "avg_bill_value": 0,
+                "top_items": []
+            }
+
+        # Top items (same order as a full sort, without sorting the whole catalogue)
+        top = heapq.nlargest(top_n, self.item_counts.items(), key=lambda x: x[1])
+        top_items = [{"name": k, "qty": v} for k, v in top]
+        total_units = sum(self.item_counts.values())
+
+        return {
+            "total_revenue": self.total_revenue,
+            "bill_count": self.bill_count,
+            "avg_bill_value": self.total_revenue / self.bill_count,
+            "top_items": top_items,
+            "total_units_sold": total_units
+        }
 
 def safe_float(val):
     try:
@@ -1,11 +1,7 @@
 from core.database import db
 from datetime import datetime, timedelta
 
-def fetch_sales_as_dataframe(owner_uid: str, days: int = 1):
-    """
-    Fetches bills for the last N days.
-    Returns list of dicts.
-    """
+def _sales_stream(owner_uid: str, days: int):
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
     start_date_iso = start_date.isoformat()
@@ -13,18 +9,40 @@ def fetch_sales_as_dataframe(owner_uid: str, days: int = 1):
     # Query 'bills' collection where ownerId == owner_uid
     # Ensure Firestore index exists
     bills_ref = db.collection('bills')
-    query = bills_ref.where('ownerId', '==', owner_uid)\
-                     .where('date', '>=', start_date_iso)\
-                     .stream()
+    return bills_ref.where('ownerId', '==', owner_uid)\
+                    .where('date', '>=', start_date_iso)\
+                    .stream()
 
+
+def fetch_sales_as_dataframe(owner_uid: str, days: int = 1):
+    """
+    Fetches bills for the last N days.
+    Returns list of dicts.
+    """
     data = []
-    for doc in query:
+    for doc in _sales_stream(owner_uid, days):
         d = doc.to_dict()
         d['id'] = doc.id
         data.append(d)
     
     return data
 
+def iter_sales_chunks(owner_uid: str, days: int = 1, chunk_size: int = 2000):
+    """
+    Same bills as fetch_sales_as_dataframe, yielded as lists of chunk_size dicts
+    so long periods (a year of wholesale bills) never sit in memory at once.
+    """
+    chunk = []
+    for doc in _sales_stream(owner_uid, days):
+        d = doc.to_dict()
+        d['id'] = doc.id
+        chunk.append(d)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 def fetch_stock_limit(owner_uid: str, limit: int = 50):
     """
     Fetch stock items.
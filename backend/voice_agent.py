@@ -132,13 +132,19 @@ Example 3 (Query): { "text": "Checking sales...", "intent": "run_query", "data":
             logger.error(f"Groq Error: {str(e)}")
             final_response = {"text": "I'm having trouble connecting to my brain.", "intent": "error", "data": {"error": str(e)}}
 
-        # 7. Handle run_query intent - Execute the query!
-        if final_response.get("intent") == "run_query":
-            question = final_response.get("data", {}).get("question", text)
-            logger.info(f"📊 Executing Query: {question}")
+        # 7. Handle run_query / check_stock intents - Execute the query!
+        intent = final_response.get("intent")
+        product_name = (final_response.get("data") or {}).get("product_name") if intent == "check_stock" else None
+        if intent == "run_query" or product_name:
+            question = (final_response.get("data") or {}).get("question", text)
+            logger.info(f"📊 Executing Query: {product_name or question}")
             
             try:
-                query_result = await query_engine.run_query(user_uid, question)
+                if product_name:
+                    # Name as spoken (दूध / doodh / milk): matched through the product search index
+                    query_result = await query_engine.check_stock(user_uid, product_name)
+                else:
+                    query_result = await query_engine.run_query(user_uid, question)
                 
                 # Replace the placeholder response with actual result
                 final_response["text"] = query_result.get("text", "Query completed.")